@@ -0,0 +1,390 @@
+# AirViewer/backend/alerts.py
+# Motor de alertas en streaming: umbrales sostenidos y picos contra la línea base, O(1) por lectura
+
+import json
+import math
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+from timeseries_store import VALUE_COLUMNS, format_timestamps, parse_timestamps
+
+# =======================================================
+# CONFIGURACIÓN DEL MOTOR
+# =======================================================
+HOUR_S = 3600
+BASELINE_HOURS = 24          # Ventana móvil de la línea base (horas cerradas anteriores)
+MIN_BASELINE_HOURS = 12      # Horas con datos necesarias para evaluar picos
+EWMA_HALFLIFE_H = 6.0        # Vida media de la EWMA de las medias horarias
+WARMUP_S = 7 * 86400         # En la primera sincronización solo se procesa la última semana
+MAX_EVENTS = 500             # Transiciones recientes conservadas
+SYNC_CHUNK_ROWS = 100000
+ALERT_RULES_PATH = os.environ.get('AIRVIEWER_ALERT_RULES')  # JSON con una lista de reglas
+
+# sustained: la media horaria de `field` supera `above` durante `hours` horas seguidas.
+# spike: una lectura supera la línea base (media móvil 24 h o EWMA) en más de `z`
+#        desviaciones estándar y en al menos `min_delta` unidades.
+DEFAULT_RULES = [
+    {"id": "aqi_above_150_3h", "type": "sustained", "field": "aqi", "above": 150, "hours": 3, "severity": "high"},
+    {"id": "pm25_spike_24h", "type": "spike", "field": "pm25", "baseline": "rolling_24h", "z": 4.0,
+     "min_delta": 15.0, "severity": "medium"},
+]
+RULE_TYPES = ('sustained', 'spike')
+BASELINES = ('rolling_24h', 'ewma')
+
+
+def validate_rules(rules):
+    """Valida y completa las reglas; ValueError con el motivo si alguna es inválida."""
+    validated, ids = [], set()
+    for rule in rules:
+        rule = dict(rule)
+        rule_id = rule.get('id')
+        if not rule_id or rule_id in ids:
+            raise ValueError(f"Cada regla necesita un 'id' único: {rule}")
+        if rule.get('type') not in RULE_TYPES:
+            raise ValueError(f"Regla {rule_id}: 'type' debe ser uno de {RULE_TYPES}")
+        if rule.get('field') not in VALUE_COLUMNS:
+            raise ValueError(f"Regla {rule_id}: 'field' debe ser uno de {VALUE_COLUMNS}")
+        if rule['type'] == 'sustained':
+            rule['above'] = float(rule['above'])
+            rule['hours'] = int(rule.get('hours', 1))
+        else:
+            rule.setdefault('baseline', 'rolling_24h')
+            if rule['baseline'] not in BASELINES:
+                raise ValueError(f"Regla {rule_id}: 'baseline' debe ser uno de {BASELINES}")
+            rule['z'] = float(rule.get('z', 3.0))
+            rule['min_delta'] = float(rule.get('min_delta', 0.0))
+        rule.setdefault('severity', 'medium')
+        ids.add(rule_id)
+        validated.append(rule)
+    return validated
+
+def load_rules(path=ALERT_RULES_PATH):
+    if not path:
+        return validate_rules(DEFAULT_RULES)
+    with open(path, encoding='utf-8') as f:
+        return validate_rules(json.load(f))
+
+
+# =======================================================
+# ESTADÍSTICAS MÓVILES POR ESTACIÓN Y CONTAMINANTE
+# =======================================================
+
+class _FieldStats:
+    """
+    Estado de un contaminante en una estación: acumuladores de la hora abierta y un ring
+    de BASELINE_HOURS horas cerradas con totales corrientes (suma, suma de cuadrados,
+    conteo), más la EWMA de las medias horarias. Cada actualización cuesta O(1).
+    """
+
+    __slots__ = ('hour', 'h_sum', 'h_sumsq', 'h_n', 'ring_hour', 'ring_sum', 'ring_sumsq', 'ring_n',
+                 'win_sum', 'win_sumsq', 'win_n', 'win_hours', 'ewma', 'ewma_var', 'ewma_hour',
+                 'last_value', 'last_ts')
+
+    def __init__(self):
+        self.hour = None
+        self.h_sum = self.h_sumsq = 0.0
+        self.h_n = 0
+        self.ring_hour = [-1] * BASELINE_HOURS
+        self.ring_sum = [0.0] * BASELINE_HOURS
+        self.ring_sumsq = [0.0] * BASELINE_HOURS
+        self.ring_n = [0] * BASELINE_HOURS
+        self.win_sum = self.win_sumsq = 0.0
+        self.win_n = self.win_hours = 0
+        self.ewma = self.ewma_var = None
+        self.ewma_hour = None
+        self.last_value = self.last_ts = None
+
+    def _evict(self, slot):
+        if self.ring_hour[slot] >= 0:
+            self.win_sum -= self.ring_sum[slot]
+            self.win_sumsq -= self.ring_sumsq[slot]
+            self.win_n -= self.ring_n[slot]
+            self.win_hours -= 1
+            self.ring_hour[slot] = -1
+
+    def advance(self, hour):
+        """
+        Abre `hour`: cierra la hora abierta (entra al ring y a la EWMA) y expulsa las que
+        quedan fuera de [hour - BASELINE_HOURS, hour - 1]. Retorna (hora, media) cerrada o None.
+        """
+        closed = None
+        if self.hour is not None and self.h_n:
+            mean = self.h_sum / self.h_n
+            closed = (self.hour, mean)
+            slot = self.hour % BASELINE_HOURS
+            self._evict(slot)
+            self.ring_hour[slot] = self.hour
+            self.ring_sum[slot], self.ring_sumsq[slot], self.ring_n[slot] = self.h_sum, self.h_sumsq, self.h_n
+            self.win_sum += self.h_sum
+            self.win_sumsq += self.h_sumsq
+            self.win_n += self.h_n
+            self.win_hours += 1
+            self._update_ewma(self.hour, mean)
+        for slot in range(BASELINE_HOURS):
+            if 0 <= self.ring_hour[slot] < hour - BASELINE_HOURS:
+                self._evict(slot)
+        self.hour = hour
+        self.h_sum = self.h_sumsq = 0.0
+        self.h_n = 0
+        return closed
+
+    def _update_ewma(self, hour, mean):
+        """EWMA y varianza exponencial con decaimiento según las horas transcurridas (huecos incluidos)."""
+        if self.ewma is None:
+            self.ewma, self.ewma_var, self.ewma_hour = mean, 0.0, hour
+            return
+        alpha = 1.0 - 0.5 ** ((hour - self.ewma_hour) / EWMA_HALFLIFE_H)
+        diff = mean - self.ewma
+        increment = alpha * diff
+        self.ewma += increment
+        self.ewma_var = (1.0 - alpha) * (self.ewma_var + diff * increment)
+        self.ewma_hour = hour
+
+    def add(self, values, timestamps):
+        """Acumula lecturas de la hora abierta (array)."""
+        self.h_sum += float(values.sum())
+        self.h_sumsq += float(np.dot(values, values))
+        self.h_n += len(values)
+        self.last_value, self.last_ts = float(values[-1]), int(timestamps[-1])
+
+    def baseline(self, kind):
+        """(media, desviación estándar) de la línea base, o None si aún no hay historia suficiente."""
+        if kind == 'ewma':
+            if self.ewma is None or self.win_hours < MIN_BASELINE_HOURS:
+                return None
+            return self.ewma, math.sqrt(self.ewma_var)
+        if self.win_hours < MIN_BASELINE_HOURS or self.win_n < 2:
+            return None
+        mean = self.win_sum / self.win_n
+        var = max(self.win_sumsq / self.win_n - mean * mean, 0.0)
+        return mean, math.sqrt(var)
+
+    def summary(self):
+        rolling = self.baseline('rolling_24h')
+        return {
+            "last_value": self.last_value,
+            "last_at": format_timestamps(np.array([self.last_ts]))[0] if self.last_ts is not None else None,
+            "current_hour_mean": round(self.h_sum / self.h_n, 2) if self.h_n else None,
+            "rolling_24h_mean": round(rolling[0], 2) if rolling else None,
+            "rolling_24h_std": round(rolling[1], 2) if rolling else None,
+            "ewma": round(self.ewma, 2) if self.ewma is not None else None,
+            "ewma_std": round(math.sqrt(self.ewma_var), 2) if self.ewma is not None else None,
+            "baseline_hours": self.win_hours,
+            "z_score": self._z(self.last_value, rolling),
+        }
+
+    @staticmethod
+    def _z(value, baseline):
+        if value is None or not baseline or baseline[1] == 0:
+            return None
+        return round((value - baseline[0]) / baseline[1], 2)
+
+
+# =======================================================
+# MOTOR DE ALERTAS
+# =======================================================
+
+class AlertEngine:
+    """
+    Evalúa las reglas sobre cada lectura entrante, sin volver a leer el histórico.
+    Se alimenta como RollupEngine: sync() evalúa las filas nuevas del almacén (también las
+    lecturas de ThingSpeak, que se escriben allí primero). Cada bloque se ordena por (estación, tiempo) y se
+    procesa por grupos de una misma hora: la línea base solo cambia al cerrar una hora,
+    así que los picos de todo el grupo se evalúan de forma vectorizada.
+
+    Si sync() encuentra filas anteriores a lo ya evaluado (un backfill que llega después
+    de las lecturas en vivo) y dentro de WARMUP_S, re-evalúa esa ventana en orden temporal;
+    las más antiguas no modifican el estado y se cuentan en stats()["late_readings"].
+    """
+
+    def __init__(self, rules=None):
+        self.rules = validate_rules(rules) if rules is not None else load_rules()
+        self.fields = sorted({rule['field'] for rule in self.rules})
+        self._lock = threading.Lock()
+        self._stats = {}          # (estación, campo) -> _FieldStats
+        self._sustained = {}      # (regla, estación) -> (última hora sobre el umbral, horas seguidas)
+        self._active = {}         # (regla, estación) -> alerta activa
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.readings = 0
+        self.late_readings = 0
+        self.replays = 0
+        self._watermark = None    # Timestamp más reciente evaluado
+        self._store_position = 0
+        self._store_deletions = 0
+
+    # --- Transiciones ---
+
+    def _transition(self, rule, station, state, ts, **details):
+        key = (rule['id'], station)
+        at = format_timestamps(np.array([int(ts)]))[0]
+        if state == 'active':
+            if key in self._active:
+                self._active[key].update(last_seen=at, **details)
+                return
+            alert = {"rule": rule['id'], "type": rule['type'], "field": rule['field'], "station": station,
+                     "severity": rule['severity'], "since": at, "last_seen": at, **details}
+            self._active[key] = alert
+            self.events.append(dict(alert, state='active', at=at))
+        elif key in self._active:
+            alert = self._active.pop(key)
+            self.events.append(dict(alert, state='resolved', at=at, **details))
+
+    def _on_hour_closed(self, station, field, hour, mean):
+        for rule in self.rules:
+            if rule['type'] != 'sustained' or rule['field'] != field:
+                continue
+            key = (rule['id'], station)
+            if mean > rule['above']:
+                last_hour, run = self._sustained.get(key, (None, 0))
+                run = run + 1 if last_hour == hour - 1 else 1
+                self._sustained[key] = (hour, run)
+                if run >= rule['hours']:
+                    self._transition(rule, station, 'active', (hour + 1) * HOUR_S,
+                                     value=round(mean, 2), hours=run)
+            else:
+                self._sustained.pop(key, None)
+                self._transition(rule, station, 'resolved', (hour + 1) * HOUR_S, value=round(mean, 2))
+
+    def _check_spikes(self, station, field, stats, values, timestamps):
+        for rule in self.rules:
+            if rule['type'] != 'spike' or rule['field'] != field:
+                continue
+            baseline = stats.baseline(rule['baseline'])
+            if baseline is None:
+                continue
+            mean, std = baseline
+            excess = values - mean
+            spiking = (excess >= rule['min_delta']) & (excess > rule['z'] * std)
+            if spiking.any():
+                first = int(np.argmax(spiking))
+                peak = int(np.argmax(np.where(spiking, values, -np.inf)))
+                self._transition(rule, station, 'active', timestamps[first], value=round(float(values[peak]), 2),
+                                 baseline=round(mean, 2),
+                                 z=round(float(excess[peak] / std), 2) if std else None)
+            if not spiking[-1]:
+                # Se resuelve con la primera lectura normal posterior al último pico del grupo
+                after = int(np.flatnonzero(spiking)[-1]) + 1 if spiking.any() else 0
+                self._transition(rule, station, 'resolved', timestamps[after], value=round(float(values[after]), 2))
+
+    # --- Ingesta ---
+
+    def _process_group(self, station, hour, timestamps, columns):
+        for field in self.fields:
+            values = columns[field]
+            present = ~np.isnan(values)
+            if not present.any():
+                continue
+            values, ts = values[present], timestamps[present]
+            stats = self._stats.get((station, field))
+            if stats is None:
+                stats = self._stats[(station, field)] = _FieldStats()
+            if stats.hour is not None and hour < stats.hour:
+                self.late_readings += len(values)
+                continue
+            if stats.hour != hour:
+                closed = stats.advance(hour)
+                if closed is not None:
+                    self._on_hour_closed(station, field, *closed)
+            self._check_spikes(station, field, stats, values, ts)
+            stats.add(values, ts)
+
+    def _ingest_locked(self, timestamps, columns, station_names):
+        if len(timestamps) == 0:
+            return
+        stations = np.asarray(station_names, dtype=object)
+        codes, station_index = np.unique(stations.astype(str), return_inverse=True)
+        order = np.lexsort((timestamps, station_index))
+        timestamps, station_index = timestamps[order], station_index[order]
+        hours = timestamps // HOUR_S
+        values = {field: np.asarray(columns[field], dtype=np.float64)[order] for field in self.fields}
+
+        # Fronteras de grupo: cambia la estación o la hora
+        boundaries = np.flatnonzero((np.diff(station_index) != 0) | (np.diff(hours) != 0)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(timestamps)]))
+        for lo, hi in zip(starts.tolist(), ends.tolist()):
+            self._process_group(str(codes[station_index[lo]]), int(hours[lo]), timestamps[lo:hi],
+                                {field: col[lo:hi] for field, col in values.items()})
+        self.readings += len(timestamps)
+        newest = int(timestamps.max())
+        self._watermark = newest if self._watermark is None else max(self._watermark, newest)
+
+    def ingest_many(self, timestamps, columns, station_names):
+        """Evalúa un bloque: timestamps (epoch o ISO), columns dict por contaminante, estaciones."""
+        timestamps = parse_timestamps(timestamps)
+        columns = {field: columns.get(field, np.full(len(timestamps), np.nan)) for field in self.fields}
+        with self._lock:
+            self._ingest_locked(timestamps, columns, list(station_names))
+
+    def sync(self, store):
+        """
+        Evalúa las filas añadidas al almacén desde la última sincronización. La primera vez
+        (o tras un borrado) reinicia el estado y solo procesa los últimos WARMUP_S segundos.
+        """
+        if len(store) == self._store_position and store.deletions == self._store_deletions:
+            return
+        with self._lock:
+            count, deletions = len(store), store.deletions
+            stations = np.asarray(store.stations, dtype=object)
+            columns = ['id', 'timestamp', 'station'] + self.fields
+            latest = store.latest_timestamp()
+            rebuild = self._store_position == 0 or deletions != self._store_deletions or count < self._store_position
+            if not rebuild and self._watermark is not None:
+                # ¿Llegaron filas de horas ya cerradas que aún caen en la ventana de calentamiento?
+                new_ts = store.read_columns(np.arange(self._store_position, count), ['timestamp'])['timestamp']
+                oldest = int(new_ts.min()) if new_ts.size else self._watermark
+                if oldest < self._watermark // HOUR_S * HOUR_S and oldest >= latest - WARMUP_S:
+                    rebuild = True
+                    self.replays += 1
+            if rebuild:
+                self._reset_locked()
+                chunks = (iter(()) if latest is None else
+                          store.iter_range(start=latest - WARMUP_S, chunk_rows=SYNC_CHUNK_ROWS, columns=columns))
+            else:
+                chunks = (
+                    store.read_columns(np.arange(lo, min(lo + SYNC_CHUNK_ROWS, count)), columns)
+                    for lo in range(self._store_position, count, SYNC_CHUNK_ROWS)
+                )
+            # Los ids crecen con la posición física: se descartan filas escritas tras leer count
+            last_id = int(store.read_columns(np.array([count - 1]), ['id'])['id'][0]) if count else 0
+            for chunk in chunks:
+                if chunk['id'].size and chunk['id'].max() > last_id:
+                    chunk = {name: col[chunk['id'] <= last_id] for name, col in chunk.items()}
+                self._ingest_locked(chunk['timestamp'], chunk, stations[chunk['station']])
+            self._store_position = count
+            self._store_deletions = deletions
+
+    def _reset_locked(self):
+        self._stats, self._sustained, self._active = {}, {}, {}
+        self.events.clear()
+        self.readings = self.late_readings = 0
+        self._watermark = None
+
+    # --- Consulta ---
+
+    def active(self, station=None):
+        with self._lock:
+            alerts = [dict(a) for a in self._active.values() if station is None or a['station'] == station]
+        return sorted(alerts, key=lambda a: a['since'], reverse=True)
+
+    def recent_events(self, limit=100, station=None):
+        with self._lock:
+            events = [dict(e) for e in self.events if station is None or e['station'] == station]
+        return events[-limit:][::-1]
+
+    def baselines(self, station=None):
+        """Estadísticas móviles (media 24 h, EWMA, z-score de la última lectura) por estación y contaminante."""
+        with self._lock:
+            out = {}
+            for (name, field), stats in self._stats.items():
+                if station is None or name == station:
+                    out.setdefault(name, {})[field] = stats.summary()
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {"readings": self.readings, "late_readings": self.late_readings, "replays": self.replays,
+                    "active": len(self._active), "rules": [rule['id'] for rule in self.rules]}
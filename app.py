@@ -1,63 +1,246 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 import pandas as pd
-import io
+import hmac
+import os
 import random
-import requests # Necesario para hacer solicitudes HTTP
+import threading
+import time
 from datetime import datetime, timedelta
 
-# Importa las funciones del módulo de ML (ml_model.py debe estar en la misma carpeta)
+# Almacén persistente de lecturas (columnas NumPy memory-mapped)
+from timeseries_store import TimeSeriesStore, DEFAULT_STATION, parse_timestamps
+import history_export
+import history_pages
+import bulk_ingest
+import metrics
+import backtest
+from rollups import RollupEngine, ALL_STATIONS
+from alerts import AlertEngine
+from forecast_cache import ForecastCache
+from model_registry import ModelRegistry, RETRAIN_EPOCHS
+
+# Ingesta de ThingSpeak en segundo plano (el request nunca espera a la red)
+from thingspeak import ThingSpeakPoller, ThingSpeakBackfill, BACKFILL_CONCURRENCY, MAX_BACKFILL_CONCURRENCY
+from reading_ring import ReadingRing
+from live_stream import EventBroadcaster
+
+# Importa las funciones del módulo de ML (ml_model.py debe estar en la misma carpeta).
+# Es un import liviano: TensorFlow/sklearn solo se cargan al entrenar o al leer artefactos.
 import ml_model 
 
 # =======================================================
 # 1. VARIABLES GLOBALES DE ML Y GESTIÓN DE DATOS (DB Simulada)
 # =======================================================
-AIR_QUALITY_MODEL = None
-AIR_QUALITY_SCALER = None
-
-# Simulación de la base de datos histórica en memoria
-# Nota: Esta DB_RECORDS se usa principalmente para la tabla Histórica y gestión.
-DB_RECORDS = [
-    {"id": 1, "timestamp": (datetime.now() - timedelta(hours=2)).isoformat() + "Z", "aqi": 75, "pm25": 28.1, "pm10": 45.0, "no2": 40.5, "co": 3.1},
-    {"id": 2, "timestamp": (datetime.now() - timedelta(hours=1)).isoformat() + "Z", "aqi": 90, "pm25": 35.0, "pm10": 55.0, "no2": 55.2, "co": 4.5},
-    {"id": 3, "timestamp": datetime.now().isoformat() + "Z", "aqi": 82, "pm25": 30.2, "pm10": 48.0, "no2": 45.1, "co": 3.8}
-]
-NEXT_ID = 4 # Variable para asignar el próximo ID
-
-# --- CONFIGURACIÓN DE THINGSPEAK ---
-THINGSPEAK_CHANNEL_ID = '2989972' 
-THINGSPEAK_READ_KEY = 'DW1VFS3QXOJRWSIK' 
-
-# Mapeo de Campos:
-FIELD_MAP = {
-    'PM2.5': 'field1', 
-    'PM10': 'field2',
-    'NO2': 'field3',
-    'CO': 'field4',
-    'TEMP': 'field5' 
-}
+# (modelo, scaler) servidos. Es una sola tupla para que el cambio de versión sea una
+# asignación atómica: cada petición toma la tupla una vez y no mezcla versiones.
+ML_ACTIVE = (None, None)
+
+# Estado de carga del modelo (lo reportan los endpoints de salud).
+# Con gunicorn.conf.py el master lo carga antes del fork y los workers lo heredan.
+ML_STATE = {"state": "not_loaded", "pid": None, "load_seconds": None, "loaded_at": None, "error": None,
+            "version": None, "registry_version": None}
+_ML_LOCK = threading.Lock()
+
+# Registro de versiones del modelo (re-entrenamiento, activación y rollback)
+MODEL_REGISTRY = ModelRegistry()
+MODEL_CHECK_INTERVAL_S = 5  # Cada cuánto un worker mira si cambió la versión activa
+_SWAP_LOCK = threading.Lock()
+_SWAP_STATE = {"checked_at": 0.0}
+
+# Token de los endpoints de administración. Sin token quedan cerrados (403), salvo que
+# AIRVIEWER_ADMIN_OPEN=1 los abra a propósito (solo para desarrollo local).
+ADMIN_TOKEN = os.environ.get('AIRVIEWER_ADMIN_TOKEN')
+ADMIN_OPEN = os.environ.get('AIRVIEWER_ADMIN_OPEN', '').lower() in ('1', 'true', 'yes')
+
+# Histórico persistente compartido por todos los workers (sobrevive a reinicios).
+# Se usa para la tabla Histórica, la gestión de registros y la descarga.
+STORE_DIR = os.environ.get('AIRVIEWER_STORE_DIR', 'data/store')
+HISTORY_STORE = TimeSeriesStore(STORE_DIR)
+
+# Registros de ejemplo que se cargan solo si el almacén está vacío
+HISTORY_STORE.seed_if_empty([
+    {"timestamp": (datetime.now() - timedelta(hours=2)).isoformat() + "Z", "aqi": 75, "pm25": 28.1, "pm10": 45.0, "no2": 40.5, "co": 3.1},
+    {"timestamp": (datetime.now() - timedelta(hours=1)).isoformat() + "Z", "aqi": 90, "pm25": 35.0, "pm10": 55.0, "no2": 55.2, "co": 4.5},
+    {"timestamp": datetime.now().isoformat() + "Z", "aqi": 82, "pm25": 30.2, "pm10": 48.0, "no2": 45.1, "co": 3.8}
+])
+
+# --- INGESTA DE THINGSPEAK ---
+# La configuración (canal, clave, FIELD_MAP) vive en thingspeak.py.
+# Las lecturas recientes viven en memoria compartida: con preload_app el master crea el
+# ring y los workers lo heredan. Un solo worker sondea feeds/last.json y escribe; todos
+# leen la última lectura y el histórico reciente del ring sin locks ni IPC.
+READING_RING = ReadingRing()
+THINGSPEAK_POLLER = ThingSpeakPoller(ring=READING_RING)
+
+# Difusión SSE de cada lectura nueva a todos los dashboards conectados (/api/v1/data/stream)
+LIVE_STREAM = EventBroadcaster()
+
+# Backfill del histórico del canal (feeds.json); se lanza desde el endpoint de administración
+THINGSPEAK_BACKFILL = {"job": None, "thread": None}
+
+# Agregados horarios/diarios para las gráficas de tendencia (actualización incremental)
+ROLLUPS = RollupEngine()
+
+# Reglas de alerta (umbral sostenido, picos contra la línea base) evaluadas en la ingesta.
+# Las reglas se configuran en el JSON de AIRVIEWER_ALERT_RULES (por defecto alerts.DEFAULT_RULES).
+ALERTS = AlertEngine()
+
+# Respuestas JSON del histórico ya serializadas (ETag = versión del almacén + parámetros)
+HISTORY_CACHE = history_pages.HistoryResponseCache()
+
+# Caché de pronósticos: la ventana horaria de entrada solo cambia al llegar lecturas
+FORECAST_CACHE = ForecastCache()
+
+def _estado_aqi(aqi):
+    if aqi <= 50: return "Buena"
+    elif aqi <= 150: return "Moderada"
+    return "No saludable"
+
+def _round1(value):
+    """Redondeo para la respuesta; un campo faltante (None) se mantiene como null."""
+    return None if value is None else round(value, 1)
+
+def _on_thingspeak_reading(reading):
+    """
+    Cada entrada nueva del feed se guarda en el histórico de la estación principal. Todos
+    los workers la reciben del ring y la escriben: el almacén deduplica por entry_id (y
+    también contra el backfill). Agregados y alertas se sincronizan desde el almacén, así
+    que sobreviven a una reconstrucción y coinciden en todos los workers. La lectura se
+    difunde una sola vez por worker a los suscriptores del stream SSE.
+    """
+    aqi = int(reading['pm25'] * 2.5)
+    timestamp = reading['created_at'] or datetime.now().isoformat() + "Z"
+    if HISTORY_STORE.append({
+        "timestamp": timestamp,
+        "entry_id": reading['entry_id'],
+        "aqi": aqi,
+        "pm25": reading['pm25'],
+        "pm10": reading['pm10'],
+        "no2": reading['no2'],
+        "co": reading['co'],
+        "station": DEFAULT_STATION,
+    }) is not None:
+        HISTORY_CACHE.invalidate()
+    ROLLUPS.sync(HISTORY_STORE)
+    ALERTS.sync(HISTORY_STORE)
+    FORECAST_CACHE.invalidate()
+
+    LIVE_STREAM.publish({
+        "timestamp": timestamp,
+        "entry_id": reading['entry_id'],
+        "aqi": aqi,
+        "estado": _estado_aqi(aqi),
+        "pm25": _round1(reading['pm25']),
+        "pm10": _round1(reading['pm10']),
+        "no2": _round1(reading['no2']),
+        "co": _round1(reading['co']),
+    })
+
+THINGSPEAK_POLLER.add_listener(_on_thingspeak_reading)
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    """Latencia por ruta (la plantilla de la regla, no la URL: cardinalidad acotada)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas en formato de texto de Prometheus (todas las workers con PROMETHEUS_MULTIPROC_DIR)."""
+    if not metrics.available():
+        return jsonify({"error": "prometheus_client no está instalado"}), 503
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 # =======================================================
 # 2. LÓGICA DE CARGA DE ML
 # =======================================================
-def initialize_ml_components():
-    """
-    Intenta cargar los artefactos ML pre-entrenados desde el disco.
-    Si falla, el servidor continúa para que las rutas de datos reales funcionen.
-    """
-    global AIR_QUALITY_MODEL, AIR_QUALITY_SCALER
+def _load_ml_components_locked():
+    global ML_ACTIVE
     
+    ML_STATE.update(state="loading", pid=os.getpid(), error=None)
+    start = time.perf_counter()
     try:
-        AIR_QUALITY_MODEL, AIR_QUALITY_SCALER = ml_model.load_artefacts()
+        registry_version = MODEL_REGISTRY.active_version()
+        model, scaler = ml_model.load_artefacts()
+        if model is None or scaler is None:
+            raise RuntimeError("artefactos no disponibles en disco")
+        ml_model.warm_up(model)
+        ML_ACTIVE = (model, scaler)
+        ML_STATE.update(state="ready", version=model.version, registry_version=registry_version)
         print("Modelos ML inicializados con éxito.")
     
     except Exception as e:
         print(f"ERROR: No se pudo cargar el modelo ML. Archivo faltante: {e}")
         print("ADVERTENCIA: Las rutas de API de predicción (Prediction) fallarán.")
-        AIR_QUALITY_MODEL = None 
+        ML_ACTIVE = (None, None)
+        ML_STATE.update(state="failed", error=str(e))
+    
+    ML_STATE.update(load_seconds=round(time.perf_counter() - start, 4), loaded_at=datetime.now().isoformat() + "Z")
+
+def initialize_ml_components():
+    """
+    Intenta cargar los artefactos ML pre-entrenados desde el disco.
+    Si falla, el servidor continúa para que las rutas de datos reales funcionen.
+    Se llama desde el hook when_ready de gunicorn (master, antes del fork) o desde __main__.
+    """
+    with _ML_LOCK:
+        _load_ml_components_locked()
+
+def ensure_ml_components():
+    """Carga perezosa: si nadie precargó el modelo, lo hace la primera predicción del worker."""
+    if ML_STATE["state"] != "not_loaded":
+        swap_to_active_version()
+        return
+    with _ML_LOCK:
+        if ML_STATE["state"] == "not_loaded":
+            _load_ml_components_locked()
+
+def swap_to_active_version(force=False):
+    """
+    Cambia al modelo activo del registro si otro proceso lo cambió (re-entrenamiento,
+    activación o rollback). Mira ACTIVE.json a lo sumo cada MODEL_CHECK_INTERVAL_S y
+    nunca bloquea: si otro hilo ya está cambiando el modelo, la petición sigue con el actual.
+    """
+    global ML_ACTIVE
+    now = time.monotonic()
+    if not force and now - _SWAP_STATE["checked_at"] < MODEL_CHECK_INTERVAL_S:
+        return
+    if not _SWAP_LOCK.acquire(blocking=False):
+        return
+    try:
+        _SWAP_STATE["checked_at"] = now
+        version = MODEL_REGISTRY.active_version()
+        if version == ML_STATE["registry_version"]:
+            return
+        # La versión queda registrada aunque falle, para no reintentar en cada petición
+        ML_STATE["registry_version"] = version
+        try:
+            model, scaler = MODEL_REGISTRY.load(version) if version else ml_model.load_artefacts()
+            if model is None or scaler is None:
+                raise RuntimeError("artefactos no disponibles en disco")
+            ml_model.warm_up(model)
+        except Exception as e:
+            print(f"ERROR: No se pudo cambiar al modelo {version}: {e}. Se mantiene {ML_STATE['version']}.")
+            ML_STATE["error"] = str(e)
+            return
+        ML_ACTIVE = (model, scaler)  # Las peticiones en curso conservan la tupla anterior
+        ML_STATE.update(state="ready", version=model.version, error=None,
+                        loaded_at=datetime.now().isoformat() + "Z")
+        print(f"Modelo activo cambiado a {model.version}.")
+    finally:
+        _SWAP_LOCK.release()
 
 # =======================================================
 # 3. ENDPOINTS DE MONITOREO Y PREDICCIÓN
@@ -67,7 +250,9 @@ def get_current_data():
     """
     Retorna la última lectura de sensores. 
     Se añade variación aleatoria para simular monitoreo en tiempo real.
+    La lectura sale de la instantánea del sondeo de ThingSpeak (sin I/O de red aquí).
     """
+    THINGSPEAK_POLLER.start()
     
     # Rango de variación aleatoria para inyectar dinamismo
     # (+/- 2 puntos AQI, +/- 0.5 µg/m³ PM2.5, etc.)
@@ -75,17 +260,17 @@ def get_current_data():
     pm25_noise = random.uniform(-0.5, 0.5)
     pm10_noise = random.uniform(-1.0, 1.0)
     
-    # 1. Intento de Conexión a ThingSpeak
+    # 1. Última lectura publicada por el sondeo de ThingSpeak
+    snapshot = THINGSPEAK_POLLER.snapshot()
     try:
-        url = f"https://api.thingspeak.com/channels/{THINGSPEAK_CHANNEL_ID}/feeds/last.json?api_key={THINGSPEAK_READ_KEY}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        ts_data = response.json()
-
-        pm25 = float(ts_data.get(FIELD_MAP['PM2.5'], 0))
-        pm10 = float(ts_data.get(FIELD_MAP['PM10'], 0))
-        no2 = float(ts_data.get(FIELD_MAP['NO2'], 0))
-        co = float(ts_data.get(FIELD_MAP['CO'], 0))
+        if snapshot['reading'] is None or snapshot['stale']:
+            raise RuntimeError(f"sin lectura reciente (último error: {snapshot['last_error']})")
+        ts_data = snapshot['reading']
+
+        pm25 = ts_data['pm25']
+        pm10 = ts_data['pm10']
+        no2 = ts_data['no2']
+        co = ts_data['co']
         
         # Simulación de AQI + Dinamismo
         aqi_val = int((pm25 * 2.5) + aqi_noise) # 🛑 APLICACIÓN DE RUIDO
@@ -94,9 +279,7 @@ def get_current_data():
         final_pm25 = pm25 + pm25_noise
         final_pm10 = pm10 + pm10_noise
         
-        if aqi_val <= 50: estado = "Buena"
-        elif aqi_val <= 150: estado = "Moderada"
-        else: estado = "No saludable"
+        estado = _estado_aqi(aqi_val)
         
         data = {
             "timestamp": datetime.now().isoformat() + "Z",
@@ -104,25 +287,24 @@ def get_current_data():
             "estado": estado,
             "pm25": round(final_pm25, 1), 
             "pm10": round(final_pm10, 1),
-            "no2": round(no2, 1),
-            "co": round(co, 1)
+            "no2": _round1(no2),
+            "co": _round1(co)
         }
         return jsonify(data)
     
     except Exception as e:
         # 3. Fallback a Simulación si falla la API
-        print(f"ADVERTENCIA: Fallo al conectar con ThingSpeak ({e}). Usando simulación dinámica.")
+        print(f"ADVERTENCIA: ThingSpeak no disponible ({e}). Usando simulación dinámica.")
         
         # Simulación de valores dinámicos
-        last_record = DB_RECORDS[-1] if DB_RECORDS else {'aqi': 80, 'pm25': 30.0, 'pm10': 50.0}
+        last_records = HISTORY_STORE.last(1)
+        last_record = last_records[0] if last_records else {'aqi': 80, 'pm25': 30.0, 'pm10': 50.0}
         
         # Aplicar ruido al último valor conocido o base
         sim_aqi = round(last_record['aqi'] + aqi_noise)
         sim_pm25 = round(last_record['pm25'] + pm25_noise, 1)
         
-        if sim_aqi <= 50: estado = "Buena"
-        elif sim_aqi <= 150: estado = "Moderada"
-        else: estado = "No saludable"
+        estado = _estado_aqi(sim_aqi)
         
         data = {
             "timestamp": datetime.now().isoformat() + "Z",
@@ -135,40 +317,147 @@ def get_current_data():
         }
         return jsonify(data)
 
+@app.route('/api/v1/data/stream', methods=['GET'])
+def stream_current_data():
+    """
+    Server-Sent Events: un evento 'reading' por cada entrada nueva de ThingSpeak, sin
+    sondeo desde el navegador (EventSource). Soporta reconexión con Last-Event-ID.
+    Cada conexión ocupa un hilo (gthread) o greenlet (gevent): el cupo por worker
+    (live_stream.MAX_SUBSCRIBERS, ver gunicorn.conf.py) deja hilos libres para la API.
+    """
+    THINGSPEAK_POLLER.start()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    events = LIVE_STREAM.subscribe(last_event_id)
+    if events is None:
+        return jsonify({"error": "Demasiadas conexiones de streaming en este worker"}), 503, {"Retry-After": "30"}
+
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/v1/data/stream/stats', methods=['GET'])
+def get_stream_stats():
+    """Suscriptores conectados a este worker, eventos publicados y clientes lentos cortados."""
+    return jsonify(LIVE_STREAM.stats())
+
+@app.route('/api/v1/data/recent', methods=['GET'])
+def get_recent_readings():
+    """Últimas lecturas de ThingSpeak (?limit=, por defecto 100), iguales en todos los workers."""
+    THINGSPEAK_POLLER.start()
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "limit debe ser un entero"}), 400
+    limit = max(1, min(limit, READING_RING.capacity))
+    return jsonify(READING_RING.recent(limit))
+
+@app.route('/api/v1/alerts', methods=['GET'])
+def get_alerts():
+    """
+    Alertas activas y transiciones recientes (activación/resolución) de las reglas.
+    ?station= filtra por estación; ?limit= acota las transiciones (por defecto 50).
+    """
+    ALERTS.sync(HISTORY_STORE)
+    station = request.args.get('station')
+    try:
+        limit = max(1, int(request.args.get('limit', 50)))
+    except ValueError:
+        return jsonify({"error": "limit debe ser un entero"}), 400
+    return jsonify({
+        "active": ALERTS.active(station),
+        "recent": ALERTS.recent_events(limit, station),
+        "stats": ALERTS.stats(),
+    })
+
+@app.route('/api/v1/alerts/baselines', methods=['GET'])
+def get_alert_baselines():
+    """Estadísticas móviles por estación y contaminante (media 24 h, EWMA, z-score de la última lectura)."""
+    ALERTS.sync(HISTORY_STORE)
+    return jsonify(ALERTS.baselines(request.args.get('station')))
+
+@app.route('/api/v1/data/source_status', methods=['GET'])
+def get_source_status():
+    """Estado del sondeo de ThingSpeak: antigüedad de la instantánea y fallos acumulados."""
+    snapshot = THINGSPEAK_POLLER.snapshot()
+    snapshot.pop('reading')
+    return jsonify(snapshot)
+
 @app.route('/api/v1/data/last_24h', methods=['GET'])
 def get_last_24h():
-    """Retorna la tendencia del AQI promediada por hora para las últimas 24h (para gráficas)."""
-    now = datetime.now()
-    hourly_data = []
-    # Usamos una simulación dinámica simple para la tendencia
-    for i in range(24):
-        hour_time = now - timedelta(hours=23 - i)
-        # 🛑 Dinamismo en la simulación de la tendencia
-        aqi_val = random.randint(60, 110) + random.randint(-5, 5) 
-        hourly_data.append({"time": hour_time.strftime("%H:%M"), "aqi": aqi_val})
-    return jsonify(hourly_data)
+    """
+    Retorna la tendencia del AQI promediada por hora para las últimas 24h (para gráficas).
+    Sale de los agregados horarios (media/mín/máx por contaminante); ?station= filtra por estación.
+    """
+    ROLLUPS.sync(HISTORY_STORE)
+    return jsonify(ROLLUPS.last_hours(24, request.args.get('station', ALL_STATIONS)))
+
+@app.route('/api/v1/data/last_7d', methods=['GET'])
+def get_last_7d():
+    """Tendencia diaria de los últimos 7 días desde los agregados diarios."""
+    ROLLUPS.sync(HISTORY_STORE)
+    return jsonify(ROLLUPS.last_days(7, request.args.get('station', ALL_STATIONS)))
+
+@app.route('/api/v1/data/last_30d', methods=['GET'])
+def get_last_30d():
+    """Tendencia diaria de los últimos 30 días desde los agregados diarios."""
+    ROLLUPS.sync(HISTORY_STORE)
+    return jsonify(ROLLUPS.last_days(30, request.args.get('station', ALL_STATIONS)))
+
+
+def _build_prediction_window():
+    """
+    Ventana de entrada (TIME_STEP horas) con las medias horarias de PM2.5/PM10 de los
+    agregados. Las horas sin datos se rellenan con la más cercana; retorna None si no
+    hay ninguna lectura en la ventana.
+    """
+    ROLLUPS.sync(HISTORY_STORE)
+    hours = ROLLUPS.last_hours(ml_model.TIME_STEP)
+    pm25 = pd.Series([h['pm25'] for h in hours], dtype=float).ffill().bfill()
+    pm10 = pd.Series([h['pm10'] for h in hours], dtype=float).ffill().bfill()
+    if pm25.isna().any() or pm10.isna().any():
+        return None
+    
+    window = pd.DataFrame({'PM2_5': pm25, 'PM10': pm10})
+    for col, value in ml_model.DEFAULT_METEO.items():
+        window[col] = value
+    return window
 
 
 @app.route('/api/v1/prediction/next_24h', methods=['GET'])
 def get_prediction():
-    """Retorna el vector de predicciones ML."""
-    
-    # 🛑 Dinamismo en los inputs para la predicción 🛑
-    pm25_input = [random.randint(50, 120) + random.uniform(-5, 5) for _ in range(24)]
-    pm10_input = [random.randint(80, 150) + random.uniform(-10, 10) for _ in range(24)]
+    """
+    Retorna el vector de predicciones ML.
+    La entrada es la ventana horaria real de los agregados (cacheable); solo si no hay
+    lecturas recientes se usa una ventana simulada.
+    """
+    ensure_ml_components()
     
-    simulated_input_data = pd.DataFrame({
-        'PM2_5': pm25_input,
-        'PM10': pm10_input,
-        'Temperatura': [random.uniform(20, 25) for _ in range(24)],
-        'Humedad': [random.uniform(70, 90) for _ in range(24)],
-        'Presion': [random.uniform(1005, 1015) for _ in range(24)],
-        'CO2': [random.randint(450, 700) for _ in range(24)],
-    })
+    input_data = _build_prediction_window()
+    if input_data is None:
+        # 🛑 Dinamismo en los inputs para la predicción 🛑
+        pm25_input = [random.randint(50, 120) + random.uniform(-5, 5) for _ in range(24)]
+        pm10_input = [random.randint(80, 150) + random.uniform(-10, 10) for _ in range(24)]
+        
+        input_data = pd.DataFrame({
+            'PM2_5': pm25_input,
+            'PM10': pm10_input,
+            'Temperatura': [random.uniform(20, 25) for _ in range(24)],
+            'Humedad': [random.uniform(70, 90) for _ in range(24)],
+            'Presion': [random.uniform(1005, 1015) for _ in range(24)],
+            'CO2': [random.randint(450, 700) for _ in range(24)],
+        })
     
     try:
         # Se asume que make_prediction devuelve una lista de dicts
-        predictions = ml_model.make_prediction(AIR_QUALITY_MODEL, AIR_QUALITY_SCALER, simulated_input_data) 
+        model, scaler = ML_ACTIVE
+        predictions = ml_model.make_prediction(model, scaler, input_data, cache=FORECAST_CACHE) 
         
         # 🛑 Dinamismo adicional en la predicción final (opcional)
         final_predictions = []
@@ -183,16 +472,104 @@ def get_prediction():
     return jsonify(predictions)
 
 
+def _parse_station_window(window):
+    """
+    Convierte la ventana de una estación (lista de dicts con RAW_INPUT_COLUMNS
+    o lista de filas numéricas en ese orden) en un array (TIME_STEP, 6).
+    """
+    if window and isinstance(window[0], dict):
+        rows = [[float(step[col]) for col in ml_model.RAW_INPUT_COLUMNS] for step in window]
+    else:
+        rows = [[float(v) for v in step] for step in window]
+
+    if len(rows) < ml_model.TIME_STEP or any(len(r) != len(ml_model.RAW_INPUT_COLUMNS) for r in rows):
+        raise ValueError(f"Cada ventana necesita {ml_model.TIME_STEP} pasos con {ml_model.RAW_INPUT_COLUMNS}")
+    return rows[-ml_model.TIME_STEP:]
+
+
+@app.route('/api/v1/prediction/cache', methods=['GET'])
+def get_prediction_cache_stats():
+    """Contadores de la caché de pronósticos (aciertos, fallos, tamaño, invalidaciones)."""
+    return jsonify(FORECAST_CACHE.stats())
+
+
+@app.route('/api/v1/prediction/batch', methods=['POST'])
+def get_batch_prediction():
+    """
+    Predicción para N estaciones en una sola llamada al modelo.
+    Body: {"stations": [{"name": "...", "window": [...24 pasos...]}, ...]}
+    """
+    data = request.get_json(silent=True)
+    stations = data.get('stations') if isinstance(data, dict) else None
+    if not isinstance(stations, list) or not stations:
+        return jsonify({"error": "Se requiere un objeto JSON con una lista 'stations' con ventanas de entrada"}), 400
+
+    for i, station in enumerate(stations):
+        if not isinstance(station, dict) or not isinstance(station.get('window'), list):
+            return jsonify({"error": f"stations[{i}] debe ser un objeto con una lista 'window'"}), 400
+
+    try:
+        names = [s.get('name', f"station_{i}") for i, s in enumerate(stations)]
+        windows = [_parse_station_window(s['window']) for s in stations]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Ventana inválida: {e}"}), 400
+
+    ensure_ml_components()
+    try:
+        model, scaler = ML_ACTIVE
+        forecasts = ml_model.make_batch_prediction(model, scaler, windows)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "predictions": [{"station": name, "forecast": forecast} for name, forecast in zip(names, forecasts)]
+    })
+
+
 @app.route('/api/v1/model/metrics', methods=['GET'])
 def get_model_metrics():
-    # Estos valores son fijos porque representan el rendimiento del modelo LSTM entrenado
-    metrics = {
+    """
+    Métricas de la versión activa: las del backtest de su tramo de prueba al entrenarla
+    (registro) o las del backtest cacheado del modelo base (python backtest.py).
+    Todas las variantes traen rmse, r2, mae, model_name, last_trained, version y source.
+    """
+    ensure_ml_components()
+    version = ML_STATE["registry_version"]
+    meta = MODEL_REGISTRY.metadata(version) if version else None
+    if meta and meta.get("metrics"):
+        return jsonify({
+            **meta["metrics"],
+            **(meta.get("backtest") or {}),
+            "model_name": meta["model_name"],
+            "last_trained": meta["last_trained"],
+            "version": ML_STATE["version"],
+            "source": "registry",
+        })
+
+    model, _ = ML_ACTIVE
+    result = backtest.cached_backtest(model) if model is not None else None
+    if result:
+        return jsonify({
+            **result["overall"],
+            "per_horizon": result["per_horizon"],
+            "per_station": result["per_station"],
+            "model_name": "LSTM TimeSeries v2.1",
+            "last_trained": ml_model.model_trained_at(model),
+            "version": ML_STATE["version"],
+            "source": "backtest",
+        })
+
+    # Modelo base (model/): estos valores son fijos porque representan el rendimiento del modelo LSTM entrenado
+    static_metrics = {
         "rmse": 4.52, 
         "r2": 0.93, 
+        "mae": 3.10,
         "model_name": "LSTM TimeSeries v2.1",
-        "last_trained": "2025-12-06 14:00h"
+        "last_trained": "2025-12-06 14:00h",
+        "version": ML_STATE["version"],
+        "source": "static",
     }
-    return jsonify(metrics)
+    return jsonify(static_metrics)
 
 @app.route('/api/v1/prediction/sources', methods=['GET'])
 def get_prediction_sources():
@@ -216,6 +593,21 @@ def index():
         "message": "The system is ready. Use /api/v1/data/current to fetch data."
     }), 200
     
+@app.route('/api/v1/health/live', methods=['GET'])
+def health_live():
+    """Liveness: el proceso responde (no depende del modelo)."""
+    return jsonify({"status": "alive", "pid": os.getpid()}), 200
+
+@app.route('/api/v1/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: 200 solo si el modelo está cargado en este worker; 503 en otro caso."""
+    state = dict(ML_STATE)
+    state["worker_pid"] = os.getpid()
+    state["preloaded"] = state["pid"] is not None and state["pid"] != os.getpid()
+    model, _ = ML_ACTIVE
+    state["backend"] = type(model).__name__ if model is not None else None
+    return jsonify(state), 200 if state["state"] == "ready" else 503
+
 @app.route('/api/v1/thesis/indicators', methods=['GET'])
 def get_thesis_indicators():
     # Valores fijos (de tesis)
@@ -228,18 +620,73 @@ def get_thesis_indicators():
     return jsonify(indicators_data)
 
 
+def _date_bounds(start_date, end_date):
+    """
+    Convierte start_date/end_date (YYYY-MM-DD o ISO) en límites inclusivos para el almacén.
+    Lanza ValueError (con un mensaje para el cliente) si alguna fecha no se puede interpretar.
+    """
+    start = start_date or None
+    end = end_date or None
+    if end is not None and len(end) == 10:
+        end = end + "T23:59:59"
+    for name, value in (('start_date', start), ('end_date', end)):
+        if value is None:
+            continue
+        try:
+            parse_timestamps([value])
+        except ValueError:
+            raise ValueError(f"{name} inválido: '{value}' (se espera YYYY-MM-DD o ISO 8601)") from None
+    return start, end
+
+
 @app.route('/api/v1/history', methods=['GET'])
 def get_history():
-    """Retorna todos los datos históricos (de la DB simulada) para la tabla del Front-end."""
-    return jsonify(DB_RECORDS)  
+    """
+    Retorna los datos históricos para la tabla del Front-end.
+    Acepta start_date/end_date opcionales (búsqueda binaria en el índice temporal) y
+    fields=timestamp,pm25,... para proyectar columnas. Con limit (y cursor) responde por
+    páginas {"records", "next_cursor"} en orden (timestamp, id); sin ellos, la lista completa.
+    El cuerpo se cachea ya serializado con un ETag fuerte: If-None-Match responde 304.
+    """
+    try:
+        start, end = _date_bounds(request.args.get('start_date'), request.args.get('end_date'))
+        fields = history_pages.parse_fields(request.args.get('fields'))
+        limit = history_pages.parse_limit(request.args.get('limit'))
+        after = history_pages.decode_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    paged = limit is not None or after is not None
+    limit = limit or history_pages.MAX_PAGE_SIZE
+
+    # La versión del almacén (meta.json) identifica el contenido sin leer ninguna fila
+    version = HISTORY_STORE.version
+    key = (start, end, tuple(fields or ()), paged, limit if paged else None, after)
+    etag = history_pages.make_etag(version, key)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if request.if_none_match.contains(etag):
+        HISTORY_CACHE.record_not_modified()
+        return Response(status=304, headers=headers)
+
+    cached = HISTORY_CACHE.get(key, version)
+    if cached is not None:
+        body = cached[1]
+    else:
+        if paged:
+            body = history_pages.render_page(HISTORY_STORE, start, end, fields, after, limit)
+        else:
+            body = history_pages.render_range(HISTORY_STORE, start, end, fields)
+        HISTORY_CACHE.put(key, version, etag, body)
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/api/v1/history/cache', methods=['GET'])
+def get_history_cache_stats():
+    """Contadores de la caché de respuestas del histórico (aciertos, 304, bytes)."""
+    return jsonify(HISTORY_CACHE.stats())
 
 
 @app.route('/api/v1/history/record', methods=['POST'])
 def add_new_record():
-    """Añade un nuevo registro a la DB simulada (Función 'Agregar')."""
-    global NEXT_ID
-    global DB_RECORDS
-    
+    """Añade un nuevo registro al histórico (Función 'Agregar')."""
     try:
         data = request.get_json()
         if not all(k in data for k in ('timestamp', 'pm25', 'pm10')):
@@ -250,59 +697,269 @@ def add_new_record():
         aqi_sim = int(pm25 * 2.5) 
         
         new_record = {
-            "id": NEXT_ID,
             "timestamp": data['timestamp'],
             "aqi": aqi_sim,
             "pm25": pm25,
             "pm10": pm10,
             "no2": round(random.uniform(30, 60), 1),
-            "co": round(random.uniform(2, 5), 1)
+            "co": round(random.uniform(2, 5), 1),
+            "station": data.get('station')
         }
         
-        DB_RECORDS.append(new_record)
-        NEXT_ID += 1
+        new_record['id'] = HISTORY_STORE.append(new_record)
+        ROLLUPS.sync(HISTORY_STORE)
+        ALERTS.sync(HISTORY_STORE)
+        FORECAST_CACHE.invalidate()
+        HISTORY_CACHE.invalidate()
         
         return jsonify({"message": "Registro añadido con éxito", "id": new_record['id']}), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route('/api/v1/history/bulk', methods=['POST'])
+def bulk_ingest_records():
+    """
+    Ingesta masiva en streaming: cuerpo NDJSON (un objeto por línea) o CSV con cabecera.
+    El formato sale de ?format=ndjson|csv o del Content-Type. Campos: timestamp, pm25,
+    pm10 (obligatorios), aqi, no2, co, station. Las líneas inválidas se reportan sin
+    abortar el resto.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    if fmt not in bulk_ingest.INGEST_FORMATS:
+        return jsonify({"error": f"Formato no soportado: {fmt}. Use {', '.join(bulk_ingest.INGEST_FORMATS)}"}), 400
+
+    start = time.perf_counter()
+    version = HISTORY_STORE.version
+    try:
+        result = bulk_ingest.ingest_stream(HISTORY_STORE, request.stream, fmt)
+    except UnicodeDecodeError as e:
+        return jsonify({"error": f"Cuerpo ilegible: {e}"}), 400
+    finally:
+        # Los bloques anteriores a un error ya están escritos: las vistas derivadas se
+        # sincronizan siempre que el almacén haya cambiado
+        if HISTORY_STORE.version != version:
+            ROLLUPS.sync(HISTORY_STORE)
+            ALERTS.sync(HISTORY_STORE)
+            FORECAST_CACHE.invalidate()
+            HISTORY_CACHE.invalidate()
+    elapsed = time.perf_counter() - start
+    result.update(seconds=round(elapsed, 3), rows_per_s=int(result["accepted"] / elapsed) if elapsed else None)
+    return jsonify(result), 200 if result["accepted"] or not result["rejected"] else 400
+
 @app.route('/api/v1/history/record/last', methods=['DELETE'])
 def delete_last_record():
-    """Elimina el último registro de la DB simulada (Función 'Eliminar Último')."""
-    global DB_RECORDS
+    """Elimina el último registro del histórico (Función 'Eliminar Último')."""
+    last_record = HISTORY_STORE.delete_last()
+    HISTORY_CACHE.invalidate()
     
-    if not DB_RECORDS:
+    if last_record is None:
         return jsonify({"message": "La base de datos está vacía"}), 404
-        
-    last_record = DB_RECORDS.pop()
     
     return jsonify({"message": "Último registro eliminado con éxito", "id_eliminado": last_record['id']}), 200
 
 @app.route('/api/v1/history/download', methods=['GET'])
 def download_history():
-    """Genera y retorna un archivo CSV con datos históricos filtrados."""
+    """
+    Exporta el histórico filtrado por start_date/end_date como descarga en streaming.
+    format=csv (por defecto), parquet o arrow; gzip=1 comprime la salida.
+    Las filas se leen del almacén por bloques, así que la memoria no crece con el rango.
+    """
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    
-    # Simulación de datos para CSV de descarga
-    csv_data = "timestamp,AQI,PM2.5,PM10,NO2,CO\n"
-    csv_data += "2025-11-15 10:00,75,28.1,45.0,40.5,3.1\n"
-    csv_data += "2025-11-15 11:00,90,35.0,55.0,55.2,4.5\n"
-
-    buffer = io.BytesIO(csv_data.encode())
-    buffer.seek(0)
-
-    return send_file(
-        buffer,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'AirViewer_Historical_Data_{start_date}_to_{end_date}.csv'
+    # Se valida antes de armar la respuesta: dentro del generador el error llegaría tras el 200
+    try:
+        start, end = _date_bounds(start_date, end_date)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = request.args.get('format', 'csv').lower()
+    compress = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+
+    if fmt not in history_export.EXPORT_FORMATS:
+        return jsonify({"error": f"Formato no soportado: {fmt}"}), 400
+    if fmt != 'csv' and not history_export.pyarrow_available():
+        return jsonify({"error": "La exportación Parquet/Arrow requiere pyarrow en el servidor"}), 501
+
+    mimetype, extension = history_export.EXPORT_FORMATS[fmt]
+    filename = f'AirViewer_Historical_Data_{start_date}_to_{end_date}.{extension}'
+    if compress:
+        mimetype, filename = 'application/gzip', filename + '.gz'
+
+    # Sin cambios en el almacén, una descarga repetida se resuelve con 304 sin leer filas
+    etag = history_pages.make_etag(HISTORY_STORE.version, ('download', start, end, fmt, compress))
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    return Response(
+        stream_with_context(history_export.export_stream(HISTORY_STORE, fmt, start, end, compress)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "ETag": f'"{etag}"'}
     )
 
 
+# =======================================================
+# 5. ADMINISTRACIÓN DEL MODELO (REGISTRO Y RE-ENTRENAMIENTO)
+# =======================================================
+def _admin_denied():
+    """
+    403 si no hay ADMIN_TOKEN configurado (y no se abrió con ADMIN_OPEN); 401 si la
+    petición no trae el header X-Admin-Token correcto.
+    """
+    if not ADMIN_TOKEN:
+        if ADMIN_OPEN:
+            return None
+        return jsonify({"error": "Administración deshabilitada: defina AIRVIEWER_ADMIN_TOKEN"}), 403
+    given = request.headers.get('X-Admin-Token', '').encode()
+    if not hmac.compare_digest(given, ADMIN_TOKEN.encode()):
+        return jsonify({"error": "No autorizado"}), 401
+    return None
+
+@app.route('/api/v1/admin/model/retrain', methods=['POST'])
+def start_model_retrain():
+    """
+    Re-entrena sobre el histórico del almacén en un proceso aparte y retorna 202 de inmediato.
+    Body (opcional): {"warm_start": bool, "epochs": int, "n_future": int, "activate": bool}
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        job = MODEL_REGISTRY.start_retrain(
+            STORE_DIR,
+            warm_start=bool(data.get('warm_start', False)),
+            epochs=int(data.get('epochs', RETRAIN_EPOCHS)),
+            n_future=int(data['n_future']) if data.get('n_future') else None,
+            activate=bool(data.get('activate', True)),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(job), 202
+
+@app.route('/api/v1/admin/model/retrain', methods=['GET'])
+def get_model_retrain_status():
+    """Estado del último re-entrenamiento (running / succeeded / failed)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(MODEL_REGISTRY.job_status() or {"state": "idle"})
+
+@app.route('/api/v1/admin/model/versions', methods=['GET'])
+def get_model_versions():
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        "active": MODEL_REGISTRY.active_version(),
+        "serving": ML_STATE["version"],
+        "versions": MODEL_REGISTRY.versions(),
+    })
+
+@app.route('/api/v1/admin/model/activate', methods=['POST'])
+def activate_model_version():
+    """Activa una versión registrada. Body: {"version": "v20250101-120000"}"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    version = (request.get_json(silent=True) or {}).get('version')
+    try:
+        MODEL_REGISTRY.activate(version)
+    except (KeyError, TypeError):
+        return jsonify({"error": f"Versión no registrada: {version}"}), 404
+    swap_to_active_version(force=True)
+    return jsonify({"active": version, "serving": ML_STATE["version"]})
+
+@app.route('/api/v1/admin/model/rollback', methods=['POST'])
+def rollback_model_version():
+    """Vuelve a la versión activa anterior (o al modelo base de model/)."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        version = MODEL_REGISTRY.rollback()
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 409
+    swap_to_active_version(force=True)
+    return jsonify({"active": version, "serving": ML_STATE["version"]})
+
+
+def _backfill_options(data):
+    """
+    Valida el body del backfill antes de lanzar el hilo (dentro, un error solo llegaría al log).
+    Retorna (start, end, concurrency) con los límites en epoch; ValueError con el motivo.
+    """
+    bounds = {}
+    for name in ('start', 'end'):
+        value = data.get(name)
+        bounds[name] = None
+        if value is None:
+            continue
+        try:
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise ValueError
+            bounds[name] = int(parse_timestamps([value])[0])
+        except ValueError:
+            raise ValueError(f"{name} inválido: '{value}' (se espera ISO 8601 o epoch en segundos)") from None
+    if None not in bounds.values() and bounds['start'] > bounds['end']:
+        raise ValueError("start debe ser anterior a end")
+
+    concurrency = data.get('concurrency', BACKFILL_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) \
+            or not 1 <= concurrency <= MAX_BACKFILL_CONCURRENCY:
+        raise ValueError(f"concurrency debe ser un entero entre 1 y {MAX_BACKFILL_CONCURRENCY}")
+    return bounds['start'], bounds['end'], concurrency
+
+@app.route('/api/v1/admin/thingspeak/backfill', methods=['POST'])
+def start_thingspeak_backfill():
+    """
+    Lanza el backfill del canal en un hilo de este worker (retoma desde el checkpoint).
+    Body (opcional): {"start": ISO, "end": ISO, "concurrency": int, "resume": bool}
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    thread = THINGSPEAK_BACKFILL["thread"]
+    if thread is not None and thread.is_alive():
+        return jsonify({"error": "Ya hay un backfill en curso", **THINGSPEAK_BACKFILL["job"].status()}), 409
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "El body debe ser un objeto JSON"}), 400
+    try:
+        start, end, concurrency = _backfill_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = ThingSpeakBackfill(HISTORY_STORE, concurrency=concurrency)
+
+    def run():
+        try:
+            job.run(start, end, resume=bool(data.get('resume', True)))
+            ROLLUPS.sync(HISTORY_STORE)
+            ALERTS.sync(HISTORY_STORE)
+            FORECAST_CACHE.invalidate()
+        except Exception as e:
+            print(f"ERROR: Backfill de ThingSpeak interrumpido: {e}")
+
+    thread = threading.Thread(target=run, name='thingspeak-backfill', daemon=True)
+    THINGSPEAK_BACKFILL.update(job=job, thread=thread)
+    thread.start()
+    return jsonify({"state": "started", "checkpoint": job.load_checkpoint()}), 202
+
+@app.route('/api/v1/admin/thingspeak/backfill', methods=['GET'])
+def get_thingspeak_backfill_status():
+    denied = _admin_denied()
+    if denied:
+        return denied
+    job = THINGSPEAK_BACKFILL["job"]
+    return jsonify(job.status() if job else {"state": "idle"})
+
+
 if __name__ == '__main__':
-    if AIR_QUALITY_MODEL is None:
+    if ML_ACTIVE[0] is None:
         initialize_ml_components()
         
     print("--- Servidor AirViewer Flask iniciado en http://localhost:5000 ---")
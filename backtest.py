@@ -0,0 +1,197 @@
+# AirViewer/backend/backtest.py
+# Backtesting rolling-origin vectorizado: métricas por horizonte y por estación
+
+import json
+import os
+import threading
+import time
+import numpy as np
+
+import ml_model
+from timeseries_store import DEFAULT_STATION
+
+# =======================================================
+# CONFIGURACIÓN DEL BACKTEST
+# =======================================================
+BACKTEST_BATCH_SIZE = 4096          # Ventanas por forward pass
+BACKTEST_CACHE_DIR = os.path.join(ml_model.MODEL_DIR, 'backtests')
+BACKTEST_METHOD = 2                 # Se incrementa al cambiar cómo se pronostica (invalida la caché)
+
+_MEMORY_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# =======================================================
+# MÉTRICAS VECTORIZADAS
+# =======================================================
+
+def _metric_block(sq_err, abs_err, err, ss_tot, n):
+    """Convierte sumas (escalares o arrays) en RMSE/MAE/R²/sesgo."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(sq_err / n)
+        mae = abs_err / n
+        bias = err / n
+        r2 = np.where(ss_tot > 0, 1 - sq_err / ss_tot, np.nan)
+    return rmse, mae, r2, bias
+
+def _round(value):
+    value = float(value)
+    return None if value != value else round(value, 4)
+
+def compute_metrics(predicted, actual, segments, station_names):
+    """
+    predicted/actual: (N, H) en µg/m³; segments: estación de cada ventana (N,).
+    Todas las agregaciones son sumas vectorizadas (axis=0 y np.bincount), sin bucles por ventana.
+    """
+    errors = predicted - actual
+    sq, ab = errors ** 2, np.abs(errors)
+    n_windows, horizons = actual.shape
+
+    # Por horizonte: reducción sobre las ventanas
+    ss_tot_h = np.sum((actual - actual.mean(axis=0)) ** 2, axis=0)
+    per_h = _metric_block(sq.sum(axis=0), ab.sum(axis=0), errors.sum(axis=0), ss_tot_h, n_windows)
+
+    # Por estación: sumas por fila agrupadas con bincount
+    n_stations = len(station_names)
+    count = np.bincount(segments, minlength=n_stations) * horizons
+    sum_y = np.bincount(segments, actual.sum(axis=1), n_stations)
+    sum_y2 = np.bincount(segments, (actual ** 2).sum(axis=1), n_stations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ss_tot_s = sum_y2 - sum_y ** 2 / count
+    per_s = _metric_block(np.bincount(segments, sq.sum(axis=1), n_stations),
+                          np.bincount(segments, ab.sum(axis=1), n_stations),
+                          np.bincount(segments, errors.sum(axis=1), n_stations), ss_tot_s, count)
+
+    overall = _metric_block(sq.sum(), ab.sum(), errors.sum(), np.sum((actual - actual.mean()) ** 2), actual.size)
+
+    keys = ("rmse", "mae", "r2", "bias")
+    return {
+        "overall": {**{k: _round(v) for k, v in zip(keys, overall)}, "n_windows": int(n_windows)},
+        "per_horizon": [
+            {"h": h + 1, **{k: _round(v[h]) for k, v in zip(keys, per_h)}} for h in range(horizons)
+        ],
+        "per_station": [
+            {"station": name, "n_windows": int(count[s] // horizons), **{k: _round(v[s]) for k, v in zip(keys, per_s)}}
+            for s, name in enumerate(station_names) if count[s]
+        ],
+    }
+
+
+# =======================================================
+# BACKTEST
+# =======================================================
+
+def predict_windows(model, scaled_data, starts, n_future, batch_size=BACKTEST_BATCH_SIZE):
+    """
+    Pronóstico (escalado) para cada origen en `starts`, en lotes grandes.
+    Cada lote materializa solo sus ventanas; se pronostica con forecast_scaled igual que al servir.
+    """
+    offsets = np.arange(ml_model.TIME_STEP)
+    out = np.empty((len(starts), n_future), dtype=np.float64)
+    for lo in range(0, len(starts), batch_size):
+        batch = np.asarray(starts[lo:lo + batch_size])
+        out[lo:lo + len(batch)] = ml_model.forecast_scaled(model, scaled_data[batch[:, None] + offsets], n_future)
+    return out
+
+def backtest_arrays(model, scaler, scaled_data, segment_ids, starts, station_names, n_future):
+    """
+    Backtest sobre datos ya escalados: cada ventana de `starts` es un origen y se compara
+    el pronóstico de las n_future horas siguientes con lo observado (PM2.5_STD, µg/m³).
+    """
+    if len(starts) == 0:
+        return None
+    started = time.perf_counter()
+    starts = np.asarray(starts)
+    predicted = ml_model._inverse_pm25(scaler, predict_windows(model, scaled_data, starts, n_future))
+    target_index = starts[:, None] + ml_model.TIME_STEP + np.arange(n_future)
+    actual = ml_model._inverse_pm25(scaler, scaled_data[target_index, 0].astype(np.float64))
+
+    names = [str(name) if name is not None else DEFAULT_STATION for name in station_names]
+    result = compute_metrics(predicted, actual, segment_ids[starts], names)
+    result.update(n_future=n_future, seconds=round(time.perf_counter() - started, 3))
+    return result
+
+def run_backtest(model, scaler, data_path=None, n_future=None, chunksize=None):
+    """
+    Backtest del modelo sobre el tramo de prueba (el mismo que reserva load_and_preprocess_data)
+    del dataset, escalado con el scaler del propio modelo.
+    """
+    data_path = data_path or ml_model.DATA_PATH
+    n_future = n_future or ml_model._model_output_dim(model)
+    scaled, segment_ids, station_names, _ = ml_model.read_scaled_features(data_path, chunksize, scaler=scaler)
+    _, starts_test = ml_model.window_starts(segment_ids, n_future=n_future)
+    return backtest_arrays(model, scaler, scaled, segment_ids, starts_test, station_names, n_future)
+
+
+# =======================================================
+# CACHÉ POR VERSIÓN DE MODELO
+# =======================================================
+
+def _cache_key(model_version, data_path, n_future):
+    stat = os.stat(data_path)
+    return (f"{model_version}|{os.path.abspath(data_path)}|{stat.st_size}|{int(stat.st_mtime)}|{n_future}"
+            f"|m{BACKTEST_METHOD}")
+
+def _cache_file(model_version):
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(model_version))
+    return os.path.join(BACKTEST_CACHE_DIR, f"{safe}.json")
+
+def _resolve(model, data_path, n_future):
+    return (getattr(model, 'version', None) or 'unversioned', data_path or ml_model.DATA_PATH,
+            n_future or ml_model._model_output_dim(model))
+
+def cached_backtest(model, data_path=None, n_future=None):
+    """Resultado ya calculado para (versión del modelo, dataset, horizonte) o None. No ejecuta nada."""
+    model_version, data_path, n_future = _resolve(model, data_path, n_future)
+    if not os.path.exists(data_path):
+        return None
+    key = _cache_key(model_version, data_path, n_future)
+    with _CACHE_LOCK:
+        if key in _MEMORY_CACHE:
+            return _MEMORY_CACHE[key]
+    try:
+        with open(_cache_file(model_version), encoding='utf-8') as f:
+            stored = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if stored.get("cache_key") != key:
+        return None
+    with _CACHE_LOCK:
+        _MEMORY_CACHE[key] = stored
+    return stored
+
+def get_backtest(model, scaler, data_path=None, n_future=None):
+    """Backtest cacheado por versión de modelo (en memoria y en BACKTEST_CACHE_DIR); lo calcula si falta."""
+    version, data_path, n_future = _resolve(model, data_path, n_future)
+    result = cached_backtest(model, data_path, n_future)
+    if result is not None:
+        return result
+
+    result = run_backtest(model, scaler, data_path, n_future)
+    if result is None:
+        return None
+    key = _cache_key(version, data_path, n_future)
+    result.update(version=version, data_path=data_path, cache_key=key)
+    os.makedirs(BACKTEST_CACHE_DIR, exist_ok=True)
+    tmp = _cache_file(version) + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp, _cache_file(version))
+    with _CACHE_LOCK:
+        _MEMORY_CACHE[key] = result
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtest del modelo servido sobre el tramo de prueba.")
+    parser.add_argument('--data', default=ml_model.DATA_PATH)
+    parser.add_argument('--n-future', type=int, default=None)
+    args = parser.parse_args()
+
+    model, scaler = ml_model.load_artefacts()
+    result = get_backtest(model, scaler, args.data, args.n_future)
+    print(json.dumps({k: result[k] for k in ('version', 'overall', 'seconds')}, indent=2))
+    for row in result['per_horizon']:
+        print(f"h+{row['h']:>2}  RMSE {row['rmse']:>8}  MAE {row['mae']:>8}  R² {row['r2']}")
@@ -0,0 +1,9 @@
+# AirViewer/backend/benchmarks/__init__.py
+# Benchmarks reproducibles: prueba de carga de la API y micro-benchmarks del modelo y los datos.
+#
+#   python -m benchmarks.load_test --mode inprocess --concurrency 16 --duration 20
+#   python -m benchmarks.load_test --mode gunicorn --workers 2
+#   python -m benchmarks.micro
+#   python -m benchmarks.results compare <base.json> <nuevo.json>
+#
+# Cada ejecución escribe un JSON en benchmarks/results/ con el commit y el entorno.
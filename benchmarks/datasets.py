@@ -0,0 +1,44 @@
+# AirViewer/backend/benchmarks/datasets.py
+# Datos de entrada deterministas (semilla fija) compartidos por la prueba de carga y los micro-benchmarks
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import generate_data
+from timeseries_store import TimeSeriesStore, DEFAULT_STATION
+
+SEED = 1234
+
+
+def build_history_store(path, n_rows, step_minutes=60, end=None, station=DEFAULT_STATION):
+    """
+    Crea (o completa hasta n_rows) un almacén con la serie simulada que termina en `end`
+    (ahora por defecto), para que los endpoints de tendencia encuentren datos recientes.
+    """
+    store = TimeSeriesStore(path)
+    missing = n_rows - len(store)
+    if missing <= 0:
+        return store
+    end = end or datetime.now().replace(second=0, microsecond=0)
+    start = end - timedelta(minutes=step_minutes * (missing - 1))
+    df = generate_data.generate_simulated_data(missing * step_minutes / 60, seed=SEED,
+                                               step_minutes=step_minutes, start=start)
+    store.append_many({
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[s]').astype(np.int64),
+        'aqi': df['aqi'].to_numpy(),
+        'pm25': df['pm25'].to_numpy(),
+        'pm10': df['pm10'].to_numpy(),
+        'no2': df['no2'].to_numpy(),
+        'co': df['co'].to_numpy(),
+        'station': station,
+    })
+    return store
+
+def raw_windows(n_windows, n_rows):
+    """n_windows ventanas (n_rows, 6) de RAW_INPUT_COLUMNS tomadas de la serie simulada."""
+    import ml_model
+
+    df = generate_data.generate_simulated_data(n_rows + n_windows, seed=SEED)
+    values = df.rename(columns=ml_model.COLUMN_ALIASES)[ml_model.RAW_INPUT_COLUMNS].to_numpy(dtype=np.float64)
+    return np.stack([values[i:i + n_rows] for i in range(n_windows)])
@@ -0,0 +1,134 @@
+# AirViewer/backend/benchmarks/fake_thingspeak.py
+# Sustituto local de ThingSpeak (feeds/last.json y feeds.json) para pruebas de carga sin red
+
+import calendar
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+
+class FakeThingSpeak:
+    """
+    Canal sintético: una entrada nueva cada entry_interval_s (reloj real) con valores
+    deterministas por entry_id. delay_s simula la latencia del servicio real y
+    `overrides` ({entry_id: {field: valor}}) permite servir entradas incompletas o nulas.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, entry_interval_s=15.0, delay_s=0.0, history_entries=5000):
+        self.entry_interval_s = entry_interval_s
+        self.delay_s = delay_s
+        self.history_entries = history_entries
+        self.started_at = time.time()
+        self.requests = 0
+        self.overrides = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-thingspeak', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # --- Datos del canal ---
+
+    def last_entry_id(self):
+        return self.history_entries + int((time.time() - self.started_at) / self.entry_interval_s)
+
+    def _entry_time(self, entry_id):
+        return self.started_at + (entry_id - self.history_entries) * self.entry_interval_s
+
+    def entry(self, entry_id):
+        phase = entry_id * 2 * np.pi / 240
+        pm25 = 30 + 15 * np.sin(phase) + (entry_id * 7919 % 13) / 4
+        entry = {
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self._entry_time(entry_id))),
+            "entry_id": entry_id,
+            "field1": f"{pm25:.2f}",
+            "field2": f"{pm25 * 1.6:.2f}",
+            "field3": f"{40 + 10 * np.cos(phase):.2f}",
+            "field4": f"{3 + np.sin(phase):.2f}",
+            "field5": "22.5",
+        }
+        entry.update(self.overrides.get(entry_id, {}))
+        return entry
+
+    def feeds(self, query):
+        last = self.last_entry_id()
+        ids = range(1, last + 1)
+        if 'start' in query or 'end' in query:
+            epoch = lambda s: calendar.timegm(time.strptime(s, '%Y-%m-%d %H:%M:%S'))
+            lo = epoch(query['start']) if 'start' in query else float('-inf')
+            hi = epoch(query['end']) if 'end' in query else float('inf')
+            ids = [i for i in ids if lo <= self._entry_time(i) <= hi]
+        results = int(query.get('results', 100))
+        selected = list(ids)[-results:] if results else []
+        return {
+            "channel": {"id": 0, "name": "AirViewer (fake)", "last_entry_id": last,
+                        "created_at": self.entry(1)["created_at"]},
+            "feeds": [self.entry(i) for i in selected],
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como el servicio real
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                if fake.delay_s:
+                    time.sleep(fake.delay_s)
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith('/feeds/last.json'):
+                    payload = fake.entry(fake.last_entry_id())
+                elif url.path.endswith('/feeds.json'):
+                    payload = fake.feeds(query)
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ThingSpeak local para pruebas.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--entry-interval', type=float, default=15.0)
+    parser.add_argument('--delay-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeThingSpeak(port=args.port, entry_interval_s=args.entry_interval, delay_s=args.delay_ms / 1000)
+    print(f"ThingSpeak simulado en {fake.start()} (THINGSPEAK_BASE_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,229 @@
+# AirViewer/backend/benchmarks/load_test.py
+# Prueba de carga de la API (in-process o detrás de gunicorn) contra un ThingSpeak local
+
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+
+from benchmarks import datasets, results
+from benchmarks.fake_thingspeak import FakeThingSpeak
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# =======================================================
+# CONFIGURACIÓN DE LA PRUEBA
+# =======================================================
+DEFAULT_CONCURRENCY = 16
+DEFAULT_DURATION_S = 20
+DEFAULT_WARMUP_S = 3
+DEFAULT_HISTORY_ROWS = 24 * 60     # 60 días horarios en el almacén
+REQUEST_TIMEOUT_S = 30
+STARTUP_TIMEOUT_S = 90
+
+
+def _batch_body(n_stations=8):
+    windows = datasets.raw_windows(n_stations, 24).round(2).tolist()
+    return {"stations": [{"name": f"station_{i}", "window": w} for i, w in enumerate(windows)]}
+
+def default_endpoints():
+    """nombre -> (método, ruta, cuerpo JSON). La mezcla imita un dashboard más un cliente batch."""
+    week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    return {
+        "data_current": ('GET', '/api/v1/data/current', None),
+        "data_last_24h": ('GET', '/api/v1/data/last_24h', None),
+        "data_last_7d": ('GET', '/api/v1/data/last_7d', None),
+        "prediction_next_24h": ('GET', '/api/v1/prediction/next_24h', None),
+        "prediction_batch_8": ('POST', '/api/v1/prediction/batch', _batch_body()),
+        "history_7d": ('GET', f'/api/v1/history?start_date={week_ago}', None),
+        "health_ready": ('GET', '/api/v1/health/ready', None),
+    }
+
+
+# =======================================================
+# SERVIDORES
+# =======================================================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_until_up(base_url, timeout=STARTUP_TIMEOUT_S):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + '/api/v1/health/live', timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"El servidor no respondió en {timeout} s: {base_url}")
+
+class InProcessServer:
+    """La app en este proceso con el servidor WSGI multihilo de werkzeug (sin fork)."""
+
+    def __init__(self, env):
+        self.env = env
+
+    def __enter__(self):
+        from werkzeug.serving import make_server
+
+        os.environ.update(self.env)  # app lee la configuración al importarse
+        os.chdir(REPO_ROOT)
+        import app as airviewer_app
+
+        airviewer_app.initialize_ml_components()
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Sin una línea de log por petición
+        self._server = make_server('127.0.0.1', 0, airviewer_app.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, name='bench-wsgi', daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        _wait_until_up(self.base_url)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+
+class GunicornServer:
+    """gunicorn con gunicorn.conf.py (preload, gthread) en un subproceso."""
+
+    def __init__(self, env, workers=2, threads=None):
+        self.env = env
+        self.workers = workers
+        self.threads = threads
+
+    def __enter__(self):
+        port = _free_port()
+        cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(self.workers), '--log-level', 'warning']
+        if self.threads:
+            cmd += ['--threads', str(self.threads)]
+        self._process = subprocess.Popen(cmd, cwd=REPO_ROOT, env={**os.environ, **self.env})
+        self.base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_until_up(self.base_url)
+        except Exception:
+            self._process.kill()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+
+
+# =======================================================
+# GENERADOR DE CARGA
+# =======================================================
+
+def run_load(base_url, endpoints, concurrency=DEFAULT_CONCURRENCY, duration_s=DEFAULT_DURATION_S,
+             warmup_s=DEFAULT_WARMUP_S):
+    """
+    `concurrency` clientes en bucle cerrado (cada uno con su sesión keep-alive) recorren los
+    endpoints en orden rotado durante duration_s. El calentamiento no se mide.
+    Retorna {endpoint: resumen de latencias, ..., "_all": total}.
+    """
+    names = list(endpoints)
+    samples = [defaultdict(list) for _ in range(concurrency)]
+    failures = [defaultdict(int) for _ in range(concurrency)]
+    measure_from = time.monotonic() + warmup_s
+    stop_at = measure_from + duration_s
+
+    def client(i):
+        session = requests.Session()
+        k = i
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = names[k % len(names)]
+            k += 1
+            method, path, body = endpoints[name]
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=REQUEST_TIMEOUT_S)
+                response.content  # noqa: B018 (se mide hasta el último byte)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if now >= measure_from:
+                samples[i][name].append(elapsed)
+                if not ok:
+                    failures[i][name] += 1
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    summary, everything, total_errors = {}, [], 0
+    for name in names:
+        latencies = [x for s in samples for x in s[name]]
+        errors = sum(f[name] for f in failures)
+        summary[name] = dict(results.latency_summary(latencies, duration_s), errors=errors)
+        everything += latencies
+        total_errors += errors
+    summary["_all"] = dict(results.latency_summary(everything, duration_s), errors=total_errors)
+    return summary
+
+def print_summary(summary):
+    print(f"{'endpoint':<22}{'n':>8}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}")
+    for name, s in summary.items():
+        if not s.get("count"):
+            print(f"{name:<22}{0:>8}")
+            continue
+        print(f"{name:<22}{s['count']:>8}{s['errors']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['throughput_rps']:>10}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de AirViewer.")
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION_S)
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP_S)
+    parser.add_argument('--workers', type=int, default=2, help="Workers de gunicorn.")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos por worker (gthread).")
+    parser.add_argument('--history-rows', type=int, default=DEFAULT_HISTORY_ROWS)
+    parser.add_argument('--upstream-delay-ms', type=float, default=0.0, help="Latencia simulada de ThingSpeak.")
+    parser.add_argument('--endpoints', default=None, help="Lista separada por comas (por defecto, todos).")
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    endpoints = default_endpoints()
+    if args.endpoints:
+        endpoints = {name: endpoints[name] for name in args.endpoints.split(',')}
+
+    fake = FakeThingSpeak(delay_s=args.upstream_delay_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix='airviewer-bench-')
+    env = {
+        "THINGSPEAK_BASE_URL": fake.start(),
+        "AIRVIEWER_STORE_DIR": os.path.join(workdir, 'store'),
+        "AIRVIEWER_MODEL_REGISTRY": os.path.join(workdir, 'registry'),  # vacío: se sirve el modelo base
+    }
+    datasets.build_history_store(env["AIRVIEWER_STORE_DIR"], args.history_rows)
+
+    server = (GunicornServer(env, args.workers, args.threads) if args.mode == 'gunicorn'
+              else InProcessServer(env))
+    with server:
+        summary = run_load(server.base_url, endpoints, args.concurrency, args.duration, args.warmup)
+    fake.stop()
+
+    print_summary(summary)
+    config = {k: v for k, v in vars(args).items() if k != 'output'}
+    print(f"Resultados: {results.write_results(f'load-{args.mode}', config, summary, args.output)}")
@@ -0,0 +1,131 @@
+# AirViewer/backend/benchmarks/micro.py
+# Micro-benchmarks: predicción, ventanas de entrenamiento, generación de datos y serialización del histórico
+
+import gc
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import generate_data
+import history_export
+import ml_model
+from benchmarks import datasets, results
+
+# Tamaños por caso (filas de entrada, horas generadas, filas del almacén, ...)
+SIZES = {
+    "make_prediction": [24, 24 * 30, 24 * 365],
+    "make_batch_prediction": [1, 32, 512],
+    "create_dataset": [1_000, 10_000, 100_000],
+    "generate_simulated_data": [1_000, 10_000, 100_000],
+    "history_json": [1_000, 10_000, 100_000],
+    "history_csv": [1_000, 10_000, 100_000],
+}
+QUICK_SIZES = {name: sizes[:2] for name, sizes in SIZES.items()}
+MIN_REPEAT = 5
+TARGET_SECONDS = 1.0  # Tiempo aproximado de medición por caso
+
+
+def measure(fn, min_repeat=MIN_REPEAT, target_s=TARGET_SECONDS):
+    """
+    Ejecuta fn una vez sin medir y luego las veces que quepan en target_s (mínimo
+    min_repeat), con el GC desactivado durante cada llamada. Mediana y mínimo en ms.
+    """
+    fn()
+    timings = []
+    deadline = time.perf_counter() + target_s
+    while len(timings) < min_repeat or time.perf_counter() < deadline:
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+        if len(timings) >= 10000:
+            break
+    return {
+        "repeat": len(timings),
+        "median_ms": round(statistics.median(timings) * 1000, 4),
+        "min_ms": round(min(timings) * 1000, 4),
+    }
+
+
+# =======================================================
+# CASOS
+# =======================================================
+
+def bench_make_prediction(model, scaler, n_rows):
+    """Una ventana de n_rows filas: la normalización Cstd recorre todas, el modelo usa las últimas 24."""
+    window = pd.DataFrame(datasets.raw_windows(1, n_rows)[0], columns=ml_model.RAW_INPUT_COLUMNS)
+    return lambda: ml_model.make_prediction(model, scaler, window.copy())
+
+def bench_make_batch_prediction(model, scaler, n_windows):
+    windows = datasets.raw_windows(n_windows, ml_model.TIME_STEP)
+    return lambda: ml_model.make_batch_prediction(model, scaler, windows)
+
+def bench_create_dataset(n_rows):
+    features = np.random.default_rng(datasets.SEED).random((n_rows, len(ml_model.FEATURE_COLUMNS)))
+    return lambda: ml_model.create_dataset(features, features[:, 0], n_future=ml_model.N_FUTURE)
+
+def bench_generate_simulated_data(n_hours):
+    return lambda: generate_data.generate_simulated_data(n_hours, seed=datasets.SEED)
+
+def bench_history_json(store):
+    """Lo que hace GET /api/v1/history sin filtro: registros del almacén + JSON."""
+    return lambda: json.dumps(store.query())
+
+def bench_history_csv(store):
+    """Descarga CSV completa (/api/v1/history/download), consumiendo el generador."""
+    return lambda: sum(len(part) for part in history_export.iter_csv(store))
+
+def run_all(sizes=SIZES, cases=None, target_s=TARGET_SECONDS):
+    """Ejecuta los casos pedidos; retorna {"<caso>[<tamaño>]": mediciones}."""
+    cases = cases or list(sizes)
+    out = {}
+    model = scaler = None
+    if any(c.startswith('make_') for c in cases):
+        model, scaler = ml_model.load_artefacts()
+        if model is None:
+            raise RuntimeError("No hay artefactos del modelo en model/ para medir la predicción.")
+
+    with tempfile.TemporaryDirectory(prefix='airviewer-micro-') as workdir:
+        for case in cases:
+            for size in sizes[case]:
+                if case == 'make_prediction':
+                    fn = bench_make_prediction(model, scaler, size)
+                elif case == 'make_batch_prediction':
+                    fn = bench_make_batch_prediction(model, scaler, size)
+                elif case == 'create_dataset':
+                    fn = bench_create_dataset(size)
+                elif case == 'generate_simulated_data':
+                    fn = bench_generate_simulated_data(size)
+                else:
+                    store = datasets.build_history_store(os.path.join(workdir, f"store_{size}"), size)
+                    fn = bench_history_json(store) if case == 'history_json' else bench_history_csv(store)
+                key = f"{case}[{size}]"
+                out[key] = dict(measure(fn, target_s=target_s), size=size)
+                print(f"{key:<40} mediana {out[key]['median_ms']:>11.3f} ms   mín {out[key]['min_ms']:>11.3f} ms"
+                      f"   ({out[key]['repeat']} rep.)")
+    return out
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de AirViewer.")
+    parser.add_argument('--cases', default=None, help=f"Separados por comas: {','.join(SIZES)}")
+    parser.add_argument('--quick', action='store_true', help="Solo los tamaños pequeños.")
+    parser.add_argument('--target-seconds', type=float, default=TARGET_SECONDS)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    cases = args.cases.split(',') if args.cases else None
+    measured = run_all(sizes, cases, args.target_seconds)
+    config = {"cases": cases or list(sizes), "sizes": sizes, "target_seconds": args.target_seconds}
+    print(f"Resultados: {results.write_results('micro', config, measured, args.output)}")
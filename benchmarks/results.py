@@ -0,0 +1,131 @@
+# AirViewer/backend/benchmarks/results.py
+# Archivos de resultados (JSON) y comparación entre ejecuciones para detectar regresiones
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SCHEMA_VERSION = 1
+REGRESSION_THRESHOLD = 0.10  # Un aumento mayor al 10% se marca como regresión
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment():
+    """Commit, versiones e intérprete: lo necesario para saber si dos resultados son comparables."""
+    return {
+        "commit": _git('rev-parse', '--short', 'HEAD'),
+        "dirty": bool(_git('status', '--porcelain', '--untracked-files=no')),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def latency_summary(seconds, elapsed=None):
+    """p50/p95/p99/media/máx en milisegundos (y rps si se da la duración de la fase)."""
+    values = np.asarray(seconds, dtype=np.float64) * 1000.0
+    if values.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    summary = {
+        "count": int(values.size),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(values.size / elapsed, 2)
+    return summary
+
+def write_results(kind, config, results, output=None):
+    """Guarda {kind, config, environment, results}; retorna la ruta escrita."""
+    env = environment()
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{kind}-{env['commit'] or 'nogit'}-{stamp}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            "schema": SCHEMA_VERSION,
+            "kind": kind,
+            "created_at": datetime.now().isoformat() + "Z",
+            "unix_time": int(time.time()),
+            "environment": env,
+            "config": config,
+            "results": results,
+        }, f, indent=2)
+    return output
+
+
+# =======================================================
+# COMPARACIÓN
+# =======================================================
+
+# Métricas comparadas por tipo de benchmark (mayor = peor, salvo el throughput)
+_LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'median_ms')
+_HIGHER_IS_BETTER = ('throughput_rps',)
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compara dos archivos de resultados del mismo tipo, caso por caso.
+    Retorna filas {case, metric, base, new, change} con change relativo (+ = peor).
+    """
+    if baseline["kind"] != current["kind"]:
+        raise ValueError(f"No comparables: {baseline['kind']} vs {current['kind']}")
+    rows = []
+    for case, new in current["results"].items():
+        base = baseline["results"].get(case)
+        if not base:
+            continue
+        for metric in _LOWER_IS_BETTER + _HIGHER_IS_BETTER:
+            if not base.get(metric) or new.get(metric) is None:
+                continue
+            change = (new[metric] - base[metric]) / base[metric]
+            if metric in _HIGHER_IS_BETTER:
+                change = -change
+            rows.append({"case": case, "metric": metric, "base": base[metric], "new": new[metric],
+                         "change": round(change, 4), "regression": change > threshold})
+    return rows
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmarks.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    cmp_parser = sub.add_parser('compare')
+    cmp_parser.add_argument('baseline')
+    cmp_parser.add_argument('current')
+    cmp_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    base, new = load(args.baseline), load(args.current)
+    print(f"base {base['environment']['commit']}  ->  nuevo {new['environment']['commit']}")
+    try:
+        rows = compare(base, new, args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    for row in rows:
+        flag = "  REGRESIÓN" if row["regression"] else ""
+        print(f"{row['case']:<48} {row['metric']:<15} {row['base']:>12} {row['new']:>12} {row['change']:>+8.1%}{flag}")
+    # Código de salida 1 si hay regresiones (útil en CI)
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
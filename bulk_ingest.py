@@ -0,0 +1,203 @@
+# AirViewer/backend/bulk_ingest.py
+# Ingesta masiva del histórico (NDJSON o CSV en streaming, validación vectorizada por bloques)
+
+import csv
+import json
+import numpy as np
+import pandas as pd
+
+from timeseries_store import VALUE_COLUMNS, DEFAULT_STATION
+
+# =======================================================
+# CONFIGURACIÓN DE LA INGESTA
+# =======================================================
+INGEST_CHUNK_ROWS = 20000      # Líneas validadas y escritas por operación del almacén
+READ_BLOCK_BYTES = 1 << 20     # Lectura del cuerpo de la petición
+MAX_REPORTED_ERRORS = 100      # Errores por línea devueltos en la respuesta
+
+REQUIRED_FIELDS = ('timestamp', 'pm25', 'pm10')
+NUMERIC_FIELDS = VALUE_COLUMNS  # aqi, pm25, pm10, no2, co
+INGEST_FORMATS = ('ndjson', 'csv')
+
+
+def iter_line_chunks(stream, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Lee un stream binario por bloques y entrega (número de la primera línea, [líneas])
+    con hasta chunk_rows líneas no vacías, sin cargar el cuerpo completo.
+    """
+    pending = b''
+    lines, first_line, line_no = [], 1, 0
+    while True:
+        block = stream.read(READ_BLOCK_BYTES)
+        if not block:
+            break
+        parts = (pending + block).split(b'\n')
+        pending = parts.pop()
+        for raw in parts:
+            line_no += 1
+            if not lines:
+                first_line = line_no
+            lines.append(raw.rstrip(b'\r'))
+            if len(lines) >= chunk_rows:
+                yield first_line, lines
+                lines = []
+    if pending.strip():
+        line_no += 1
+        if not lines:
+            first_line = line_no
+        lines.append(pending.rstrip(b'\r'))
+    if lines:
+        yield first_line, lines
+
+
+# =======================================================
+# PARSEO (DEPENDIENTE DEL FORMATO)
+# =======================================================
+
+def _parse_ndjson(lines, first_line):
+    """Líneas JSON -> (DataFrame, números de línea, errores de sintaxis)."""
+    records, numbers, errors = [], [], []
+    for i, raw in enumerate(lines):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            errors.append({"line": first_line + i, "error": f"JSON inválido: {e.msg}"})
+            continue
+        if not isinstance(record, dict):
+            errors.append({"line": first_line + i, "error": "Cada línea debe ser un objeto JSON"})
+            continue
+        records.append(record)
+        numbers.append(first_line + i)
+    return pd.DataFrame.from_records(records), np.array(numbers, dtype=np.int64), errors
+
+def _parse_csv(lines, first_line, header):
+    """Líneas CSV (sin cabecera) -> (DataFrame, números de línea, errores de número de campos)."""
+    rows, numbers, errors = [], [], []
+    reader = csv.reader(line.decode('utf-8', 'replace') for line in lines)
+    for i, row in enumerate(reader):
+        if not row:
+            continue
+        if len(row) != len(header):
+            errors.append({"line": first_line + i, "error": f"Se esperaban {len(header)} campos, hay {len(row)}"})
+            continue
+        rows.append(row)
+        numbers.append(first_line + i)
+    return pd.DataFrame(rows, columns=header), np.array(numbers, dtype=np.int64), errors
+
+
+# =======================================================
+# VALIDACIÓN VECTORIZADA
+# =======================================================
+
+def validate_chunk(df, line_numbers):
+    """
+    Valida y convierte un bloque completo con operaciones de columna.
+    Retorna (columnas listas para TimeSeriesStore.append_many, errores por línea).
+    El AQI se calcula (pm25 * 2.5, como add_new_record) cuando no viene en la línea.
+    """
+    n = len(df)
+    messages = np.full(n, None, dtype=object)
+
+    def reject(mask, message):
+        mask = np.asarray(mask) & (messages == None)  # noqa: E711 (comparación elemento a elemento)
+        messages[mask] = message
+
+    for field in REQUIRED_FIELDS:
+        if field not in df:
+            reject(np.ones(n, dtype=bool), f"Falta el campo '{field}'")
+        else:
+            reject(df[field].isna().to_numpy() | (df[field].astype(str).str.strip() == '').to_numpy(),
+                   f"Falta el campo '{field}'")
+
+    timestamps = None
+    if 'timestamp' in df:
+        # utc=True: un bloque que mezcla offsets y horas sin zona no aborta el parseo
+        # completo (pandas lanza 'Mixed timezones'); las horas sin zona se toman como UTC
+        parsed = pd.to_datetime(df['timestamp'].astype(str), errors='coerce', format='ISO8601', utc=True)
+        reject(parsed.isna().to_numpy(), "timestamp inválido (se espera ISO 8601)")
+        timestamps = parsed.dt.tz_localize(None).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+    values = {}
+    for field in NUMERIC_FIELDS:
+        if field not in df:
+            continue
+        raw = df[field]
+        numeric = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64)
+        given = raw.notna().to_numpy() & (raw.astype(str).str.strip() != '').to_numpy()
+        reject(given & np.isnan(numeric), f"'{field}' no es numérico")
+        reject(given & np.isinf(numeric), f"'{field}' debe ser un número finito")
+        reject(given & (numeric < 0), f"'{field}' no puede ser negativo")
+        values[field] = numeric
+
+    valid = messages == None  # noqa: E711
+    errors = [{"line": int(line), "error": msg} for line, msg in zip(line_numbers[~valid], messages[~valid])]
+    if not valid.any():
+        return None, errors
+
+    columns = {'timestamp': timestamps[valid]}
+    for field, numeric in values.items():
+        columns[field] = numeric[valid]
+    if 'aqi' in columns:
+        missing = np.isnan(columns['aqi'])
+        columns['aqi'][missing] = np.floor(columns['pm25'][missing] * 2.5)
+    else:
+        columns['aqi'] = np.floor(columns['pm25'] * 2.5)
+
+    if 'station' in df:
+        station = df['station'].to_numpy(dtype=object)[valid]
+        station[pd.isna(station) | (station == '')] = DEFAULT_STATION
+        columns['station'] = station.astype(str).tolist()
+    else:
+        columns['station'] = DEFAULT_STATION
+    return columns, errors
+
+
+# =======================================================
+# INGESTA
+# =======================================================
+
+def ingest_stream(store, stream, fmt='ndjson', chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Ingesta un cuerpo NDJSON o CSV (con cabecera) en el almacén: cada bloque se parsea,
+    se valida y se añade con una sola llamada a append_many. Las líneas inválidas se
+    omiten y se reportan. Retorna el resumen (aceptadas, rechazadas, errores, ids).
+    """
+    accepted = rejected = 0
+    errors, first_id, last_id = [], None, None
+    header = None
+
+    for first_line, lines in iter_line_chunks(stream, chunk_rows):
+        if fmt == 'csv':
+            if header is None:
+                # La cabecera es la primera línea no vacía (puede no estar en el primer bloque)
+                start = next((i for i, line in enumerate(lines) if line.strip()), None)
+                if start is None:
+                    continue
+                header = [name.strip() for name in next(csv.reader([lines[start].decode('utf-8-sig')]))]
+                lines, first_line = lines[start + 1:], first_line + start + 1
+            df, numbers, chunk_errors = _parse_csv(lines, first_line, header)
+        else:
+            df, numbers, chunk_errors = _parse_ndjson(lines, first_line)
+
+        columns, invalid = validate_chunk(df, numbers) if len(df) else (None, [])
+        chunk_errors += invalid
+        if columns is not None:
+            ids = store.append_many(columns)
+            accepted += len(ids)
+            first_id = int(ids[0]) if first_id is None else first_id
+            last_id = int(ids[-1])
+
+        rejected += len(chunk_errors)
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.extend(sorted(chunk_errors, key=lambda e: e["line"])[:MAX_REPORTED_ERRORS - len(errors)])
+
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+        "first_id": first_id,
+        "last_id": last_id,
+    }
@@ -0,0 +1,81 @@
+# AirViewer/backend/forecast_cache.py
+# Caché de pronósticos por ventana de entrada (LRU + TTL)
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# =======================================================
+# CONFIGURACIÓN DE LA CACHÉ
+# =======================================================
+CACHE_MAX_ENTRIES = 128
+CACHE_TTL_S = 300
+
+
+class ForecastCache:
+    """
+    Guarda el vector de PM2.5_STD pronosticado, indexado por un digest de la ventana
+    escalada + la versión del modelo + el horizonte. Si la ventana cambia (entra una
+    lectura nueva) la clave cambia sola; invalidate() además vacía la caché al ingerir.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_s=CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(scaled_window, model_version, n_future):
+        digest = hashlib.blake2b(np.ascontiguousarray(scaled_window, dtype=np.float32).tobytes(), digest_size=16)
+        digest.update(f"|{model_version}|{n_future}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Valor cacheado o None (si no existe o expiró). Un acierto lo marca como reciente."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_s:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        value = np.array(value)
+        value.setflags(write=False)  # Compartido entre peticiones: solo lectura
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
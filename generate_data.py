@@ -1,10 +1,15 @@
+import os
+import re
+import shutil
+import unicodedata
 import pandas as pd
 import random
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 # =======================================================
-# 1. CONFIGURACIÓN Y CÁLCULO DE AQI 
+# 1. CONFIGURACIÓN Y CÁLCULO DE AQI
 # =======================================================
 
 # Configuración de los datos
@@ -22,6 +27,16 @@ ESTACIONES = [
     {'name': 'Estación Residencial', 'lat': -8.1250, 'lng': -79.0400}
 ]
 
+# Desplazamiento del nivel base de PM2.5 por estación (µg/m³)
+OFFSET_PM25_ESTACION = {
+    'Estación Centro Histórico': 0.0,
+    'Estación Industrial': 8.0,
+    'Estación Residencial': -5.0,
+}
+
+OUTPUT_PATH = 'data/historical_data.csv'
+CHUNK_ROWS = 500_000  # Filas generadas y escritas por bloque
+
 def calculate_aqi(pm25, pm10, no2, co):
     """Calcula un AQI simple basado en PM2.5 (Simulación)."""
     # Usaremos una conversión simplificada solo de PM2.5 para mantener el script autocontenido
@@ -29,69 +44,188 @@ def calculate_aqi(pm25, pm10, no2, co):
         return round(pm25 * 3) # Valor más agresivo si está alto
     return round(pm25 * 2.5) + random.randint(-5, 5)
 
+def calculate_aqi_vectorized(pm25, rng):
+    """Versión vectorizada de calculate_aqi para un array completo de PM2.5."""
+    pm25 = np.asarray(pm25, dtype=np.float64)
+    noise = rng.integers(-5, 6, size=pm25.shape)
+    return np.where(pm25 > 50, np.round(pm25 * 3), np.round(pm25 * 2.5) + noise).astype(np.int64)
+
 # =======================================================
-# 2. FUNCIÓN DE GENERACIÓN PRINCIPAL 
+# 2. FUNCIÓN DE GENERACIÓN PRINCIPAL
 # =======================================================
 
-def generate_simulated_data(num_hours):
-    """Genera datos simulados para 1 año completo usando ciclos de Numpy."""
-    
-    # 1. Generar la secuencia de tiempo
-    timestamps = [START_DATE + timedelta(hours=i) for i in range(num_hours)]
-    
-    # 2. Generar datos base con tendencia diaria/anual
-    time_index = np.arange(num_hours)
-    
+def _generate_block(start_index, n_rows, rng, step_minutes=60, start=START_DATE, station=None):
+    """
+    Genera las filas [start_index, start_index + n_rows) de la serie.
+    Los ciclos dependen del índice absoluto, así que los bloques encadenan sin saltos.
+    """
+    step = np.timedelta64(step_minutes, 'm')
+    index = np.arange(start_index, start_index + n_rows)
+    timestamps = np.datetime64(start, 'm') + index * step
+    time_index = index * (step_minutes / 60.0)  # Tiempo en horas
+
     # Simulación de PM2.5 (Tendencia anual + ruido diario)
-    annual_cycle = 20 * np.sin(time_index * 2 * np.pi / (365 * 24)) 
-    daily_cycle = 10 * np.sin(time_index * 2 * np.pi / 24) 
-    
+    annual_cycle = 20 * np.sin(time_index * 2 * np.pi / (365 * 24))
+    daily_cycle = 10 * np.sin(time_index * 2 * np.pi / 24)
+    offset = OFFSET_PM25_ESTACION.get(station['name'], 0.0) if station else 0.0
+
     # PM2.5 base + ciclos + ruido + ALEATORIEDAD FINA PARA SIMULACIÓN DE LECTURA
-    PM2_5 = 33 + annual_cycle + daily_cycle + np.random.normal(0, 5, num_hours)
-    PM2_5 = np.clip(PM2_5, 15, 80) 
-    
+    PM2_5 = 33 + offset + annual_cycle + daily_cycle + rng.normal(0, 5, n_rows)
+    PM2_5 = np.clip(PM2_5, 15, 80)
+
     # PM10 (Asegurando que no sea excesivamente alto)
-    PM10 = PM2_5 * np.random.uniform(1.2, 1.8, num_hours)
+    PM10 = PM2_5 * rng.uniform(1.2, 1.8, n_rows)
     PM10 = np.clip(PM10, 25, 120)
-    
-    # NO2 y CO 
-    NO2 = 25 + 5 * np.sin(time_index * 2 * np.pi / 24) + np.random.normal(0, 2, num_hours)
-    CO = 55 + 10 * np.sin(time_index * 2 * np.pi / 24) + np.random.normal(0, 5, num_hours)
 
-    # Crear el DataFrame y calcular AQI y otros datos requeridos por la tesis
+    # NO2 y CO
+    NO2 = 25 + 5 * np.sin(time_index * 2 * np.pi / 24) + rng.normal(0, 2, n_rows)
+    CO = 55 + 10 * np.sin(time_index * 2 * np.pi / 24) + rng.normal(0, 5, n_rows)
+
+    # Variables meteorológicas y CO2 que consume el modelo LSTM (ml_model.RAW_INPUT_COLUMNS)
+    Temperatura = 22 + 3 * np.sin((time_index - 9) * 2 * np.pi / 24) + rng.normal(0, 0.5, n_rows)
+    Humedad = np.clip(80 - 8 * np.sin((time_index - 9) * 2 * np.pi / 24) + rng.normal(0, 2, n_rows), 40, 100)
+    Presion = 1010 + 3 * np.sin(time_index * 2 * np.pi / (365 * 24)) + rng.normal(0, 1, n_rows)
+    CO2 = 420 + 4 * PM2_5 + rng.normal(0, 20, n_rows)
+
+    PM2_5 = PM2_5.round(2)
     df = pd.DataFrame({
-        'timestamp': timestamps,
-        'PM2_5': PM2_5.round(2),
-        'PM10': PM10.round(2),
-        'NO2': NO2.round(2),
-        'CO': CO.round(2),
-        'Latitud': LATITUD,
-        'Longitud': LONGITUD
+        'timestamp': timestamps.astype('datetime64[s]'),
+        'pm25': PM2_5,
+        'pm10': PM10.round(2),
+        'no2': NO2.round(2),
+        'co': CO.round(2),
+        'Temperatura': Temperatura.round(2),
+        'Humedad': Humedad.round(2),
+        'Presion': Presion.round(2),
+        'CO2': CO2.round(0),
+        'Latitud': station['lat'] if station else LATITUD,
+        'Longitud': station['lng'] if station else LONGITUD,
+        # AQI vectorizado (antes df.apply fila a fila)
+        'aqi': calculate_aqi_vectorized(PM2_5, rng),
     })
-    
-    # Calcular el AQI para cada fila (usando la función calculate_aqi)
-    df['AQI'] = df.apply(lambda row: calculate_aqi(row['PM2_5'], row['PM10'], row['NO2'], row['CO']), axis=1)
-    
-    # Renombrar columnas para la salida final de la API
-    df = df.rename(columns={'PM2_5': 'pm25', 'PM10': 'pm10', 'NO2': 'no2', 'CO': 'co', 'AQI': 'aqi'})
-    
+    if station:
+        df.insert(1, 'station', station['name'])
     return df
 
+def generate_simulated_data(num_hours, seed=None, station=None, step_minutes=60, start=START_DATE):
+    """
+    Genera datos simulados usando ciclos de Numpy, sin bucles Python por fila.
+    num_hours: duración de la serie en horas; step_minutes=1 produce resolución por minuto.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = int(num_hours * 60 // step_minutes)
+    return _generate_block(0, n_rows, rng, step_minutes, start, station)
+
+def iter_simulated_chunks(num_hours, seed=None, station=None, step_minutes=60, start=START_DATE,
+                          chunk_rows=CHUNK_ROWS):
+    """Igual que generate_simulated_data, pero entrega la serie en bloques de chunk_rows filas."""
+    rng = np.random.default_rng(seed)
+    n_rows = int(num_hours * 60 // step_minutes)
+    for start_index in range(0, n_rows, chunk_rows):
+        yield _generate_block(start_index, min(chunk_rows, n_rows - start_index), rng, step_minutes, start, station)
+
 # =======================================================
-# 3. EJECUCIÓN DEL SCRIPT
+# 3. GENERACIÓN MULTI-ESTACIÓN EN PARALELO
 # =======================================================
 
-if __name__ == '__main__':
-    # 🛑 Se llama a la función corregida y principal 🛑
-    simulated_df = generate_simulated_data(HOURS) 
-    
-    # Guardar el archivo
-    simulated_df.to_csv('data/historical_data.csv', index=False)
-
-    print(f"Dataset de simulación creado exitosamente en: AirViewer/backend/data/historical_data.csv")
-    print(f"Dimensiones del dataset: {simulated_df.shape} ({HOURS} registros)")
-
-
-
+def station_slug(name):
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', ascii_name.lower()).strip('_')
+
+def _write_chunks(chunks, path, fmt):
+    """
+    Escribe los bloques uno a uno: Parquet con un row group por bloque y CSV en modo
+    append. Si pyarrow está instalado, el CSV usa su escritor (varias veces más rápido).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError:
+        pa = None
+        if fmt == 'parquet':
+            raise
+
+    writer = None
+    for i, df in enumerate(chunks):
+        if pa is None:
+            df.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            continue
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema) if fmt == 'parquet' else pa_csv.CSVWriter(path, table.schema)
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+    return path
+
+def _generate_station_file(args):
+    """Tarea de un proceso del pool: genera y escribe la serie completa de una estación."""
+    station, seed_seq, num_hours, step_minutes, start, path, fmt, chunk_rows = args
+    chunks = iter_simulated_chunks(num_hours, np.random.default_rng(seed_seq), station,
+                                   step_minutes, start, chunk_rows)
+    return _write_chunks(chunks, path, fmt)
+
+def generate_all_stations(num_hours, output_path=OUTPUT_PATH, fmt='csv', seed=None, step_minutes=60,
+                          start=START_DATE, workers=None, chunk_rows=CHUNK_ROWS):
+    """
+    Genera todas las ESTACIONES en procesos paralelos, cada una con su propio flujo
+    aleatorio reproducible (SeedSequence.spawn). En CSV las partes se concatenan en
+    output_path; en Parquet output_path es un directorio con un archivo por estación.
+    """
+    base, _ = os.path.splitext(output_path)
+    part_dir = base + ('_parts' if fmt == 'csv' else '')
+    os.makedirs(part_dir, exist_ok=True)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(ESTACIONES))
+    tasks = [
+        (station, seeds[i], num_hours, step_minutes, start,
+         os.path.join(part_dir, f"{station_slug(station['name'])}.{fmt}"), fmt, chunk_rows)
+        for i, station in enumerate(ESTACIONES)
+    ]
+    with ProcessPoolExecutor(max_workers=workers or len(tasks)) as pool:
+        parts = list(pool.map(_generate_station_file, tasks))
+
+    if fmt == 'parquet':
+        return part_dir
+
+    # Concatenación en streaming de las partes CSV (se omite la cabecera repetida)
+    with open(output_path, 'wb') as out:
+        for i, part in enumerate(parts):
+            with open(part, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out, length=1 << 20)
+    shutil.rmtree(part_dir)
+    return output_path
 
+# =======================================================
+# 4. EJECUCIÓN DEL SCRIPT
+# =======================================================
 
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generador de datos simulados de AirViewer.")
+    parser.add_argument('--hours', type=int, default=HOURS, help="Duración de la serie en horas.")
+    parser.add_argument('--step-minutes', type=int, default=60, help="Resolución (1 = por minuto).")
+    parser.add_argument('--all-stations', action='store_true', help="Generar todas las ESTACIONES en paralelo.")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+
+    if args.all_stations:
+        path = generate_all_stations(args.hours, args.output, args.format, args.seed,
+                                     args.step_minutes, workers=args.workers)
+        print(f"Dataset multi-estación creado exitosamente en: {path}")
+    else:
+        # 🛑 Se llama a la función corregida y principal 🛑
+        chunks = iter_simulated_chunks(args.hours, args.seed, step_minutes=args.step_minutes)
+        _write_chunks(chunks, args.output, args.format)
+        print(f"Dataset de simulación creado exitosamente en: {args.output}")
+        print(f"Duración del dataset: {args.hours} horas con paso de {args.step_minutes} min")
@@ -0,0 +1,54 @@
+# AirViewer/backend/gunicorn.conf.py
+# Arranque rápido de workers: el master importa la app y carga el modelo una sola vez;
+# los workers lo heredan por fork (copy-on-write) en lugar de cargarlo cada uno.
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+# /api/v1/data/stream mantiene conexiones SSE abiertas: con workers síncronos cada
+# dashboard bloquearía un worker entero. gthread atiende `threads` conexiones por worker
+# (un hilo dormido por cliente inactivo), así que el stream solo puede ocupar una parte
+# de los hilos: pasado ese cupo responde 503 y el resto queda libre para la API. Para
+# miles de clientes por worker se puede usar GUNICORN_WORKER_CLASS=gevent (requiere
+# instalar gevent), que conserva el cupo por defecto de live_stream.MAX_SUBSCRIBERS.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 64))
+STREAM_THREAD_SHARE = 0.5  # Fracción de hilos por worker que pueden ocupar las conexiones SSE
+
+if worker_class == 'gthread':
+    # Se fija antes de que preload_app importe la app (live_stream lee la variable al importarse)
+    os.environ.setdefault('AIRVIEWER_STREAM_MAX_CLIENTS', str(max(1, int(threads * STREAM_THREAD_SHARE))))
+
+
+def when_ready(server):
+    """Se ejecuta en el master, con la app ya importada y antes de crear los workers."""
+    import app as airviewer_app
+
+    airviewer_app.initialize_ml_components()
+    server.log.info(f"Modelo ML precargado en el master: {airviewer_app.ML_STATE['state']}")
+
+    # Mover los objetos existentes a la generación permanente: el GC de los workers
+    # no los recorre, así no se ensucian (y copian) las páginas compartidas.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """
+    Cada worker sigue el ring de ThingSpeak desde el arranque (no desde su primera
+    petición a /current o /stream): guarda las lecturas en el histórico y mantiene sus
+    agregados y alertas al día aunque nunca sirva esas rutas.
+    """
+    import app as airviewer_app
+
+    airviewer_app.THINGSPEAK_POLLER.start()
+
+
+def child_exit(server, worker):
+    """Las series de memoria del worker terminado dejan de exportarse en /metrics."""
+    import metrics
+
+    metrics.mark_worker_dead(worker.pid)
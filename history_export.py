@@ -0,0 +1,149 @@
+# AirViewer/backend/history_export.py
+# Exportación del histórico en streaming (CSV, CSV.gz, Parquet, Arrow)
+
+import zlib
+import numpy as np
+
+from timeseries_store import VALUE_COLUMNS, format_timestamps
+
+# =======================================================
+# CONFIGURACIÓN DE EXPORTACIÓN
+# =======================================================
+EXPORT_CHUNK_ROWS = 50000  # Filas leídas del almacén por bloque (memoria constante)
+
+CSV_HEADER = "timestamp,AQI,PM2.5,PM10,NO2,CO,station\n"
+
+# formato -> (mimetype, extensión)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+}
+
+
+def _format_column(values, pattern):
+    """Formatea una columna numérica completa; los NaN quedan como celda vacía."""
+    return ['' if v != v else pattern % v for v in values.tolist()]
+
+def _chunk_columns(chunk, stations):
+    """Bloque del almacén -> columnas listas para serializar (timestamps ISO y nombre de estación)."""
+    return {
+        "timestamp": format_timestamps(chunk['timestamp']),
+        **{name: chunk[name] for name in VALUE_COLUMNS},
+        "station": np.asarray(stations, dtype=object)[chunk['station']],
+    }
+
+
+# =======================================================
+# CSV
+# =======================================================
+
+def iter_csv(store, start=None, end=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Genera el CSV por bloques: nunca hay más de chunk_rows filas en memoria."""
+    stations = store.stations
+    yield CSV_HEADER.encode()
+    for chunk in store.iter_range(start, end, chunk_rows=chunk_rows):
+        cols = _chunk_columns(chunk, stations)
+        values = [_format_column(cols[name], '%d' if name == 'aqi' else '%.1f') for name in VALUE_COLUMNS]
+        rows = zip(cols['timestamp'].tolist(), *values, cols['station'].tolist())
+        yield ''.join(','.join(row) + '\n' for row in rows).encode()
+
+def iter_gzip(byte_chunks, level=6):
+    """Comprime en gzip un iterador de bytes sin acumular la salida completa."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> contenedor gzip
+    for data in byte_chunks:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# =======================================================
+# PARQUET / ARROW (pyarrow opcional)
+# =======================================================
+
+class _StreamSink:
+    """Destino tipo archivo que acumula lo escrito por pyarrow para vaciarlo entre bloques."""
+
+    def __init__(self):
+        self._parts = []
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def _arrow_batches(store, start, end, chunk_rows):
+    import pyarrow as pa
+
+    stations = store.stations
+    for chunk in store.iter_range(start, end, chunk_rows=chunk_rows):
+        cols = _chunk_columns(chunk, stations)
+        yield pa.record_batch({
+            "timestamp": pa.array(chunk['timestamp'].astype('datetime64[s]')),
+            **{name: pa.array(cols[name]) for name in VALUE_COLUMNS},
+            "station": pa.array(cols['station'].tolist(), type=pa.string()),
+        })
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [("timestamp", pa.timestamp('s'))]
+        + [(name, pa.float32()) for name in VALUE_COLUMNS]
+        + [("station", pa.string())]
+    )
+
+def iter_parquet(store, start=None, end=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Un row group por bloque; los bytes se emiten a medida que pyarrow los escribe."""
+    import pyarrow.parquet as pq
+
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, _arrow_schema(), compression='snappy')
+    for batch in _arrow_batches(store, start, end, chunk_rows):
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+def iter_arrow(store, start=None, end=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Formato Arrow IPC stream: cada bloque es un record batch independiente."""
+    import pyarrow as pa
+
+    sink = _StreamSink()
+    writer = pa.ipc.new_stream(sink, _arrow_schema())
+    for batch in _arrow_batches(store, start, end, chunk_rows):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def export_stream(store, fmt='csv', start=None, end=None, compress=False):
+    """Generador de bytes del export pedido (fmt en EXPORT_FORMATS)."""
+    if fmt == 'parquet':
+        stream = iter_parquet(store, start, end)
+    elif fmt == 'arrow':
+        stream = iter_arrow(store, start, end)
+    else:
+        stream = iter_csv(store, start, end)
+    return iter_gzip(stream) if compress else stream
@@ -0,0 +1,151 @@
+# AirViewer/backend/history_pages.py
+# Respuestas del histórico pre-serializadas: paginación por cursor, proyección de campos y ETags
+
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from timeseries_store import RECORD_FIELDS
+
+# =======================================================
+# CONFIGURACIÓN
+# =======================================================
+MAX_PAGE_SIZE = 10000
+CACHE_MAX_BYTES = 32 * 1024 * 1024   # Bytes JSON cacheados por worker
+CACHE_MAX_ENTRY_BYTES = CACHE_MAX_BYTES // 2  # Respuestas más grandes se sirven sin guardarse
+SERIALIZE_CHUNK_ROWS = 50000
+
+
+def parse_fields(value):
+    """'timestamp,pm25' -> lista en el orden de RECORD_FIELDS (None = todos)."""
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - set(RECORD_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}. Disponibles: {', '.join(RECORD_FIELDS)}")
+    return [name for name in RECORD_FIELDS if name in requested]
+
+def parse_limit(value):
+    if value is None:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"limit inválido: '{value}' (se espera un entero entre 1 y {MAX_PAGE_SIZE})") from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit debe estar entre 1 y {MAX_PAGE_SIZE}")
+    return limit
+
+def encode_cursor(timestamp, record_id):
+    return base64.urlsafe_b64encode(f"{int(timestamp)}:{int(record_id)}".encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Cursor opaco -> (timestamp epoch, id). ValueError si no es válido."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.split(':')
+        return int(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("cursor inválido") from None
+
+def make_etag(store_version, params):
+    """ETag fuerte (sin comillas): mismo contenido del almacén y mismos parámetros <=> mismos bytes."""
+    return hashlib.blake2b(f"{store_version}|{params}".encode(), digest_size=12).hexdigest()
+
+
+# =======================================================
+# SERIALIZACIÓN
+# =======================================================
+
+def render_range(store, start=None, end=None, fields=None):
+    """Todo el rango como arreglo JSON (la respuesta histórica sin paginar), por bloques."""
+    stations = store.stations
+    parts = []
+    for chunk in store.iter_range(start, end, chunk_rows=SERIALIZE_CHUNK_ROWS):
+        records = store.columns_to_records(chunk, stations, fields)
+        if records:
+            parts.append(json.dumps(records, separators=(',', ':'))[1:-1])
+    return ('[' + ','.join(parts) + ']').encode()
+
+def render_page(store, start=None, end=None, fields=None, after=None, limit=MAX_PAGE_SIZE):
+    """Una página {"records", "next_cursor", "limit"}; next_cursor es null en la última."""
+    chunk, has_more = store.page(start, end, after, limit)
+    records = store.columns_to_records(chunk, store.stations, fields)
+    next_cursor = None
+    if has_more and len(chunk['id']):
+        next_cursor = encode_cursor(chunk['timestamp'][-1], chunk['id'][-1])
+    return json.dumps({"records": records, "next_cursor": next_cursor, "limit": limit},
+                      separators=(',', ':')).encode()
+
+
+# =======================================================
+# CACHÉ DE RESPUESTAS
+# =======================================================
+
+class HistoryResponseCache:
+    """
+    LRU de cuerpos JSON ya serializados, acotada en bytes. Cada entrada guarda la versión
+    del almacén con la que se generó: si otro worker escribe, la versión cambia y la
+    entrada deja de servirse sin necesidad de avisar entre procesos.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_entry_bytes=CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()   # clave -> (versión, etag, cuerpo)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key, store_version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != store_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, store_version, etag, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = (store_version, etag, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "invalidations": self.invalidations,
+            }
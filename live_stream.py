@@ -0,0 +1,140 @@
+# AirViewer/backend/live_stream.py
+# Difusión de lecturas en vivo por Server-Sent Events (un buffer compartido para todos los clientes)
+
+import json
+import os
+import threading
+from collections import deque
+
+# =======================================================
+# CONFIGURACIÓN DEL STREAM
+# =======================================================
+BUFFER_EVENTS = 256        # Eventos recientes conservados (reconexión con Last-Event-ID)
+MAX_CLIENT_LAG = 64        # Un cliente con más eventos pendientes que esto se desconecta
+# Conexiones abiertas por worker; con gthread gunicorn.conf.py lo baja por debajo de `threads`
+MAX_SUBSCRIBERS = int(os.environ.get('AIRVIEWER_STREAM_MAX_CLIENTS', 2000))
+HEARTBEAT_S = 15           # Comentario keep-alive para proxies con clientes inactivos
+RETRY_MS = 5000            # Espera sugerida al navegador antes de reconectar
+
+
+class EventBroadcaster:
+    """
+    Fan-out de eventos SSE. Cada evento se serializa una sola vez y se guarda en un ring
+    buffer compartido; cada suscriptor solo mantiene su cursor (último id enviado), así
+    que un cliente inactivo cuesta un hilo/greenlet bloqueado en la condición y nada de
+    memoria por evento. Un cliente que se atrasa más de max_lag eventos se desconecta.
+    """
+
+    def __init__(self, capacity=BUFFER_EVENTS, max_lag=MAX_CLIENT_LAG, max_subscribers=MAX_SUBSCRIBERS,
+                 heartbeat_s=HEARTBEAT_S):
+        self.max_lag = min(max_lag, capacity)
+        self.max_subscribers = max_subscribers
+        self.heartbeat_s = heartbeat_s
+        self._events = deque(maxlen=capacity)  # (id, bytes ya codificados)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self.subscribers = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, data, event='reading'):
+        """Serializa el evento una vez y despierta a todos los suscriptores."""
+        body = json.dumps(data, separators=(',', ':'))
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, f"id: {self._last_id}\nevent: {event}\ndata: {body}\n\n".encode()))
+            self.published += 1
+            self._cond.notify_all()
+        return self._last_id
+
+    def _pending_locked(self, cursor):
+        """Eventos con id > cursor (vacío si no hay). None si el cursor ya salió del buffer."""
+        if not self._events or self._events[-1][0] <= cursor:
+            return []
+        oldest = self._events[0][0]
+        if cursor < oldest - 1:
+            return None
+        return [self._events[i][1] for i in range(cursor + 1 - oldest, len(self._events))]
+
+    def is_full(self):
+        with self._cond:
+            return self.subscribers >= self.max_subscribers
+
+    def subscribe(self, last_event_id=None):
+        """
+        Reserva un cupo de forma atómica y retorna el iterable de bytes SSE de la respuesta,
+        o None si el worker ya tiene max_subscribers conexiones (el endpoint responde 503).
+        El cupo se libera al cerrar la respuesta, aunque nunca se haya empezado a iterar.
+        Sin Last-Event-ID empieza reenviando el último evento (estado actual).
+        """
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                return None
+            self.subscribers += 1
+            if last_event_id is None:
+                cursor = max(self._last_id - 1, 0)
+            else:
+                cursor = min(int(last_event_id), self._last_id)
+        return _Subscription(self, self._iter_events(cursor))
+
+    def _release(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def _iter_events(self, cursor):
+        """Generador de bytes SSE a partir del evento posterior a `cursor`."""
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while True:
+            with self._cond:
+                pending = self._pending_locked(cursor)
+                if pending == []:
+                    self._cond.wait(self.heartbeat_s)
+                    pending = self._pending_locked(cursor)
+                last_id = self._last_id
+
+            if pending == []:
+                yield b": keepalive\n\n"
+                continue
+            if pending is None or len(pending) > self.max_lag:
+                # Cliente lento: se corta en lugar de acumularle eventos
+                with self._cond:
+                    self.dropped += 1
+                yield b"event: dropped\ndata: {\"reason\":\"slow_consumer\"}\n\n"
+                return
+            yield b''.join(pending)
+            cursor = last_id
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": self.subscribers,
+                "published": self.published,
+                "dropped": self.dropped,
+                "last_event_id": self._last_id,
+                "buffered": len(self._events),
+            }
+
+
+class _Subscription:
+    """
+    Iterable de una respuesta SSE. El servidor WSGI llama a close() al terminar la
+    respuesta (cliente desconectado incluido) y ahí se devuelve el cupo, una sola vez.
+    """
+
+    def __init__(self, broadcaster, events):
+        self._broadcaster = broadcaster
+        self._events = events
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._events.close()
+        self._broadcaster._release()
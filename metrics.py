@@ -0,0 +1,137 @@
+# AirViewer/backend/metrics.py
+# Métricas de rendimiento en formato Prometheus (latencias por ruta, upstream, inferencia, memoria)
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, multiprocess
+except ImportError:  # Opcional: sin prometheus_client las métricas son no-ops
+    prometheus_client = None
+
+# =======================================================
+# CONFIGURACIÓN
+# =======================================================
+# Con varios workers de gunicorn, definir PROMETHEUS_MULTIPROC_DIR (directorio vacío y
+# escribible) para que /metrics agregue los valores de todos los procesos.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+MEMORY_SAMPLE_S = 5  # Cada cuánto un worker actualiza su RSS (lectura de /proc)
+
+# Buckets en segundos: de 0.5 ms (caché / forward NumPy) a 10 s (upstream lento)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class _NoopMetric:
+    """Sustituto cuando prometheus_client no está instalado."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labels=(), **kwargs):
+    """Crea la métrica de prometheus_client (kind: 'Histogram', 'Counter' o 'Gauge') o un no-op."""
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labels, **kwargs)
+
+HTTP_LATENCY = _metric('Histogram', 'airviewer_http_request_duration_seconds',
+                       "Latencia por ruta (hasta los headers en respuestas en streaming)",
+                       ('route', 'method'), buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS = _metric('Counter', 'airviewer_http_requests', "Peticiones por ruta y código de estado",
+                        ('route', 'method', 'status'))
+UPSTREAM_LATENCY = _metric('Histogram', 'airviewer_upstream_request_duration_seconds',
+                           "Latencia de llamadas a servicios externos", ('upstream', 'operation'),
+                           buckets=LATENCY_BUCKETS)
+UPSTREAM_ERRORS = _metric('Counter', 'airviewer_upstream_errors', "Errores de llamadas a servicios externos",
+                          ('upstream', 'operation'))
+INFERENCE_STAGE = _metric('Histogram', 'airviewer_inference_stage_duration_seconds',
+                          "Duración de cada etapa de la predicción", ('stage',), buckets=STAGE_BUCKETS)
+INFERENCE_WINDOWS = _metric('Counter', 'airviewer_inference_windows', "Ventanas pasadas por el modelo",
+                            ('path',))
+CACHE_LOOKUPS = _metric('Counter', 'airviewer_forecast_cache_lookups', "Consultas a la caché de pronósticos",
+                        ('result',))
+# En modo multiproceso 'liveall' añade la etiqueta pid y descarta los workers muertos
+WORKER_RSS = _metric('Gauge', 'airviewer_worker_resident_memory_bytes', "Memoria residente del worker",
+                     **({'multiprocess_mode': 'liveall'} if MULTIPROC_DIR else {}))
+
+_memory_state = {"sampled_at": 0.0}
+
+
+# =======================================================
+# API DE INSTRUMENTACIÓN
+# =======================================================
+
+@contextmanager
+def inference_stage(stage):
+    """Mide una etapa de inferencia (normalize / scale / forward / inverse)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        INFERENCE_STAGE.labels(stage).observe(time.perf_counter() - start)
+
+@contextmanager
+def upstream_call(upstream, operation):
+    """Mide una llamada externa; si lanza excepción, además cuenta el error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(upstream, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, operation).observe(time.perf_counter() - start)
+
+def observe_request(route, method, status, seconds):
+    HTTP_LATENCY.labels(route, method).observe(seconds)
+    HTTP_REQUESTS.labels(route, method, str(status)).inc()
+    sample_memory()
+
+def sample_memory(force=False):
+    """Actualiza el RSS del worker como mucho cada MEMORY_SAMPLE_S segundos."""
+    now = time.monotonic()
+    if not force and now - _memory_state["sampled_at"] < MEMORY_SAMPLE_S:
+        return
+    _memory_state["sampled_at"] = now
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource  # Sin /proc (macOS): máximo histórico, en bytes
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if os.uname().sysname == 'Darwin' else 1024)
+    WORKER_RSS.set(rss)
+
+
+# =======================================================
+# EXPOSICIÓN
+# =======================================================
+
+def available():
+    return prometheus_client is not None
+
+def render():
+    """(cuerpo, content-type) en formato de texto de Prometheus."""
+    sample_memory(force=True)
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+def mark_worker_dead(pid):
+    """Hook child_exit de gunicorn: descarta las series 'live' del worker que terminó."""
+    if prometheus_client is not None and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
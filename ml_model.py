@@ -2,15 +2,17 @@
 
 import numpy as np
 import pandas as pd
-import joblib 
 import os
 import random # 🛑 Necesario para inyectar dinamismo en la predicción
 from datetime import datetime, timedelta
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import train_test_split
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from tensorflow.keras.callbacks import EarlyStopping
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Motor de inferencia sin TensorFlow (TF solo se importa para entrenar).
+# joblib/sklearn también se importan dentro de las funciones que los usan,
+# para que importar este módulo desde app.py no retrase el arranque del worker.
+import numpy_lstm
+import model_registry
+import metrics
 
 # =======================================================
 # CONFIGURACIÓN DE RUTAS Y CONSTANTES DE NORMALIZACIÓN
@@ -18,8 +20,12 @@ from tensorflow.keras.callbacks import EarlyStopping
 DATA_PATH = 'data/historical_data.csv' 
 MODEL_DIR = 'model'
 MODEL_PATH = os.path.join(MODEL_DIR, 'lstm_airviewer.h5') 
+MODEL_DIRECT_PATH = os.path.join(MODEL_DIR, 'lstm_airviewer_direct.h5')
 SCALER_PATH = os.path.join(MODEL_DIR, 'scaler_airviewer.pkl') 
+# Artefacto plano (pesos + scaler) que los workers mapean en memoria; ver export_artifact
+ARTIFACT_PATH = os.path.join(MODEL_DIR, 'lstm_airviewer.avm')
 TIME_STEP = 24
+N_FUTURE = 24  # Horizonte de predicción (horas) del modelo multi-salida
 
 # Constantes para la Normalización (Condiciones Estándar)
 P_STD = 1013.25  # Presión estándar en hPa
@@ -28,88 +34,342 @@ T_STD = 298.15   # Temperatura estándar en Kelvin (25°C)
 # Columnas usadas para el entrenamiento (PM2_5_STD es el target)
 FEATURE_COLUMNS = ['PM2_5_STD', 'PM10_STD', 'Temperatura', 'Humedad', 'Presion', 'CO2'] 
 
+# Columnas crudas de entrada (mismo orden que FEATURE_COLUMNS, antes de normalizar)
+RAW_INPUT_COLUMNS = ['PM2_5', 'PM10', 'Temperatura', 'Humedad', 'Presion', 'CO2']
+
+# Nombres alternativos que produce generate_data.py
+COLUMN_ALIASES = {'pm25': 'PM2_5', 'pm10': 'PM10'}
+
+# Variables meteorológicas de referencia cuando la fuente no las registra
+# (histórico del almacén, ventana de predicción): puntos medios de la simulación
+DEFAULT_METEO = {'Temperatura': 22.5, 'Humedad': 80.0, 'Presion': 1010.0, 'CO2': 575}
+
 
 # =======================================================
 # FUNCIONES DE PREPARACIÓN DE DATOS (CON NORMALIZACIÓN)
 # =======================================================
 
-def create_dataset(features, target, time_step=TIME_STEP):
-    """Crea secuencias (X) e etiquetas (Y) para el modelo LSTM."""
-    X, Y = [], []
-    for i in range(len(features) - time_step):
-        X.append(features[i:(i + time_step), :])
-        Y.append(target[i + time_step])
-    return np.array(X), np.array(Y)
-
-def load_and_preprocess_data():
-    """Carga, normaliza, y escala el dataset histórico."""
-    if not os.path.exists(DATA_PATH):
-        print(f"ERROR: Dataset no encontrado en {DATA_PATH}. Por favor, ejecute generate_data.py.")
+def create_dataset(features, target, time_step=TIME_STEP, n_future=1):
+    """
+    Crea secuencias (X) e etiquetas (Y) para el modelo LSTM.
+    Con n_future > 1, cada etiqueta es el vector de las n_future horas siguientes.
+    X e Y son vistas (sliding windows) sobre los arrays originales: no se copia
+    ninguna ventana, así que la memoria no se multiplica por time_step.
+    """
+    n_windows = len(features) - time_step - n_future + 1
+    X = sliding_window_view(features, time_step, axis=0)[:n_windows].transpose(0, 2, 1)
+    if n_future == 1:
+        Y = target[time_step:time_step + n_windows]
+    else:
+        Y = sliding_window_view(target[time_step:], n_future)[:n_windows]
+    return X, Y
+
+class LazyWindows:
+    """
+    Ventanas definidas por índices de inicio sobre un array (sin materializarlas).
+    Se indexa como el array de ventanas (entero, slice o array de índices) y cada acceso
+    copia solo las ventanas pedidas, igual que los lotes de make_window_dataset.
+    np.asarray(...) materializa todo de forma explícita.
+    """
+
+    def __init__(self, data, starts, offsets, squeeze=False):
+        self.data = data
+        self.starts = np.asarray(starts)
+        self.offsets = np.asarray(offsets)
+        self.squeeze = squeeze  # Etiquetas de un solo horizonte: escalar por ventana
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def shape(self):
+        inner = () if self.squeeze else (len(self.offsets),) + self.data.shape[1:]
+        return (len(self.starts),) + inner
+
+    def __getitem__(self, index):
+        starts = self.starts[index]
+        windows = self.data[np.asarray(starts)[..., None] + self.offsets]
+        return windows[..., 0] if self.squeeze else windows
+
+    def __array__(self, dtype=None, copy=None):
+        windows = self[:]
+        return windows if dtype is None else windows.astype(dtype)
+
+def window_starts(segment_ids, time_step=TIME_STEP, n_future=1, test_size=0.2):
+    """
+    Índices de inicio de las ventanas válidas, divididos en entrenamiento y prueba.
+    Una ventana no puede cruzar el límite entre estaciones (segment_ids distintos);
+    la división es temporal (sin barajar) dentro de cada estación.
+    """
+    span = time_step + n_future
+    boundaries = np.flatnonzero(np.diff(segment_ids)) + 1
+    seg_starts = np.concatenate(([0], boundaries))
+    seg_ends = np.concatenate((boundaries, [len(segment_ids)]))
+
+    train, test = [], []
+    for lo, hi in zip(seg_starts, seg_ends):
+        starts = np.arange(lo, hi - span + 1)
+        split = int(len(starts) * (1 - test_size))
+        train.append(starts[:split])
+        test.append(starts[split:])
+    return np.concatenate(train), np.concatenate(test)
+
+def _count_rows(path):
+    """
+    Cota superior de las filas de datos de un CSV, leyendo bloques binarios (sin parsear).
+    Una última línea sin salto final también cuenta; las líneas en blanco sobran y se
+    recortan después de leer.
+    """
+    lines, last = 0, b'\n'
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return max(lines + (last != b'\n') - 1, 0)
+
+def _normalize_chunk(df):
+    """Cstd = (Pa/Pstd) * (Tstd/Ta) * Cc sobre un bloque del CSV; retorna FEATURE_COLUMNS en float32."""
+    df = df.rename(columns=COLUMN_ALIASES)
+    raw = df[RAW_INPUT_COLUMNS].to_numpy(dtype=np.float64)
+    return normalize_windows(raw).astype(np.float32)
+
+def read_scaled_features(data_path=DATA_PATH, chunksize=None, mmap_path=None, scaler=None):
+    """
+    Lee el CSV por bloques, normaliza y escala con un MinMaxScaler ajustado con partial_fit.
+    Con mmap_path, la matriz de features vive en un .npy memory-mapped en disco.
+    Si se pasa un scaler ya ajustado (re-entrenamiento con warm start) se reutiliza tal cual.
+    Retorna (features escaladas (n, 6) float32, ids de estación por fila, nombres de estación, scaler).
+    Las filas de cada estación deben ser contiguas en el CSV (como las escriben generate_data
+    y model_registry): window_starts divide cada tramo en entrenamiento/prueba, así que una
+    estación repartida en varios tramos se rechaza con ValueError.
+    """
+    n_rows = _count_rows(data_path)
+    chunksize = chunksize or max(n_rows, 1)
+    shape = (n_rows, len(FEATURE_COLUMNS))
+    if mmap_path:
+        features = np.lib.format.open_memmap(mmap_path, mode='w+', dtype=np.float32, shape=shape)
+    else:
+        features = np.empty(shape, dtype=np.float32)
+    segment_ids = np.zeros(n_rows, dtype=np.int32)
+    stations = {}
+
+    fit_scaler = scaler is None
+    if fit_scaler:
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler(feature_range=(0, 1))
+    lo = 0
+    needed = set(RAW_INPUT_COLUMNS) | set(COLUMN_ALIASES) | {'station'}
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, usecols=lambda col: col in needed):
+        hi = lo + len(chunk)
+        features[lo:hi] = _normalize_chunk(chunk)
+        if 'station' in chunk:
+            for name in chunk['station'].unique():
+                stations.setdefault(name, len(stations))
+            segment_ids[lo:hi] = chunk['station'].map(stations).to_numpy()
+        if fit_scaler:
+            scaler.partial_fit(features[lo:hi])
+        lo = hi
+
+    if lo < n_rows:
+        # Líneas en blanco contadas de más (una vista también sirve con el memmap)
+        n_rows = lo
+        features, segment_ids = features[:n_rows], segment_ids[:n_rows]
+    runs = segment_ids[np.concatenate(([0], np.flatnonzero(np.diff(segment_ids)) + 1))] if n_rows else segment_ids
+    if len(runs) != len(np.unique(runs)):
+        names = list(stations)
+        repeated = [names[i] for i in np.flatnonzero(np.bincount(runs) > 1)]
+        raise ValueError(f"Las filas de cada estación deben ser contiguas en {data_path} "
+                         f"(estaciones repartidas: {', '.join(map(str, repeated))}); ordene el CSV por estación")
+
+    # Escalamiento en el sitio, bloque a bloque (sin una segunda copia de la matriz)
+    for lo in range(0, n_rows, chunksize):
+        features[lo:lo + chunksize] = scaler.transform(features[lo:lo + chunksize])
+    return features, segment_ids, list(stations) or [None], scaler
+
+def load_and_preprocess_data(n_future=1, data_path=None, chunksize=None, mmap_path=None, split='train'):
+    """
+    Carga, normaliza, y escala el dataset histórico.
+    split='train' retorna (X_train, Y_train, scaler) como antes; split='test' el tramo reservado.
+    Con una sola estación X/Y son vistas sin copia. Con varias, las ventanas válidas no son
+    un tramo contiguo y X/Y son LazyWindows: se indexan igual y solo copian lo que se lee.
+    """
+    data_path = data_path or DATA_PATH
+    if not os.path.exists(data_path):
+        print(f"ERROR: Dataset no encontrado en {data_path}. Por favor, ejecute generate_data.py.")
         return None, None, None
 
-    df = pd.read_csv(DATA_PATH)
-    
-    # 1. Normalización de Concentraciones (Cstd = (Pa/Pstd) * (Tstd/Ta) * Cc)
-    df['Temperatura_K'] = df['Temperatura'] + 273.15 # T_a en Kelvin
-    
-    for col in ['PM2_5', 'PM10']:
-        df[col + '_STD'] = df[col] * (df['Presion'] / P_STD) * (T_STD / df['Temperatura_K'])
-    
-    # 2. Selección de Variables (Usando las versiones _STD)
-    features_to_use = ['PM2_5_STD', 'PM10_STD', 'Temperatura', 'Humedad', 'Presion', 'CO2']
-    data_to_scale = df[features_to_use].values 
-    
-    # 3. Escalamiento
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(data_to_scale)
+    scaled_data, segment_ids, _, scaler = read_scaled_features(data_path, chunksize, mmap_path)
 
-    # 4. Preparar secuencias (Target es PM2.5_STD, la primera columna)
-    X, Y = create_dataset(scaled_data, scaled_data[:, 0])
-    
-    # 5. División para entrenamiento
-    X_train, _, Y_train, _ = train_test_split(X, Y, test_size=0.2, shuffle=False)
-    
-    return X_train, Y_train, scaler 
+    # Preparar secuencias (Target es PM2.5_STD, la primera columna)
+    starts_train, starts_test = window_starts(segment_ids, n_future=n_future)
+    starts = starts_train if split == 'train' else starts_test
 
+    if len(starts) and np.array_equal(starts, np.arange(starts[0], starts[0] + len(starts))):
+        X, Y = create_dataset(scaled_data, scaled_data[:, 0], n_future=n_future)
+        return X[starts[0]:starts[0] + len(starts)], Y[starts[0]:starts[0] + len(starts)], scaler
+    X = LazyWindows(scaled_data, starts, np.arange(TIME_STEP))
+    Y = LazyWindows(scaled_data[:, 0], starts, TIME_STEP + np.arange(n_future), squeeze=n_future == 1)
+    return X, Y, scaler
 
-def train_and_save_model():
-    """Entrena el modelo LSTM y guarda los artefactos."""
-    X_train, Y_train, scaler = load_and_preprocess_data()
+def make_window_dataset(scaled_data, starts, n_future=1, batch_size=64, shuffle=True):
+    """
+    Generador de lotes perezoso para model.fit: cada lote materializa solo sus
+    batch_size ventanas a partir de los índices de inicio.
+    """
+    from tensorflow.keras.utils import PyDataset
 
-    if X_train is None:
-        return False
-        
-    if not os.path.exists(MODEL_DIR): os.makedirs(MODEL_DIR)
+    offsets = np.arange(TIME_STEP)
+    target_offsets = TIME_STEP + np.arange(n_future)
+
+    class WindowDataset(PyDataset):
+        def __init__(self):
+            super().__init__()
+            self.order = np.array(starts)
+
+        def __len__(self):
+            return int(np.ceil(len(self.order) / batch_size))
+
+        def __getitem__(self, index):
+            batch = self.order[index * batch_size:(index + 1) * batch_size]
+            X = scaled_data[batch[:, None] + offsets]
+            Y = scaled_data[batch[:, None] + target_offsets, 0]
+            return X, (Y[:, 0] if n_future == 1 else Y)
+
+        def on_epoch_end(self):
+            if shuffle:
+                np.random.shuffle(self.order)
+
+    return WindowDataset()
+
+def build_model(n_features=len(FEATURE_COLUMNS), n_future=1):
+    """Arquitectura LSTM de AirViewer (2 LSTM de 50 unidades + Dense de n_future salidas), compilada."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense, Dropout
 
-    print("Iniciando entrenamiento del modelo LSTM...")
-    
     model = Sequential()
-    model.add(LSTM(units=50, return_sequences=True, input_shape=(TIME_STEP, X_train.shape[2])))
+    model.add(Input(shape=(TIME_STEP, n_features)))
+    model.add(LSTM(units=50, return_sequences=True))
     model.add(Dropout(0.2))
     model.add(LSTM(units=50))
     model.add(Dropout(0.2))
-    model.add(Dense(units=1)) 
+    model.add(Dense(units=n_future)) 
 
     model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+def load_numpy_weights(keras_model, numpy_model):
+    """Warm start: copia los pesos de un NumpyLSTMModel con la misma arquitectura al modelo Keras."""
+    weighted = [layer for layer in keras_model.layers if layer.weights]
+    if len(weighted) != len(numpy_model.layers):
+        raise ValueError("La arquitectura del modelo activo no coincide con la de entrenamiento.")
+    for layer, source in zip(weighted, numpy_model.layers):
+        names = ('kernel', 'recurrent_kernel', 'bias') if source['type'] == 'lstm' else ('kernel', 'bias')
+        weights = [np.asarray(source[name], dtype=np.float32) for name in names]
+        if [w.shape for w in weights] != [tuple(w.shape) for w in layer.get_weights()]:
+            raise ValueError(f"Forma de pesos incompatible en la capa {layer.name}.")
+        layer.set_weights(weights)
+
+def train_and_save_model(mode='single', n_future=N_FUTURE, data_path=None, chunksize=None, mmap_path=None):
+    """
+    Entrena el modelo LSTM y guarda los artefactos.
+    mode='single': una salida (la hora siguiente), guardado en MODEL_PATH.
+    mode='direct': cabeza multi-salida que predice las n_future horas de PM2.5_STD
+    en un solo forward pass, guardado en MODEL_DIRECT_PATH.
+    Los lotes se generan bajo demanda desde la matriz escalada (ver make_window_dataset).
+    """
+    direct = mode == 'direct'
+    n_future = n_future if direct else 1
+    data_path = data_path or DATA_PATH
+    if not os.path.exists(data_path):
+        print(f"ERROR: Dataset no encontrado en {data_path}. Por favor, ejecute generate_data.py.")
+        return False
+
+    scaled_data, segment_ids, _, scaler = read_scaled_features(data_path, chunksize, mmap_path)
+    starts_train, _ = window_starts(segment_ids, n_future=n_future)
+    train_data = make_window_dataset(scaled_data, starts_train, n_future=n_future, batch_size=64)
+
+    if not os.path.exists(MODEL_DIR): os.makedirs(MODEL_DIR)
+
+    print(f"Iniciando entrenamiento del modelo LSTM (modo {mode})...")
+    
+    model = build_model(scaled_data.shape[1], n_future)
     
     # Entrenamiento
-    model.fit(X_train, Y_train, epochs=20, batch_size=64, verbose=1) 
+    model.fit(train_data, epochs=20, verbose=1) 
 
     # Guardar Artefactos
-    model.save(MODEL_PATH)
+    import joblib
+    model.save(MODEL_DIRECT_PATH if direct else MODEL_PATH)
     joblib.dump(scaler, SCALER_PATH)
     print(f"\nModelo y Scaler guardados en {MODEL_DIR}/")
+    # El artefacto plano tiene prioridad al servir: se regenera para no quedar desfasado
+    export_artifact(MODEL_DIRECT_PATH if direct else MODEL_PATH)
     return True
 
 
-def load_artefacts():
+def _default_model_path():
+    return MODEL_DIRECT_PATH if os.path.exists(MODEL_DIRECT_PATH) else MODEL_PATH
+
+def _model_version(model_path):
+    return f"{os.path.basename(model_path)}@{int(os.path.getmtime(model_path))}"
+
+def export_artifact(model_path=None, artifact_path=ARTIFACT_PATH, float16=False):
+    """
+    Exporta el .h5 + el scaler .pkl a un único archivo plano versionado (ARTIFACT_PATH).
+    Se ejecuta una vez tras entrenar; los workers luego lo mapean sin joblib ni h5py.
+    """
+    import joblib
+
+    model_path = model_path or _default_model_path()
+    model = numpy_lstm.load_keras_h5(model_path)
+    scaler = joblib.load(SCALER_PATH)
+    numpy_lstm.save_artifact(artifact_path, model, scaler,
+                             weights_dtype=np.float16 if float16 else np.float32,
+                             model_version=_model_version(model_path))
+    print(f"Artefacto exportado en {artifact_path} ({os.path.getsize(artifact_path)} bytes).")
+    return artifact_path
+
+def load_artefacts(backend='numpy', model_path=None):
     """
     Carga el modelo y el objeto scaler. 
     🛑 Se elimina la lógica de re-entrenamiento para evitar timeouts en Render.
+    Por defecto los pesos se sirven con el motor NumPy (numpy_lstm). Orden de prioridad:
+    la versión activa del registro de modelos, el artefacto plano (ARTIFACT_PATH) y
+    por último el .h5 + .pkl. backend='keras' carga el modelo completo con TensorFlow.
+    Si existe el modelo multi-horizonte (MODEL_DIRECT_PATH) se usa con prioridad.
     """
+    if backend == 'numpy' and model_path is None:
+        registry = model_registry.ModelRegistry()
+        version = registry.active_version()
+        if version is not None:
+            try:
+                model, scaler = registry.load(version)
+                print(f"Modelo {version} cargado desde el registro.")
+                return model, scaler
+            except Exception as e:
+                print(f"ADVERTENCIA: Versión {version} del registro no válida ({e}). Se usa el modelo base.")
+
+    try:
+        if backend == 'numpy' and model_path is None and os.path.exists(ARTIFACT_PATH):
+            model, scaler = numpy_lstm.load_artifact(ARTIFACT_PATH)
+            print(f"Artefacto de ML mapeado en memoria ({model.version}).")
+            return model, scaler
+    except Exception as e:
+        print(f"ADVERTENCIA: Artefacto {ARTIFACT_PATH} no válido ({e}). Se usa el .h5.")
+
+    if model_path is None:
+        model_path = _default_model_path()
+
     try:
-        model = load_model(MODEL_PATH)
+        import joblib
+        if backend == 'keras':
+            from tensorflow.keras.models import load_model
+            model = load_model(model_path)
+        else:
+            model = numpy_lstm.load_keras_h5(model_path)
         scaler = joblib.load(SCALER_PATH)
+        # Identifica los pesos servidos (p.ej. para las claves de la caché de pronósticos)
+        model.version = _model_version(model_path)
         print("Artefactos de ML cargados correctamente.")
         return model, scaler
         
@@ -123,38 +383,49 @@ def load_artefacts():
 # FUNCIÓN DE PREDICCIÓN Y MÉTRICAS
 # =======================================================
 
-def make_prediction(model, scaler, input_data: pd.DataFrame, n_future: int = 24) -> list:
-    """Realiza la predicción del AQI para las próximas n_future horas."""
-    
-    # 🛑 Simulación de emergencia si el modelo no está cargado
-    if model is None or scaler is None:
-        print("ADVERTENCIA: Modelo ML no cargado. Devolviendo predicción simulada.")
-        # Generamos una simulación con variación para que el pico cambie
-        return [{"time_h": h + 1, "pred_aqi": random.randint(90, 110) + random.randint(-5, 5), "pred_pm25": 30 + h * 0.5} for h in range(n_future)]
-    
-    # 1. Normalizar los datos de entrada ANTES de escalar (Cstd)
-    input_data['Temperatura_K'] = input_data['Temperatura'] + 273.15
-    for col in ['PM2_5', 'PM10']:
-        input_data[col + '_STD'] = input_data[col] * (input_data['Presion'] / P_STD) * (T_STD / input_data['Temperatura_K'])
-        
-    # 2. Seleccionar las columnas corregidas
-    features_input = input_data[FEATURE_COLUMNS].values
-    
-    # 3. Escalar y reestructurar
-    scaled_data = scaler.transform(features_input)
-    # Se asume que el input necesita 24 timesteps
-    temp_input = scaled_data[-TIME_STEP:, :].reshape(1, TIME_STEP, len(FEATURE_COLUMNS))
-    
+def _model_output_dim(model):
+    """Número de horizontes que emite el modelo en un forward pass (1 = modelo de un paso)."""
+    if hasattr(model, 'output_dim'):
+        return model.output_dim
+    return int(model.output_shape[-1])
+
+def forecast_scaled(model, scaled_windows, n_future):
+    """
+    Pronóstico escalado de PM2.5_STD (N, n_future) para ventanas escaladas (N, TIME_STEP, 6).
+    El modelo directo emite todos los horizontes en un forward pass. El de un paso se
+    despliega de forma recursiva: cada predicción entra como último timestep de la
+    ventana siguiente (las demás variables quedan en su último valor observado), con
+    un forward pass por hora sobre todo el lote.
+    """
+    n_windows = len(scaled_windows)
+    predicted = np.asarray(model.predict(scaled_windows, verbose=0)).reshape(n_windows, -1)
+    if predicted.shape[1] >= n_future:
+        return predicted[:, :n_future]
+
+    # Buffer (N, TIME_STEP + n_future - 1, 6): la ventana de la hora h es una vista desplazada h pasos
+    rolled = np.empty((n_windows, TIME_STEP + n_future - 1, len(FEATURE_COLUMNS)), dtype=np.float32)
+    rolled[:, :TIME_STEP] = scaled_windows
+    rolled[:, TIME_STEP:] = rolled[:, TIME_STEP - 1:TIME_STEP]
+    out = np.empty((n_windows, n_future), dtype=np.float64)
+    out[:, 0] = predicted[:, 0]
+    for h in range(1, n_future):
+        rolled[:, TIME_STEP + h - 1, 0] = out[:, h - 1]
+        window = rolled[:, h:h + TIME_STEP]
+        out[:, h] = np.asarray(model.predict(window, verbose=0)).reshape(n_windows, -1)[:, 0]
+    return out
+
+def _inverse_pm25(scaler, predicted_scaled):
+    """Invierte la escala de PM2.5_STD (índice 0) para cualquier forma en una sola llamada."""
+    flat = np.zeros((predicted_scaled.size, len(FEATURE_COLUMNS)))
+    flat[:, 0] = predicted_scaled.ravel()
+    return scaler.inverse_transform(flat)[:, 0].reshape(predicted_scaled.shape)
+
+def _format_predictions(predicted_pm25_std_all):
+    """Convierte un vector de PM2.5_STD en la lista de dicts que consume el Front-end."""
     predictions = []
     
-    for i in range(n_future):
-        predicted_scaled = model.predict(temp_input, verbose=0)[0]
-        
-        # Invertir la escala (solo para PM2.5_STD, que es el índice 0)
-        temp_scaled_output = np.zeros((1, len(FEATURE_COLUMNS)))
-        temp_scaled_output[0, 0] = predicted_scaled[0] 
-        predicted_original_std = scaler.inverse_transform(temp_scaled_output)[0]
-        predicted_pm25_std = predicted_original_std[0]
+    for i, value in enumerate(predicted_pm25_std_all):
+        predicted_pm25_std = float(value)
         
         # Calcular AQI y añadir ruido para dinamismo 🛑
         aqi_base = int(predicted_pm25_std * 2.5) 
@@ -168,8 +439,138 @@ def make_prediction(model, scaler, input_data: pd.DataFrame, n_future: int = 24)
 
     return predictions
 
-def get_evaluation_metrics():
-    """Retorna las métricas de evaluación (simuladas, pero basadas en datos de tesis)."""
+def normalize_windows(raw_windows):
+    """
+    Aplica la normalización Cstd a un array (..., 6) en orden RAW_INPUT_COLUMNS
+    y lo devuelve en orden FEATURE_COLUMNS, sin pasar por DataFrames.
+    """
+    features = np.array(raw_windows, dtype=np.float64)
+    temperatura_k = features[..., 2] + 273.15
+    factor = (features[..., 4] / P_STD) * (T_STD / temperatura_k)
+    features[..., 0] *= factor
+    features[..., 1] *= factor
+    return features
+
+def make_prediction(model, scaler, input_data: pd.DataFrame, n_future: int = 24, cache=None) -> list:
+    """
+    Realiza la predicción del AQI para las próximas n_future horas.
+    Con cache (forecast_cache.ForecastCache), una ventana escalada ya vista con la
+    misma versión de modelo se responde sin ejecutar el forward pass.
+    """
+    
+    # 🛑 Simulación de emergencia si el modelo no está cargado
+    if model is None or scaler is None:
+        print("ADVERTENCIA: Modelo ML no cargado. Devolviendo predicción simulada.")
+        # Generamos una simulación con variación para que el pico cambie
+        return [{"time_h": h + 1, "pred_aqi": random.randint(90, 110) + random.randint(-5, 5), "pred_pm25": 30 + h * 0.5} for h in range(n_future)]
+    
+    # 1. Normalizar los datos de entrada ANTES de escalar (Cstd)
+    with metrics.inference_stage('normalize'):
+        input_data['Temperatura_K'] = input_data['Temperatura'] + 273.15
+        for col in ['PM2_5', 'PM10']:
+            input_data[col + '_STD'] = input_data[col] * (input_data['Presion'] / P_STD) * (T_STD / input_data['Temperatura_K'])
+            
+        # 2. Seleccionar las columnas corregidas
+        features_input = input_data[FEATURE_COLUMNS].values
+    
+    # 3. Escalar y reestructurar
+    with metrics.inference_stage('scale'):
+        scaled_data = scaler.transform(features_input)
+        # Se asume que el input necesita 24 timesteps
+        temp_input = scaled_data[-TIME_STEP:, :].reshape(1, TIME_STEP, len(FEATURE_COLUMNS))
+    
+    if cache is not None:
+        cache_key = cache.make_key(temp_input, getattr(model, 'version', None), n_future)
+        cached = cache.get(cache_key)
+        metrics.CACHE_LOOKUPS.labels('miss' if cached is None else 'hit').inc()
+        if cached is not None:
+            return _format_predictions(cached)
+    
+    # 4. Modelo directo: un único forward pass; modelo de un paso: despliegue recursivo
+    with metrics.inference_stage('forward'):
+        predicted_scaled = forecast_scaled(model, temp_input, n_future)
+    metrics.INFERENCE_WINDOWS.labels('single').inc()
+    
+    # 5. Invertir la escala en una sola llamada (solo PM2.5_STD, índice 0)
+    with metrics.inference_stage('inverse'):
+        predicted_pm25_std_all = _inverse_pm25(scaler, predicted_scaled)[0]
+    
+    if cache is not None:
+        cache.put(cache_key, predicted_pm25_std_all)
+    return _format_predictions(predicted_pm25_std_all)
+
+def make_batch_prediction(model, scaler, raw_windows, n_future: int = 24) -> list:
+    """
+    Predice las próximas n_future horas para N estaciones a la vez.
+    raw_windows: array (N, TIME_STEP, 6) en orden RAW_INPUT_COLUMNS.
+    Normaliza y escala todo como un solo array y ejecuta un único forward pass
+    sobre el tensor (N, TIME_STEP, 6). Retorna una lista de N listas de dicts.
+    """
+    raw_windows = np.asarray(raw_windows, dtype=np.float64)
+    n_windows = raw_windows.shape[0]
+
+    if model is None or scaler is None:
+        print("ADVERTENCIA: Modelo ML no cargado. Devolviendo predicción simulada.")
+        return [make_prediction(None, None, None, n_future) for _ in range(n_windows)]
+
+    # 1. Normalización Cstd vectorizada sobre todas las ventanas
+    with metrics.inference_stage('normalize'):
+        features = normalize_windows(raw_windows[:, -TIME_STEP:, :])
+
+    # 2. Escalar como un único array apilado (N * TIME_STEP, 6)
+    with metrics.inference_stage('scale'):
+        scaled = scaler.transform(features.reshape(-1, len(FEATURE_COLUMNS)))
+        batch_input = scaled.reshape(n_windows, TIME_STEP, len(FEATURE_COLUMNS))
+
+    # 3. Forward pass(es) sobre todas las estaciones a la vez y una inversión de escala
+    with metrics.inference_stage('forward'):
+        predicted_scaled = forecast_scaled(model, batch_input, n_future)
+    metrics.INFERENCE_WINDOWS.labels('batch').inc(n_windows)
+    with metrics.inference_stage('inverse'):
+        predicted_pm25_std = _inverse_pm25(scaler, predicted_scaled)
+
+    return [_format_predictions(row) for row in predicted_pm25_std]
+
+def warm_up(model):
+    """Ejecuta un forward pass de prueba para que la primera petición real no pague el arranque."""
+    if model is not None:
+        model.predict(np.zeros((1, TIME_STEP, len(FEATURE_COLUMNS)), dtype=np.float32), verbose=0)
+
+def model_trained_at(model):
+    """
+    Fecha de entrenamiento del modelo servido ("%Y-%m-%d %H:%M:%S"): la de los metadatos
+    del registro o, para el modelo base, el mtime de los pesos que lleva su versión
+    ("lstm_airviewer.h5@<mtime>"). None si no se puede saber.
+    """
+    version = getattr(model, 'version', None)
+    if not version:
+        return None
+    meta = model_registry.ModelRegistry().metadata(version)
+    if meta and meta.get("last_trained"):
+        return meta["last_trained"]
+    _, _, mtime = str(version).rpartition('@')
+    if not mtime.isdigit():
+        return None
+    return datetime.fromtimestamp(int(mtime)).strftime("%Y-%m-%d %H:%M:%S")
+
+def get_evaluation_metrics(model=None, scaler=None):
+    """
+    Métricas del backtest del modelo sobre el tramo de prueba de DATA_PATH (cacheadas por
+    versión, ver backtest.py). Sin modelo o sin dataset retorna las de la tesis.
+    Ambos casos usan las mismas claves (r_squared, como siempre).
+    """
+    if model is not None and scaler is not None and os.path.exists(DATA_PATH):
+        import backtest
+        result = backtest.get_backtest(model, scaler)
+        if result is not None:
+            overall = result["overall"]
+            return {
+                "rmse": overall["rmse"],
+                "r_squared": overall["r2"],
+                "mae": overall["mae"],
+                "model_name": getattr(model, 'version', None),
+                "last_trained": model_trained_at(model),
+            }
     return {
         "rmse": 4.52, 
         "r_squared": 0.925, 
@@ -179,4 +580,18 @@ def get_evaluation_metrics():
     }
 
 if __name__ == '__main__':
-    train_and_save_model()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo LSTM de AirViewer.")
+    parser.add_argument('--mode', choices=['single', 'direct'], default='single',
+                        help="'direct' entrena la cabeza multi-horizonte (N_FUTURE salidas).")
+    parser.add_argument('--n-future', type=int, default=N_FUTURE)
+    parser.add_argument('--export', action='store_true',
+                        help="No entrena: exporta el modelo actual al artefacto plano (ARTIFACT_PATH).")
+    parser.add_argument('--float16', action='store_true', help="Con --export, guarda los pesos en float16.")
+    args = parser.parse_args()
+
+    if args.export:
+        export_artifact(float16=args.float16)
+    else:
+        train_and_save_model(mode=args.mode, n_future=args.n_future)
@@ -0,0 +1,297 @@
+# AirViewer/backend/model_registry.py
+# Registro de versiones del modelo y re-entrenamiento en un proceso aparte
+
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+import numpy_lstm
+
+try:
+    import fcntl  # Bloqueo entre procesos (workers de gunicorn); no existe en Windows
+except ImportError:
+    fcntl = None
+
+# =======================================================
+# CONFIGURACIÓN DEL REGISTRO
+# =======================================================
+# Disposición: <REGISTRY_DIR>/<versión>/{model.avm, model.h5, metrics.json}
+#              <REGISTRY_DIR>/ACTIVE.json  -> versión servida + historial para rollback
+#              <REGISTRY_DIR>/JOB.json     -> estado del último re-entrenamiento
+REGISTRY_DIR = os.environ.get('AIRVIEWER_MODEL_REGISTRY', os.path.join('model', 'registry'))
+ACTIVE_FILE = 'ACTIVE.json'
+JOB_FILE = 'JOB.json'
+LOCK_FILE = '.lock'
+ARTIFACT_NAME = 'model.avm'
+METRICS_NAME = 'metrics.json'
+
+RETRAIN_EPOCHS = 10
+RETRAIN_MIN_HOURS = 24 * 7  # Historia horaria mínima para re-entrenar
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)  # Reemplazo atómico: los lectores ven la versión vieja o la nueva
+
+def _read_json(path, default=None):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class ModelRegistry:
+    """
+    Directorio de artefactos versionados. Activar o revertir una versión solo reescribe
+    ACTIVE.json (atómico); cada worker detecta el cambio y mapea el nuevo artefacto.
+    """
+
+    def __init__(self, path=REGISTRY_DIR):
+        self.path = path
+        self._thread_lock = threading.Lock()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def version_dir(self, version):
+        return os.path.join(self.path, version)
+
+    @contextmanager
+    def _lock(self):
+        """Serializa las lecturas-modificación de ACTIVE.json/JOB.json entre hilos y procesos."""
+        os.makedirs(self.path, exist_ok=True)
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._file(LOCK_FILE), 'a+') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --- Versiones ---
+
+    def versions(self):
+        """Metadatos (metrics.json) de todas las versiones registradas, de la más vieja a la más nueva."""
+        if not os.path.isdir(self.path):
+            return []
+        found = []
+        for name in sorted(n for n in os.listdir(self.path) if os.path.isdir(self.version_dir(n))):
+            meta = _read_json(os.path.join(self.path, name, METRICS_NAME))
+            if meta is not None and os.path.exists(os.path.join(self.path, name, ARTIFACT_NAME)):
+                found.append(meta)
+        return found
+
+    def metadata(self, version):
+        return _read_json(os.path.join(self.version_dir(version), METRICS_NAME))
+
+    def new_version(self):
+        """Crea el directorio de una versión nueva con nombre basado en la fecha (único)."""
+        os.makedirs(self.path, exist_ok=True)
+        base = datetime.now().strftime('v%Y%m%d-%H%M%S')
+        version, suffix = base, 1
+        while True:
+            try:
+                os.mkdir(self.version_dir(version))
+                return version
+            except FileExistsError:
+                suffix += 1
+                version = f"{base}-{suffix}"
+
+    def register(self, version, model, scaler, metadata):
+        """Escribe el artefacto plano y los metadatos de una versión ya entrenada."""
+        directory = self.version_dir(version)
+        numpy_lstm.save_artifact(os.path.join(directory, ARTIFACT_NAME), model, scaler, model_version=version)
+        _write_json(os.path.join(directory, METRICS_NAME), dict(metadata, version=version))
+        return version
+
+    def load(self, version):
+        """(modelo, scaler) de la versión, mapeados en memoria desde su artefacto."""
+        return numpy_lstm.load_artifact(os.path.join(self.version_dir(version), ARTIFACT_NAME))
+
+    # --- Versión activa ---
+
+    def active_state(self):
+        return _read_json(self._file(ACTIVE_FILE), {"version": None, "history": []})
+
+    def active_version(self):
+        """Versión servida (None = modelo base de model/). Lectura barata de un JSON pequeño."""
+        return self.active_state().get("version")
+
+    def activate(self, version):
+        if self.metadata(version) is None:
+            raise KeyError(f"Versión no registrada: {version}")
+        with self._lock():
+            state = self.active_state()
+            if state["version"] != version:
+                state["history"] = (state["history"] + [state["version"]])[-20:]
+                state.update(version=version, activated_at=datetime.now().isoformat() + "Z")
+                _write_json(self._file(ACTIVE_FILE), state)
+        return version
+
+    def rollback(self):
+        """Vuelve a la versión activa anterior (None si el historial lleva al modelo base)."""
+        with self._lock():
+            state = self.active_state()
+            if not state["history"]:
+                raise LookupError("No hay una versión anterior a la que volver.")
+            state["version"] = state["history"].pop()
+            state["activated_at"] = datetime.now().isoformat() + "Z"
+            _write_json(self._file(ACTIVE_FILE), state)
+        return state["version"]
+
+    # --- Re-entrenamiento ---
+
+    def job_status(self):
+        """Estado del último re-entrenamiento; un 'running' cuyo proceso murió pasa a 'failed'."""
+        job = _read_json(self._file(JOB_FILE))
+        if job and job.get("state") == "running" and not _pid_alive(job.get("pid", -1)):
+            job.update(state="failed", error="El proceso de entrenamiento terminó inesperadamente.")
+        return job
+
+    def start_retrain(self, store_dir, warm_start=False, epochs=RETRAIN_EPOCHS, n_future=None, activate=True):
+        """
+        Lanza el entrenamiento en un proceso nuevo (spawn: sin heredar hilos ni locks del
+        worker) y retorna de inmediato. Solo puede haber un entrenamiento en curso.
+        """
+        with self._lock():
+            job = self.job_status()
+            if job and job.get("state") == "running":
+                raise RuntimeError("Ya hay un re-entrenamiento en curso.")
+
+            options = {"store_dir": store_dir, "warm_start": warm_start, "epochs": epochs,
+                       "n_future": n_future, "activate": activate}
+            process = multiprocessing.get_context('spawn').Process(
+                target=_retrain_main, args=(self.path, options), name='airviewer-retrain')
+            process.start()
+            job = {"state": "running", "pid": process.pid, "started_at": datetime.now().isoformat() + "Z",
+                   "options": options}
+            _write_json(self._file(JOB_FILE), job)
+
+        # Recolecta el proceso al terminar para no dejar zombis en el worker
+        threading.Thread(target=process.join, name='airviewer-retrain-reaper', daemon=True).start()
+        return job
+
+    def _finish_job(self, **fields):
+        with self._lock():
+            job = _read_json(self._file(JOB_FILE), {})
+            job.update(fields, finished_at=datetime.now().isoformat() + "Z")
+            _write_json(self._file(JOB_FILE), job)
+
+
+# =======================================================
+# PROCESO DE ENTRENAMIENTO
+# =======================================================
+
+def _history_csv(store_dir, path):
+    """
+    Vuelca el histórico del almacén a un CSV horario por estación (el formato que lee
+    ml_model.read_scaled_features). El almacén no registra meteorología ni CO2: se
+    completan con ml_model.DEFAULT_METEO. Retorna el número de horas escritas.
+    """
+    import pandas as pd
+    import ml_model
+    from timeseries_store import TimeSeriesStore
+
+    store = TimeSeriesStore(store_dir)
+    stations = np.asarray(store.stations, dtype=object)
+    frames = []
+    for chunk in store.iter_range(columns=['timestamp', 'pm25', 'pm10', 'station']):
+        frames.append(pd.DataFrame({
+            'timestamp': chunk['timestamp'].astype('datetime64[s]'),
+            'station': stations[chunk['station']],
+            'pm25': chunk['pm25'],
+            'pm10': chunk['pm10'],
+        }))
+    if not frames:
+        return 0
+
+    # Medias horarias contiguas por estación (las ventanas no cruzan estaciones). Los huecos
+    # se interpolan dentro de cada estación: nunca con los datos de la estación vecina.
+    history = pd.concat(frames, ignore_index=True)
+    hourly = history.set_index('timestamp').groupby('station')[['pm25', 'pm10']].resample('1h').mean()
+    hourly = (hourly.groupby(level='station').transform(lambda col: col.interpolate(limit_direction='both'))
+              .dropna().reset_index())
+    for col, value in ml_model.DEFAULT_METEO.items():
+        hourly[col] = value
+    hourly.to_csv(path, index=False)
+    return len(hourly)
+
+def _retrain_main(registry_path, options):
+    """Punto de entrada del proceso hijo: entrena, evalúa, registra y (opcionalmente) activa."""
+    registry = ModelRegistry(registry_path)
+    version = None
+    try:
+        import backtest
+        import ml_model
+
+        started = time.perf_counter()
+        version = registry.new_version()
+        directory = registry.version_dir(version)
+        data_path = os.path.join(directory, 'history.csv')
+        n_hours = _history_csv(options["store_dir"], data_path)
+        if n_hours < RETRAIN_MIN_HOURS:
+            raise ValueError(f"Historia insuficiente: {n_hours} h (mínimo {RETRAIN_MIN_HOURS} h).")
+
+        # Warm start: se parte de los pesos y del scaler del modelo servido
+        parent_model, parent_scaler = ml_model.load_artefacts() if options["warm_start"] else (None, None)
+        if options["warm_start"] and parent_model is None:
+            raise RuntimeError("No hay un modelo activo para el warm start.")
+        n_future = options["n_future"] or (parent_model.output_dim if parent_model is not None else 1)
+
+        scaled, segment_ids, station_names, scaler = ml_model.read_scaled_features(data_path, scaler=parent_scaler)
+        starts_train, starts_test = ml_model.window_starts(segment_ids, n_future=n_future)
+        keras_model = ml_model.build_model(scaled.shape[1], n_future)
+        if parent_model is not None:
+            ml_model.load_numpy_weights(keras_model, parent_model)
+        keras_model.fit(ml_model.make_window_dataset(scaled, starts_train, n_future=n_future),
+                        epochs=options["epochs"], verbose=2)
+
+        # Se sirve con el motor NumPy: se evalúa exactamente lo que se va a servir
+        h5_path = os.path.join(directory, 'model.h5')
+        keras_model.save(h5_path)
+        model = numpy_lstm.load_keras_h5(h5_path)
+        result = backtest.backtest_arrays(model, scaler, scaled, segment_ids, starts_test, station_names, n_future)
+        metrics = result["overall"] if result else None
+        os.remove(data_path)
+
+        registry.register(version, model, scaler, {
+            "model_name": f"LSTM TimeSeries {version}",
+            "last_trained": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "metrics": metrics,
+            "backtest": {k: result[k] for k in ("per_horizon", "per_station")} if result else None,
+            "n_future": n_future,
+            "hours_of_history": n_hours,
+            "train_windows": int(len(starts_train)),
+            "epochs": options["epochs"],
+            "warm_start_from": getattr(parent_model, 'version', None),
+            "train_seconds": round(time.perf_counter() - started, 1),
+        })
+        if options["activate"]:
+            registry.activate(version)
+        registry._finish_job(state="succeeded", version=version, metrics=metrics)
+    except Exception as e:
+        traceback.print_exc()
+        if version is not None:
+            shutil.rmtree(registry.version_dir(version), ignore_errors=True)
+        registry._finish_job(state="failed", error=str(e))
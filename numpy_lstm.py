@@ -0,0 +1,302 @@
+# AirViewer/backend/numpy_lstm.py
+# Motor de inferencia LSTM en NumPy puro (sin TensorFlow en el tier web)
+
+import json
+import os
+import struct
+import numpy as np
+
+# =======================================================
+# FUNCIONES DE ACTIVACIÓN
+# =======================================================
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+def _linear(x):
+    return x
+
+def _relu(x):
+    return np.maximum(x, 0.0)
+
+ACTIVATIONS = {
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'linear': _linear,
+    'relu': _relu,
+}
+
+
+# =======================================================
+# MODELO DE INFERENCIA
+# =======================================================
+
+class NumpyLSTMModel:
+    """
+    Réplica del Sequential de Keras (LSTM apiladas -> Dense) para inferencia.
+    Expone `predict(x, verbose=0)` con la misma firma que usa make_prediction,
+    así que puede reemplazar al modelo Keras sin tocar el resto del código.
+    """
+
+    def __init__(self, layers, input_shape, dtype=np.float32):
+        self.layers = layers
+        self.input_shape = tuple(input_shape)
+        self.dtype = dtype
+
+    @property
+    def output_dim(self):
+        """Número de salidas de la última capa Dense."""
+        return int(self.layers[-1]['kernel'].shape[1])
+
+    def _lstm_forward(self, layer, x):
+        """
+        Recorre la secuencia con la celda LSTM de Keras (orden de compuertas i, f, c, o).
+        La proyección de entrada se calcula para todos los timesteps en un solo matmul.
+        """
+        batch, steps, _ = x.shape
+        units = layer['units']
+        kernel, recurrent, bias = layer['kernel'], layer['recurrent_kernel'], layer['bias']
+        act = ACTIVATIONS[layer['activation']]
+        rec_act = ACTIVATIONS[layer['recurrent_activation']]
+
+        x_proj = x @ kernel + bias  # (batch, steps, 4 * units)
+        h = np.zeros((batch, units), dtype=self.dtype)
+        c = np.zeros((batch, units), dtype=self.dtype)
+        outputs = np.empty((batch, steps, units), dtype=self.dtype) if layer['return_sequences'] else None
+
+        for t in range(steps):
+            z = x_proj[:, t, :] + h @ recurrent
+            i = rec_act(z[:, :units])
+            f = rec_act(z[:, units:2 * units])
+            g = act(z[:, 2 * units:3 * units])
+            o = rec_act(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * act(c)
+            if outputs is not None:
+                outputs[:, t, :] = h
+
+        return outputs if outputs is not None else h
+
+    def predict(self, x, verbose=0, batch_size=None):
+        """Forward pass vectorizado sobre todo el batch. `verbose` se ignora (compatibilidad Keras)."""
+        out = np.asarray(x, dtype=self.dtype)
+        if out.ndim == 2:
+            out = out[np.newaxis, ...]
+
+        for layer in self.layers:
+            if layer['type'] == 'lstm':
+                out = self._lstm_forward(layer, out)
+            else:
+                out = ACTIVATIONS[layer['activation']](out @ layer['kernel'] + layer['bias'])
+        return out
+
+
+# =======================================================
+# CARGA DE PESOS DESDE EL .h5 DE KERAS
+# =======================================================
+
+def _read_layer_weights(weights_group, layer_name):
+    """Devuelve los arrays de una capa en el orden declarado en 'weight_names'."""
+    group = weights_group[layer_name]
+    names = [n.decode() if isinstance(n, bytes) else n for n in group.attrs.get('weight_names', [])]
+    return [np.asarray(group[name]) for name in names]
+
+def load_keras_h5(path, dtype=np.float32):
+    """
+    Lee la arquitectura (model_config) y los pesos del .h5 una sola vez.
+    Las capas Dropout se omiten porque en inferencia son la identidad.
+    """
+    import h5py  # Solo al cargar: importar el módulo no debe costar nada
+
+    layers = []
+    input_shape = None
+
+    with h5py.File(path, 'r') as f:
+        config = json.loads(f.attrs['model_config'])
+        weights_group = f['model_weights']
+
+        for layer_cfg in config['config']['layers']:
+            class_name = layer_cfg['class_name']
+            cfg = layer_cfg['config']
+
+            if class_name == 'InputLayer':
+                input_shape = cfg.get('batch_shape', cfg.get('batch_input_shape'))[1:]
+            elif class_name == 'LSTM':
+                kernel, recurrent, bias = _read_layer_weights(weights_group, cfg['name'])
+                if input_shape is None and 'batch_input_shape' in cfg:
+                    input_shape = cfg['batch_input_shape'][1:]
+                layers.append({
+                    'type': 'lstm',
+                    'units': int(cfg['units']),
+                    'kernel': kernel.astype(dtype),
+                    'recurrent_kernel': recurrent.astype(dtype),
+                    'bias': bias.astype(dtype),
+                    'activation': cfg.get('activation', 'tanh'),
+                    'recurrent_activation': cfg.get('recurrent_activation', 'sigmoid'),
+                    'return_sequences': bool(cfg.get('return_sequences', False)),
+                })
+            elif class_name == 'Dense':
+                kernel, bias = _read_layer_weights(weights_group, cfg['name'])
+                layers.append({
+                    'type': 'dense',
+                    'kernel': kernel.astype(dtype),
+                    'bias': bias.astype(dtype),
+                    'activation': cfg.get('activation', 'linear'),
+                })
+            elif class_name == 'Dropout':
+                continue
+            else:
+                raise ValueError(f"Capa no soportada por el motor NumPy: {class_name}")
+
+    return NumpyLSTMModel(layers, input_shape, dtype=dtype)
+
+
+# =======================================================
+# ARTEFACTO PLANO (MEMORY-MAPPED, SIN PICKLE)
+# =======================================================
+# Disposición del archivo:
+#   ARTIFACT_MAGIC (8 bytes) | longitud de la cabecera (uint32 LE) | cabecera JSON
+#   | padding hasta ARTIFACT_ALIGN | arrays crudos, cada uno alineado a ARTIFACT_ALIGN
+# La cabecera describe arquitectura, dtype, forma y offset de cada array. Los workers
+# mapean el archivo en solo lectura: las páginas las comparte el page cache del SO.
+ARTIFACT_MAGIC = b'AVLSTM\x00\x01'
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_ALIGN = 64
+_LSTM_ARRAYS = ('kernel', 'recurrent_kernel', 'bias')
+_DENSE_ARRAYS = ('kernel', 'bias')
+
+
+class FlatScaler:
+    """
+    Equivalente de inferencia de MinMaxScaler (X * scale_ + min_) a partir de sus dos
+    vectores. Así el tier web no depende de sklearn ni de la versión con la que se hizo el pickle.
+    """
+
+    def __init__(self, min_, scale_):
+        self.min_ = min_
+        self.scale_ = scale_
+        self.n_features_in_ = len(scale_)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+def _align(offset):
+    return -(-offset // ARTIFACT_ALIGN) * ARTIFACT_ALIGN
+
+def save_artifact(path, model, scaler, weights_dtype=np.float32, model_version=None):
+    """
+    Escribe modelo + min_/scale_ del scaler en un único archivo plano.
+    weights_dtype=np.float16 reduce el tamaño a la mitad (el cómputo sigue en float32).
+    El archivo se escribe en un temporal y se renombra: los lectores nunca ven uno a medias.
+    """
+    weights_dtype = np.dtype(weights_dtype)
+    arrays = []  # (nombre, array) en orden de escritura
+
+    layers_meta = []
+    for i, layer in enumerate(model.layers):
+        meta = {k: v for k, v in layer.items() if k not in _LSTM_ARRAYS}
+        meta['arrays'] = {}
+        for name in (_LSTM_ARRAYS if layer['type'] == 'lstm' else _DENSE_ARRAYS):
+            key = f"layers.{i}.{name}"
+            meta['arrays'][name] = key
+            arrays.append((key, np.ascontiguousarray(layer[name], dtype=weights_dtype)))
+        layers_meta.append(meta)
+    arrays.append(('scaler.min_', np.ascontiguousarray(scaler.min_, dtype=np.float64)))
+    arrays.append(('scaler.scale_', np.ascontiguousarray(scaler.scale_, dtype=np.float64)))
+
+    # Los offsets dependen del tamaño de la cabecera: se fija con una pasada previa
+    header = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_version': model_version,
+        'input_shape': list(model.input_shape),
+        'layers': layers_meta,
+        'arrays': {},
+    }
+    for _ in range(2):
+        header_bytes = json.dumps(header, sort_keys=True).encode()
+        offset = _align(len(ARTIFACT_MAGIC) + 4 + len(header_bytes) + 64)
+        for key, array in arrays:
+            header['arrays'][key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(ARTIFACT_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for key, array in arrays:
+            f.seek(header['arrays'][key]['offset'])
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+    return path
+
+def read_artifact_header(path):
+    """Lee y valida solo la cabecera (barato: no toca los pesos)."""
+    with open(path, 'rb') as f:
+        if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+            raise ValueError(f"{path} no es un artefacto de modelo AirViewer.")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length))
+    if header.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Versión de artefacto no soportada: {header.get('format_version')}")
+    return header
+
+def load_artifact(path):
+    """
+    Mapea el artefacto en solo lectura y retorna (NumpyLSTMModel, FlatScaler).
+    Los pesos son vistas sobre el mapa: no se copian ni se deserializan.
+    """
+    header = read_artifact_header(path)
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+
+    def view(key):
+        spec = header['arrays'][key]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        end = spec['offset'] + count * dtype.itemsize
+        if end > buffer.size:
+            raise ValueError(f"Artefacto truncado: {path}")
+        return buffer[spec['offset']:end].view(dtype).reshape(spec['shape'])
+
+    layers = []
+    for meta in header['layers']:
+        layer = {k: v for k, v in meta.items() if k != 'arrays'}
+        layer.update({name: view(key) for name, key in meta['arrays'].items()})
+        layers.append(layer)
+
+    model = NumpyLSTMModel(layers, header['input_shape'])
+    model.version = header.get('model_version')
+    return model, FlatScaler(view('scaler.min_'), view('scaler.scale_'))
+
+
+# =======================================================
+# VERIFICACIÓN DE PARIDAD CONTRA KERAS
+# =======================================================
+
+def check_parity(keras_model, numpy_model, x, atol=1e-5):
+    """
+    Compara la salida de ambos modelos sobre el mismo input.
+    Retorna la diferencia absoluta máxima; lanza AssertionError si supera `atol`.
+    """
+    expected = keras_model.predict(x, verbose=0)
+    actual = numpy_model.predict(x)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    assert max_diff <= atol, f"Paridad NumPy/Keras fuera de tolerancia: {max_diff:.2e} > {atol:.0e}"
+    return max_diff
+
+
+if __name__ == '__main__':
+    from tensorflow.keras.models import load_model
+
+    MODEL_PATH = 'model/lstm_airviewer.h5'
+    keras_model = load_model(MODEL_PATH)
+    numpy_model = load_keras_h5(MODEL_PATH)
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 1, size=(64,) + numpy_model.input_shape).astype(np.float32)
+    diff = check_parity(keras_model, numpy_model, x)
+    print(f"Paridad OK: diferencia máxima {diff:.2e} sobre {x.shape[0]} ventanas.")
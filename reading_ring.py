@@ -0,0 +1,224 @@
+# AirViewer/backend/reading_ring.py
+# Ring buffer de lecturas recientes en memoria compartida (un escritor, lectores sin locks)
+
+import atexit
+import os
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import fcntl  # Elección del escritor entre workers; no existe en Windows
+except ImportError:
+    fcntl = None
+
+# =======================================================
+# CONFIGURACIÓN DEL RING
+# =======================================================
+RING_CAPACITY = 4096          # Lecturas conservadas (~17 h con una entrada cada 15 s)
+ERROR_BYTES = 256             # Último error del escritor (UTF-8, truncado)
+READ_RETRIES = 1000           # Reintentos de un lector que coincide con una escritura
+
+VALUE_FIELDS = ('pm25', 'pm10', 'no2', 'co', 'temp')
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'   # created_at de ThingSpeak
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+# Cabecera (int64): secuencia del seqlock, escrituras totales, fallos seguidos, pid del
+# escritor, longitud del error. Cabecera (float64): último sondeo correcto.
+_SEQ, _COUNT, _FAILURES, _WRITER_PID, _ERROR_LEN = range(5)
+_HEADER_INTS = 8
+_HEADER_FLOATS = 2
+
+
+def _parse_created_at(value):
+    if not value:
+        return NO_TIMESTAMP
+    try:
+        return int(np.datetime64(value.rstrip('Z'), 's').astype(np.int64))
+    except ValueError:
+        return NO_TIMESTAMP
+
+def _format_created_at(epoch):
+    return None if epoch == NO_TIMESTAMP else time.strftime(TIMESTAMP_FORMAT, time.gmtime(epoch))
+
+def _optional_float(value):
+    """NaN (campo faltante en la entrada) -> None, como en parse_feed_entry."""
+    return None if np.isnan(value) else float(value)
+
+
+class ReadingRing:
+    """
+    Últimas `capacity` lecturas de ThingSpeak en un bloque de multiprocessing.shared_memory,
+    como columnas (struct-of-arrays): entry_id, created_at y una columna float64 por campo.
+
+    Se crea al importar la app; con preload_app el master lo crea antes del fork y todos
+    los workers mapean el mismo bloque. Un solo proceso escribe (el que tiene el lock de
+    escritor, ver try_acquire_writer); los lectores no toman locks: un contador de
+    secuencia (seqlock) impar durante cada escritura les indica que deben releer.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        size = 8 * (_HEADER_INTS + _HEADER_FLOATS) + ERROR_BYTES + 8 * capacity * (2 + len(VALUE_FIELDS))
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self._shm.name
+        self._owner_pid = os.getpid()
+        self._writer_pid = None
+        self._writer_lock_file = None
+
+        buf, offset = self._shm.buf, 0
+
+        def view(dtype, count):
+            nonlocal offset
+            arr = np.ndarray((count,), dtype=dtype, buffer=buf, offset=offset)
+            offset += arr.nbytes
+            return arr
+
+        self._ints = view(np.int64, _HEADER_INTS)
+        self._floats = view(np.float64, _HEADER_FLOATS)
+        self._error = view(np.uint8, ERROR_BYTES)
+        self._entry_id = view(np.int64, capacity)
+        self._created_at = view(np.int64, capacity)
+        self._values = {name: view(np.float64, capacity) for name in VALUE_FIELDS}
+        self._ints[:] = 0
+        self._floats[:] = np.nan
+        atexit.register(self.close)
+
+    # --- Escritor único ---
+
+    def try_acquire_writer(self):
+        """
+        True si este proceso es (o pasa a ser) el escritor. El lock es un flock sobre un
+        archivo ligado al nombre del bloque: si el escritor muere, el SO lo libera y otro
+        worker lo toma en su siguiente intento.
+        """
+        if self._writer_pid == os.getpid():
+            return True
+        if fcntl is None:
+            self._writer_pid = os.getpid()
+            return True
+        path = os.path.join(tempfile.gettempdir(), f"{self.name}.writer")
+        lock_file = open(path, 'a+')  # Abierto en este proceso: el flock no se hereda del padre
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._writer_lock_file = lock_file
+        self._writer_pid = os.getpid()
+        self._ints[_WRITER_PID] = self._writer_pid
+        return True
+
+    def _begin_write(self):
+        self._ints[_SEQ] += 1  # Impar: escritura en curso
+
+    def _end_write(self):
+        self._ints[_SEQ] += 1  # Par: datos consistentes
+
+    def push(self, reading, fetched_at=None):
+        """Registra un sondeo correcto; la lectura ocupa un slot nuevo solo si su entry_id es nuevo."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        self._begin_write()
+        try:
+            count = int(self._ints[_COUNT])
+            last = (count - 1) % self.capacity
+            if count == 0 or self._entry_id[last] != (reading.get('entry_id') or 0):
+                slot = count % self.capacity
+                self._entry_id[slot] = reading.get('entry_id') or 0
+                self._created_at[slot] = _parse_created_at(reading.get('created_at'))
+                for name in VALUE_FIELDS:
+                    self._values[name][slot] = reading.get(name, np.nan)
+                self._ints[_COUNT] = count + 1
+            self._floats[0] = fetched_at
+            self._ints[_FAILURES] = 0
+            self._ints[_ERROR_LEN] = 0
+        finally:
+            self._end_write()
+
+    def record_failure(self, error):
+        data = str(error).encode('utf-8', 'replace')[:ERROR_BYTES]
+        self._begin_write()
+        try:
+            self._ints[_FAILURES] += 1
+            self._error[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+            self._ints[_ERROR_LEN] = len(data)
+        finally:
+            self._end_write()
+
+    # --- Lectores (sin locks) ---
+
+    def _consistent(self, read):
+        """Ejecuta read() hasta obtener una copia sin escritura concurrente (seqlock)."""
+        for attempt in range(READ_RETRIES):
+            before = int(self._ints[_SEQ])
+            if before % 2 == 0:
+                result = read()
+                if int(self._ints[_SEQ]) == before:
+                    return result
+            if attempt % 16 == 15:
+                time.sleep(0)  # Cede la CPU si el escritor quedó a mitad de escritura
+        raise RuntimeError("ReadingRing: no se obtuvo una lectura consistente")
+
+    def count(self):
+        """Lecturas escritas desde el arranque (no acotado por la capacidad)."""
+        return int(self._ints[_COUNT])
+
+    def _rows(self, first, count):
+        """Copia de las posiciones lógicas [first, count) como dicts (sin validar)."""
+        slots = np.arange(first, count) % self.capacity
+        entry_ids = self._entry_id[slots].copy()
+        created = self._created_at[slots].copy()
+        values = {name: self._values[name][slots].copy() for name in VALUE_FIELDS}
+        return [
+            {"entry_id": int(entry_ids[i]) or None, "created_at": _format_created_at(int(created[i])),
+             **{name: _optional_float(values[name][i]) for name in VALUE_FIELDS}}
+            for i in range(len(slots))
+        ]
+
+    def since(self, cursor, limit=None):
+        """
+        (lecturas con posición >= cursor, nuevo cursor). Si el cursor quedó fuera del ring
+        (lector muy atrasado) se entregan las `capacity` más recientes.
+        """
+        def read():
+            count = int(self._ints[_COUNT])
+            first = max(cursor, count - self.capacity, 0)
+            if limit is not None:
+                first = max(first, count - limit)
+            return self._rows(first, count), count
+        return self._consistent(read)
+
+    def recent(self, n):
+        """Las n lecturas más recientes, de la más vieja a la más nueva."""
+        return self.since(0, limit=min(n, self.capacity))[0]
+
+    def snapshot(self):
+        """Última lectura y estado del escritor, en una sola copia consistente."""
+        def read():
+            count = int(self._ints[_COUNT])
+            error_len = int(self._ints[_ERROR_LEN])
+            return {
+                "reading": self._rows(count - 1, count)[0] if count else None,
+                "fetched_at": None if np.isnan(self._floats[0]) else float(self._floats[0]),
+                "consecutive_failures": int(self._ints[_FAILURES]),
+                "last_error": bytes(self._error[:error_len]).decode('utf-8', 'replace') if error_len else None,
+                "writer_pid": int(self._ints[_WRITER_PID]) or None,
+            }
+        return self._consistent(read)
+
+    def close(self):
+        """Libera el mapeo; el proceso que creó el bloque además lo elimina del sistema."""
+        if self._shm is None:
+            return
+        for name in ('_ints', '_floats', '_error', '_entry_id', '_created_at', '_values'):
+            setattr(self, name, None)  # Las vistas NumPy deben soltarse antes de cerrar el mapeo
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
+            try:
+                os.remove(os.path.join(tempfile.gettempdir(), f"{self.name}.writer"))
+            except OSError:
+                pass
+        self._shm = None
@@ -0,0 +1,205 @@
+# AirViewer/backend/rollups.py
+# Agregados horarios/diarios mantenidos de forma incremental para las gráficas de tendencia
+
+import threading
+import time
+import numpy as np
+
+from timeseries_store import VALUE_COLUMNS, parse_timestamps
+
+# =======================================================
+# CONFIGURACIÓN DE LOS NIVELES DE AGREGACIÓN
+# =======================================================
+HOUR_S = 3600
+DAY_S = 86400
+HOURLY_RETENTION = 24 * 7   # Buckets horarios conservados (una semana)
+DAILY_RETENTION = 62        # Buckets diarios conservados (~dos meses)
+ALL_STATIONS = '*'          # Clave del agregado de todas las estaciones
+SYNC_CHUNK_ROWS = 100000
+
+
+class _RollupLevel:
+    """
+    Ring buffer de buckets de tamaño fijo para un periodo (hora o día).
+    Por bucket y estación guarda suma/mín/máx/conteo de cada contaminante, así que
+    añadir una lectura y consultar los últimos N buckets cuestan O(1) y O(N).
+    """
+
+    def __init__(self, period_s, n_buckets, n_values):
+        self.period_s = period_s
+        self.n_buckets = n_buckets
+        self.n_values = n_values
+        self.bucket_ids = np.full(n_buckets, -1, dtype=np.int64)
+        self._alloc(1)
+
+    def _alloc(self, n_stations):
+        shape = (self.n_buckets, n_stations, self.n_values)
+        self.sum = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.count = np.zeros(shape, dtype=np.int64)
+
+    def add_station_slot(self):
+        pad = ((0, 0), (0, 1), (0, 0))
+        self.sum = np.pad(self.sum, pad)
+        self.min = np.pad(self.min, pad, constant_values=np.inf)
+        self.max = np.pad(self.max, pad, constant_values=-np.inf)
+        self.count = np.pad(self.count, pad)
+
+    def _reset(self, slots):
+        self.sum[slots] = 0.0
+        self.min[slots] = np.inf
+        self.max[slots] = -np.inf
+        self.count[slots] = 0
+
+    def ingest(self, timestamps, values, station_slots):
+        """Acumula un bloque de lecturas (vectorizado). Las que ya salieron de la retención se ignoran."""
+        buckets = timestamps // self.period_s
+        newest = max(int(buckets.max()), int(self.bucket_ids.max()))
+        keep = buckets > newest - self.n_buckets
+        if not keep.all():
+            buckets, values, station_slots = buckets[keep], values[keep], station_slots[keep]
+        if len(buckets) == 0:
+            return
+
+        # Reciclar los slots cuyo bucket es más viejo que el que llega
+        slots = buckets % self.n_buckets
+        unique_buckets = np.unique(buckets)
+        unique_slots = unique_buckets % self.n_buckets
+        stale = self.bucket_ids[unique_slots] < unique_buckets
+        self._reset(unique_slots[stale])
+        self.bucket_ids[unique_slots[stale]] = unique_buckets[stale]
+
+        # Lecturas de un bucket anterior al que ya ocupa su slot (fuera de retención)
+        valid = self.bucket_ids[slots] == buckets
+        slots, values, station_slots = slots[valid], values[valid], station_slots[valid]
+
+        present = ~np.isnan(values)
+        rows = np.repeat(np.arange(len(slots)), self.n_values)
+        cols = np.tile(np.arange(self.n_values), len(slots))
+        mask = present.ravel()
+        rows, cols = rows[mask], cols[mask]
+        flat = values.ravel()[mask]
+        for station_index in (station_slots[rows], np.zeros(len(rows), dtype=np.int64)):
+            idx = (slots[rows], station_index, cols)
+            np.add.at(self.sum, idx, flat)
+            np.minimum.at(self.min, idx, flat)
+            np.maximum.at(self.max, idx, flat)
+            np.add.at(self.count, idx, 1)
+
+    def series(self, last_bucket, n, station_slot):
+        """Agregados de los n buckets que terminan en last_bucket (huecos con count=0)."""
+        buckets = np.arange(last_bucket - n + 1, last_bucket + 1)
+        slots = buckets % self.n_buckets
+        present = self.bucket_ids[slots] == buckets
+        count = np.where(present[:, None], self.count[slots, station_slot], 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum[slots, station_slot] / count
+        return buckets * self.period_s, count, mean, self.min[slots, station_slot], self.max[slots, station_slot]
+
+
+class RollupEngine:
+    """
+    Agregados por hora y por día (media/mín/máx/conteo por contaminante y estación).
+    Se alimenta de forma incremental con sync(), que solo lee las filas añadidas al
+    almacén desde la última vez (las lecturas de ThingSpeak se escriben allí primero).
+    """
+
+    def __init__(self, values=VALUE_COLUMNS):
+        self.values = list(values)
+        self._lock = threading.Lock()
+        self._station_slots = {ALL_STATIONS: 0}
+        self.hourly = _RollupLevel(HOUR_S, HOURLY_RETENTION, len(self.values))
+        self.daily = _RollupLevel(DAY_S, DAILY_RETENTION, len(self.values))
+        self._store_position = 0
+        self._store_deletions = 0
+
+    def _slots_for(self, station_names):
+        slots = np.empty(len(station_names), dtype=np.int64)
+        for name in set(station_names):
+            if name not in self._station_slots:
+                self._station_slots[name] = len(self._station_slots)
+                self.hourly.add_station_slot()
+                self.daily.add_station_slot()
+            slots[np.asarray(station_names, dtype=object) == name] = self._station_slots[name]
+        return slots
+
+    def _ingest_locked(self, timestamps, values, station_names):
+        slots = self._slots_for(station_names)
+        self.hourly.ingest(timestamps, values, slots)
+        self.daily.ingest(timestamps, values, slots)
+
+    def ingest_many(self, timestamps, columns, station_names):
+        """Acumula un bloque: timestamps (epoch o ISO), columns dict por contaminante, estaciones."""
+        timestamps = parse_timestamps(timestamps)
+        values = np.column_stack([
+            np.asarray(columns.get(name, np.full(len(timestamps), np.nan)), dtype=np.float64)
+            for name in self.values
+        ])
+        with self._lock:
+            self._ingest_locked(timestamps, values, list(station_names))
+
+    def sync(self, store):
+        """
+        Incorpora las filas añadidas al almacén desde la última sincronización (también
+        las escritas por otros workers). Si hubo borrados, reconstruye desde la retención.
+        """
+        if len(store) == self._store_position and store.deletions == self._store_deletions:
+            return
+        with self._lock:
+            count, deletions = len(store), store.deletions
+            stations = np.asarray(store.stations, dtype=object)
+            if self._store_position == 0 or deletions != self._store_deletions or count < self._store_position:
+                chunks = self._rebuild_locked(store)
+            else:
+                chunks = (
+                    store.read_columns(np.arange(lo, min(lo + SYNC_CHUNK_ROWS, count)))
+                    for lo in range(self._store_position, count, SYNC_CHUNK_ROWS)
+                )
+            # Los ids crecen con la posición física: se descartan filas escritas tras leer count
+            last_id = int(store.read_columns(np.array([count - 1]), ['id'])['id'][0]) if count else 0
+            for chunk in chunks:
+                if chunk['id'].size and chunk['id'].max() > last_id:
+                    chunk = {name: col[chunk['id'] <= last_id] for name, col in chunk.items()}
+                values = np.column_stack([chunk[name].astype(np.float64) for name in self.values])
+                self._ingest_locked(chunk['timestamp'], values, stations[chunk['station']].tolist())
+            self._store_position = count
+            self._store_deletions = deletions
+
+    def _rebuild_locked(self, store):
+        """Reinicia los agregados y retorna los bloques del almacén dentro de la retención diaria."""
+        self._station_slots = {ALL_STATIONS: 0}
+        self.hourly = _RollupLevel(HOUR_S, HOURLY_RETENTION, len(self.values))
+        self.daily = _RollupLevel(DAY_S, DAILY_RETENTION, len(self.values))
+        latest = store.latest_timestamp()
+        if latest is None:
+            return iter(())
+        return store.iter_range(start=latest - DAILY_RETENTION * DAY_S, chunk_rows=SYNC_CHUNK_ROWS)
+
+    def _series(self, level, n, station, time_format, now=None):
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            slot = self._station_slots.get(station)
+            if slot is None:
+                return []
+            last_bucket = max(now // level.period_s, int(level.bucket_ids.max()))
+            starts, count, mean, vmin, vmax = level.series(last_bucket, n, slot)
+
+        labels = np.datetime_as_string(starts.astype('datetime64[s]'))
+        series = []
+        for i, start in enumerate(labels):
+            point = {"time": time.strftime(time_format, time.gmtime(int(starts[i]))), "start": str(start) + "Z",
+                     "count": int(count[i].max())}
+            for j, name in enumerate(self.values):
+                has_data = count[i, j] > 0
+                point[name] = round(float(mean[i, j]), 1) if has_data else None
+                point[name + "_min"] = round(float(vmin[i, j]), 1) if has_data else None
+                point[name + "_max"] = round(float(vmax[i, j]), 1) if has_data else None
+            series.append(point)
+        return series
+
+    def last_hours(self, n=24, station=ALL_STATIONS, now=None):
+        return self._series(self.hourly, n, station, "%H:%M", now)
+
+    def last_days(self, n=7, station=ALL_STATIONS, now=None):
+        return self._series(self.daily, n, station, "%Y-%m-%d", now)
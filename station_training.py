@@ -0,0 +1,244 @@
+# AirViewer/backend/station_training.py
+# Entrenamiento de un modelo LSTM por estación en paralelo (pool de procesos con hilos acotados)
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import ml_model
+import numpy_lstm
+from generate_data import station_slug
+from timeseries_store import DEFAULT_STATION
+
+# =======================================================
+# CONFIGURACIÓN DEL ENTRENAMIENTO POR ESTACIÓN
+# =======================================================
+STATION_MODEL_DIR = os.path.join(ml_model.MODEL_DIR, 'stations')
+REPORT_NAME = 'training_report.json'
+TRAIN_EPOCHS = 20
+BATCH_SIZE = 64
+PARTITION_CHUNK_ROWS = 500_000
+SEED = 42
+
+# Variables que leen TensorFlow y las librerías BLAS al importarse: fijan los hilos
+# por proceso para que N entrenamientos simultáneos no se repartan (y peleen) los núcleos.
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')
+
+
+# =======================================================
+# PARTICIÓN DEL HISTÓRICO
+# =======================================================
+
+def partition_by_station(data_path, out_dir, chunksize=PARTITION_CHUNK_ROWS):
+    """
+    Lee el CSV una sola vez por bloques, aplica la normalización Cstd y escribe un .npy
+    (n, 6) float32 por estación, en el orden del archivo. Retorna {estación: ruta}.
+    Sin columna 'station', todo el archivo es la estación DEFAULT_STATION.
+    """
+    needed = set(ml_model.RAW_INPUT_COLUMNS) | set(ml_model.COLUMN_ALIASES) | {'station'}
+    parts = {}
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, usecols=lambda col: col in needed):
+        features = ml_model._normalize_chunk(chunk)
+        if 'station' not in chunk:
+            parts.setdefault(DEFAULT_STATION, []).append(features)
+            continue
+        stations = chunk['station'].to_numpy()
+        for name in pd.unique(stations):
+            parts.setdefault(name, []).append(features[stations == name])
+
+    paths = {}
+    for name, blocks in parts.items():
+        paths[name] = os.path.join(out_dir, f"{station_slug(str(name))}.npy")
+        np.save(paths[name], np.concatenate(blocks))
+    return paths
+
+
+# =======================================================
+# PROCESO DE ENTRENAMIENTO
+# =======================================================
+
+def _init_worker(threads):
+    """Inicializador del pool (proceso nuevo, spawn): limita los hilos antes de importar TensorFlow."""
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = str(threads if name != 'TF_NUM_INTEROP_THREADS' else 1)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def _train_station(task):
+    """
+    Entrena el modelo de una estación con su propio scaler y lo evalúa con el backtest de
+    su tramo de prueba. Escribe <slug>.avm (lo que se sirve) y <slug>.h5 en out_dir.
+    """
+    import backtest
+    import tensorflow as tf
+    from sklearn.preprocessing import MinMaxScaler
+
+    started = time.perf_counter()
+    station, n_future = task["station"], task["n_future"]
+    tf.keras.utils.set_random_seed(task["seed"])
+
+    features = np.load(task["features_path"], mmap_mode='r')
+    scaler = MinMaxScaler(feature_range=(0, 1)).fit(features)
+    scaled = scaler.transform(features).astype(np.float32)
+    segment_ids = np.zeros(len(scaled), dtype=np.int32)
+    starts_train, starts_test = ml_model.window_starts(segment_ids, n_future=n_future)
+    if len(starts_train) == 0:
+        raise ValueError(f"Estación {station}: {len(scaled)} filas no alcanzan para una ventana de entrenamiento.")
+
+    keras_model = ml_model.build_model(scaled.shape[1], n_future)
+    history = keras_model.fit(
+        ml_model.make_window_dataset(scaled, starts_train, n_future=n_future, batch_size=task["batch_size"]),
+        epochs=task["epochs"], verbose=0)
+    fit_seconds = time.perf_counter() - started
+
+    base = os.path.join(task["out_dir"], task["slug"])
+    keras_model.save(base + '.h5')
+    model = numpy_lstm.load_keras_h5(base + '.h5')
+    version = f"{task['slug']}@{int(time.time())}"
+    numpy_lstm.save_artifact(base + '.avm', model, scaler, model_version=version)
+    model.version = version
+    result = backtest.backtest_arrays(model, scaler, scaled, segment_ids, starts_test, [station], n_future)
+
+    losses = [round(float(v), 6) for v in history.history['loss']]
+    return {
+        "station": station,
+        "artifact": base + '.avm',
+        "version": version,
+        "rows": int(len(scaled)),
+        "train_windows": int(len(starts_train)),
+        "epochs": task["epochs"],
+        "loss": losses[-1],
+        "loss_history": losses,
+        "test_metrics": result["overall"] if result else None,
+        "fit_seconds": round(fit_seconds, 2),
+        "seconds": round(time.perf_counter() - started, 2),
+        "pid": os.getpid(),
+        "threads": int(os.environ.get('OMP_NUM_THREADS', 0)) or None,
+    }
+
+
+# =======================================================
+# ENTRENAMIENTO DE TODAS LAS ESTACIONES
+# =======================================================
+
+def train_station_models(data_path=None, mode='single', n_future=ml_model.N_FUTURE, epochs=TRAIN_EPOCHS,
+                         workers=None, threads_per_worker=None, out_dir=STATION_MODEL_DIR,
+                         batch_size=BATCH_SIZE, stations=None):
+    """
+    Parte el histórico por estación y entrena un modelo por estación en un pool de
+    procesos (spawn: sin heredar estado de TensorFlow). Con `workers` procesos y
+    `threads_per_worker` hilos cada uno (por defecto núcleos // workers), entrenar todas
+    las estaciones cuesta en tiempo de reloj lo mismo que entrenar una, si hay núcleos.
+    Retorna el reporte (también en out_dir/training_report.json), o None si no hay
+    dataset o si el filtro `stations` no deja ninguna estación.
+    """
+    data_path = data_path or ml_model.DATA_PATH
+    if not os.path.exists(data_path):
+        print(f"ERROR: Dataset no encontrado en {data_path}. Por favor, ejecute generate_data.py.")
+        return None
+    n_future = n_future if mode == 'direct' else 1
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    partition_dir = tempfile.mkdtemp(prefix='airviewer-stations-', dir=out_dir)
+    try:
+        available = partition_by_station(data_path, partition_dir)
+        paths = available
+        if stations:
+            unknown = sorted(set(stations) - set(map(str, available)))
+            if unknown:
+                print(f"AVISO: Estaciones sin datos en {data_path}: {', '.join(unknown)}")
+            paths = {name: path for name, path in available.items() if str(name) in stations}
+        if not paths:
+            print(f"ERROR: Ninguna estación para entrenar (disponibles: {', '.join(map(str, available)) or 'ninguna'}).")
+            return None
+        partition_seconds = time.perf_counter() - started
+
+        cpus = os.cpu_count() or 1
+        workers = workers or min(len(paths), cpus)
+        threads_per_worker = threads_per_worker or max(1, cpus // workers)
+        tasks = [
+            {"station": name, "slug": station_slug(str(name)), "features_path": path, "out_dir": out_dir,
+             "n_future": n_future, "epochs": epochs, "batch_size": batch_size, "seed": SEED + i}
+            for i, (name, path) in enumerate(paths.items())
+        ]
+        print(f"Entrenando {len(tasks)} estaciones con {workers} procesos x {threads_per_worker} hilos...")
+
+        results, errors = [], {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+            futures = {pool.submit(_train_station, task): task["station"] for task in tasks}
+            for future in as_completed(futures):
+                station = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[station] = str(e)
+                    print(f"ERROR: Estación {station}: {e}")
+                    continue
+                results.append(result)
+                rmse = (result["test_metrics"] or {}).get("rmse")
+                print(f"  {station:<32} {result['seconds']:>8.1f} s   loss {result['loss']:.5f}   RMSE prueba {rmse}")
+    finally:
+        shutil.rmtree(partition_dir, ignore_errors=True)
+
+    wall = time.perf_counter() - started
+    serial = sum(r["seconds"] for r in results)
+    report = {
+        "data_path": data_path,
+        "mode": mode,
+        "n_future": n_future,
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "partition_seconds": round(partition_seconds, 2),
+        "wall_seconds": round(wall, 2),
+        "sum_station_seconds": round(serial, 2),
+        "speedup": round(serial / wall, 2) if wall else None,
+        "stations": sorted(results, key=lambda r: str(r["station"])),
+        "errors": errors,
+    }
+    with open(os.path.join(out_dir, REPORT_NAME), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def load_station_models(out_dir=STATION_MODEL_DIR):
+    """{estación: (modelo, scaler)} mapeados desde los artefactos del último entrenamiento."""
+    try:
+        with open(os.path.join(out_dir, REPORT_NAME), encoding='utf-8') as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {entry["station"]: numpy_lstm.load_artifact(entry["artifact"]) for entry in report["stations"]
+            if os.path.exists(entry["artifact"])}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entrena un modelo LSTM por estación en paralelo.")
+    parser.add_argument('--data', default=ml_model.DATA_PATH)
+    parser.add_argument('--mode', choices=['single', 'direct'], default='single')
+    parser.add_argument('--n-future', type=int, default=ml_model.N_FUTURE)
+    parser.add_argument('--epochs', type=int, default=TRAIN_EPOCHS)
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (por defecto, uno por estación).")
+    parser.add_argument('--threads', type=int, default=None, help="Hilos por proceso (por defecto núcleos/procesos).")
+    parser.add_argument('--stations', default=None, help="Subconjunto separado por comas.")
+    parser.add_argument('--out-dir', default=STATION_MODEL_DIR)
+    args = parser.parse_args()
+
+    report = train_station_models(args.data, args.mode, args.n_future, args.epochs, args.workers, args.threads,
+                                  args.out_dir, stations=args.stations.split(',') if args.stations else None)
+    if report:
+        print(f"Total {report['wall_seconds']} s de reloj para {report['sum_station_seconds']} s de "
+              f"entrenamiento (x{report['speedup']}).")
@@ -0,0 +1,24 @@
+# AirViewer/backend/tests/conftest.py
+# Los módulos del backend son planos en la raíz del repositorio
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """app.py importado una vez con un almacén temporal (los globals viven a nivel de módulo)."""
+    os.environ['AIRVIEWER_STORE_DIR'] = str(tmp_path_factory.mktemp('store'))
+    os.environ.setdefault('AIRVIEWER_ADMIN_TOKEN', 'test-token')
+    import app
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,111 @@
+# AirViewer/backend/tests/test_alerts.py
+# Motor de alertas: umbral sostenido, picos y re-evaluación de filas tardías en sync()
+
+import numpy as np
+import pytest
+
+from alerts import HOUR_S, WARMUP_S, AlertEngine
+from timeseries_store import TimeSeriesStore, format_timestamps
+
+T0 = int(np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64))
+SUSTAINED = {"id": "aqi_3h", "type": "sustained", "field": "aqi", "above": 150, "hours": 3, "severity": "high"}
+SPIKE = {"id": "pm25_spike", "type": "spike", "field": "pm25", "baseline": "rolling_24h", "z": 4.0, "min_delta": 15.0}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / 'store'), initial_capacity=16)
+
+def _hours(store, first_hour, values, per_hour=4, field='aqi', station='norte'):
+    """Escribe `per_hour` lecturas por hora con el valor dado para cada hora."""
+    values = np.repeat(np.asarray(values, dtype=np.float64), per_hour)
+    ts = T0 + first_hour * HOUR_S + np.arange(len(values)) * (HOUR_S // per_hour)
+    base = {'aqi': np.full(len(ts), 50.0), 'pm25': np.full(len(ts), 20.0), 'pm10': np.full(len(ts), 30.0)}
+    base[field] = values
+    store.append_many({'timestamp': ts, 'station': station, **base})
+
+def _at(hour, seconds=0):
+    return format_timestamps(np.array([T0 + hour * HOUR_S + seconds]))[0]
+
+def _transitions(engine):
+    return [(e['rule'], e['state'], e['at']) for e in reversed(engine.recent_events())]
+
+
+def test_sustained_threshold_fires_and_resolves(store):
+    engine = AlertEngine([SUSTAINED])
+    _hours(store, 0, [50, 50, 200, 210, 220])
+    engine.sync(store)
+    assert engine.active() == []  # la hora 4 sigue abierta: solo dos horas cerradas sobre el umbral
+
+    _hours(store, 5, [190])
+    engine.sync(store)
+    [alert] = engine.active()
+    assert alert["since"] == _at(5) and alert["hours"] == 3 and alert["station"] == "norte"
+
+    _hours(store, 6, [60, 50])
+    engine.sync(store)
+    assert engine.active() == []
+    assert _transitions(engine) == [("aqi_3h", "active", _at(5)), ("aqi_3h", "resolved", _at(7))]
+
+def test_sustained_run_restarts_after_a_gap(store):
+    engine = AlertEngine([SUSTAINED])
+    _hours(store, 0, [200, 200])
+    _hours(store, 3, [200, 200, 50])  # la hora 2 no tiene datos: la racha vuelve a empezar
+    engine.sync(store)
+    assert engine.active() == [] and _transitions(engine) == []
+
+def test_spike_fires_on_the_reading_and_resolves_on_the_next_normal_one(store):
+    engine = AlertEngine([SPIKE])
+    _hours(store, 0, [19, 21] * 12, field='pm25')  # 24 h de línea base: media 20, std 1
+    store.append_many({'timestamp': [T0 + 24 * HOUR_S + 60, T0 + 24 * HOUR_S + 120],
+                       'pm25': [80.0, 20.0], 'pm10': [30.0, 30.0], 'station': 'norte'})
+    engine.sync(store)
+    [(rule, state, at), resolved] = _transitions(engine)
+    assert (rule, state, at) == ("pm25_spike", "active", _at(24, 60))
+    assert resolved == ("pm25_spike", "resolved", _at(24, 120))
+    assert engine.recent_events()[1]["value"] == 80.0 and engine.recent_events()[1]["baseline"] == 20.0
+
+def test_spike_below_min_delta_is_ignored(store):
+    engine = AlertEngine([SPIKE])
+    _hours(store, 0, [20] * 24, field='pm25')  # std 0: cualquier exceso supera z * std
+    store.append_many({'timestamp': [T0 + 24 * HOUR_S], 'pm25': [30.0], 'pm10': [30.0], 'station': 'norte'})
+    engine.sync(store)
+    assert _transitions(engine) == []
+
+def test_late_rows_within_warmup_replay_in_time_order(store):
+    engine = AlertEngine([SPIKE])
+    _hours(store, 0, [19, 21] * 15, field='pm25')
+    engine.sync(store)
+    assert engine.stats()["replays"] == 0
+
+    # Un backfill trae una lectura de una hora ya cerrada: se re-evalúa la ventana completa
+    store.append_many({'timestamp': [T0 + 26 * HOUR_S + 30], 'pm25': [90.0], 'pm10': [30.0], 'station': 'norte'})
+    engine.sync(store)
+    stats = engine.stats()
+    assert stats["replays"] == 1 and stats["late_readings"] == 0
+    assert stats["readings"] == len(store)
+    assert _transitions(engine)[0] == ("pm25_spike", "active", _at(26, 30))
+
+def test_rows_older_than_warmup_are_counted_as_late(store):
+    engine = AlertEngine([SPIKE])
+    _hours(store, 0, [20], per_hour=1, field='pm25')
+    _hours(store, WARMUP_S // HOUR_S + 48, [19, 21] * 13, field='pm25')
+    engine.sync(store)
+    readings = engine.stats()["readings"]
+
+    store.append_many({'timestamp': [T0 + HOUR_S], 'pm25': [90.0], 'pm10': [30.0], 'station': 'norte'})
+    engine.sync(store)
+    stats = engine.stats()
+    assert stats["replays"] == 0
+    assert stats["late_readings"] == 1 and stats["readings"] == readings + 1
+    assert _transitions(engine) == []
+
+def test_deletion_rebuilds_state(store):
+    engine = AlertEngine([SUSTAINED])
+    _hours(store, 0, [200, 200, 200, 200])
+    engine.sync(store)
+    assert len(engine.active()) == 1
+    for _ in range(8):
+        store.delete_last()  # horas 2 y 3 eliminadas
+    engine.sync(store)
+    assert engine.active() == [] and engine.stats()["readings"] == len(store)
@@ -0,0 +1,123 @@
+# AirViewer/backend/tests/test_api.py
+# Validación de entradas de los endpoints (400 en lugar de 500)
+
+import pytest
+
+import ml_model
+
+
+def _window():
+    return [[30.0, 50.0, 20.0, 70.0, 1010.0, 500.0]] * ml_model.TIME_STEP
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2, 3],
+    {"stations": "abc"},
+    {"stations": []},
+    {"stations": ["abc"]},
+    {"stations": [{"name": "x"}]},
+    {"stations": [{"name": "x", "window": "abc"}]},
+    {"stations": [{"name": "x", "window": [[1, 2]]}]},
+])
+def test_batch_prediction_rejects_malformed_body(client, body):
+    response = client.post('/api/v1/prediction/batch', json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_batch_prediction(client):
+    response = client.post('/api/v1/prediction/batch', json={"stations": [{"name": "a", "window": _window()}]})
+    assert response.status_code == 200
+    [prediction] = response.get_json()["predictions"]
+    assert prediction["station"] == "a" and len(prediction["forecast"]) == 24
+
+
+@pytest.mark.parametrize('query', ['start_date=notadate', 'end_date=2024-13-01', 'start_date=2024-01-01&end_date=x'])
+def test_download_rejects_bad_dates_before_streaming(client, query):
+    response = client.get(f'/api/v1/history/download?{query}')
+    assert response.status_code == 400
+    assert "inválido" in response.get_json()["error"]
+
+def test_download_csv(client):
+    response = client.get('/api/v1/history/download?start_date=2000-01-01&end_date=2100-01-01')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert 'timestamp' in lines[0]
+    assert len(lines) > 1
+
+
+def test_live_reading_is_stored_once_and_survives_rebuild(app_module):
+    import time
+    from timeseries_store import DEFAULT_STATION
+
+    store, rollups = app_module.HISTORY_STORE, app_module.ROLLUPS
+    hour = (int(time.time()) // 3600 + 3) * 3600  # hora propia, más nueva que el resto del almacén
+    created_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(hour + 1800))
+    reading = {"entry_id": 900001, "created_at": created_at, "pm25": 20.0, "pm10": 30.0,
+               "no2": None, "co": 1.0, "temp": 22.0}
+
+    def hour_count():
+        rollups.sync(store)
+        return rollups.last_hours(1, DEFAULT_STATION, now=hour + 1800)[0]["count"]
+
+    before = len(store)
+    app_module._on_thingspeak_reading(reading)
+    app_module._on_thingspeak_reading(dict(reading))  # otro worker / repetición del ring
+    assert len(store) == before + 1
+    assert store.last(1)[0]["no2"] is None
+    assert hour_count() == 1
+
+    # Un borrado reconstruye los agregados desde el almacén: la lectura en vivo sigue ahí
+    store.append({"timestamp": created_at, "pm25": 1.0, "pm10": 1.0, "station": "otra"})
+    store.delete_last()
+    assert hour_count() == 1
+
+
+def test_admin_requires_token(client):
+    assert client.get('/api/v1/admin/model/versions').status_code == 401
+    assert client.get('/api/v1/admin/model/versions', headers={'X-Admin-Token': 'nope'}).status_code == 401
+    assert client.get('/api/v1/admin/model/versions', headers={'X-Admin-Token': 'test-token'}).status_code == 200
+
+def test_admin_is_closed_without_configured_token(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', None)
+    response = client.post('/api/v1/admin/model/retrain', json={})
+    assert response.status_code == 403
+    assert client.post('/api/v1/admin/thingspeak/backfill', json={}).status_code == 403
+
+    monkeypatch.setattr(app_module, 'ADMIN_OPEN', True)
+    assert client.get('/api/v1/admin/model/versions').status_code == 200
+
+
+@pytest.mark.parametrize('body', [
+    {"concurrency": "abc"}, {"concurrency": 0}, {"concurrency": -2}, {"concurrency": True}, {"concurrency": 1000},
+    {"start": "notadate"}, {"end": "2024-13-01"}, {"start": ["2024-01-01"]},
+    {"start": "2024-02-01", "end": "2024-01-01"}, [1, 2],
+])
+def test_backfill_rejects_bad_options_before_starting(client, app_module, body):
+    before = dict(app_module.THINGSPEAK_BACKFILL)
+    response = client.post('/api/v1/admin/thingspeak/backfill', json=body, headers={'X-Admin-Token': 'test-token'})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert app_module.THINGSPEAK_BACKFILL == before  # ningún hilo lanzado
+
+def test_backfill_options_are_parsed_to_epoch(app_module):
+    assert app_module._backfill_options({}) == (None, None, 4)
+    assert app_module._backfill_options({"start": "2024-01-01", "end": 1704153600, "concurrency": 2}) == \
+        (1704067200, 1704153600, 2)
+
+def test_model_metrics_keys(client):
+    body = client.get('/api/v1/model/metrics').get_json()
+    assert {"rmse", "r2", "mae", "model_name", "last_trained", "version", "source"} <= set(body)
+
+
+@pytest.mark.parametrize('query', ['start_date=notadate', 'end_date=2024-13-01', 'start_date=2024-01-01&end_date=x'])
+def test_history_rejects_bad_dates(client, query):
+    response = client.get(f'/api/v1/history?{query}')
+    assert response.status_code == 400
+    assert "inválido" in response.get_json()["error"]
+
+@pytest.mark.parametrize('limit', ['abc', '1.5', '0', '100000'])
+def test_history_rejects_bad_limit(client, limit):
+    response = client.get(f'/api/v1/history?limit={limit}')
+    assert response.status_code == 400
+    error = response.get_json()["error"]
+    assert "limit" in error and "int()" not in error
@@ -0,0 +1,86 @@
+# AirViewer/backend/tests/test_backtest.py
+# Métricas del backtest contra sklearn y caché invalidada por el dataset
+
+import os
+
+import numpy as np
+import pytest
+
+import backtest
+
+metrics = pytest.importorskip('sklearn.metrics')
+
+
+@pytest.fixture
+def windows():
+    rng = np.random.default_rng(7)
+    actual = rng.uniform(10, 60, (9, 4))
+    predicted = actual + rng.normal(0, 5, actual.shape)
+    segments = np.array([0, 0, 1, 0, 1, 1, 0, 1, 1])  # dos estaciones intercaladas
+    return predicted, actual, segments
+
+def _reference(predicted, actual):
+    return {"rmse": np.sqrt(metrics.mean_squared_error(actual, predicted)),
+            "mae": metrics.mean_absolute_error(actual, predicted),
+            "r2": metrics.r2_score(actual, predicted),
+            "bias": np.mean(predicted - actual)}
+
+def _assert_close(row, expected):
+    for key, value in expected.items():
+        assert row[key] == pytest.approx(value, abs=1e-4), key
+
+
+def test_overall_matches_sklearn(windows):
+    predicted, actual, segments = windows
+    result = backtest.compute_metrics(predicted, actual, segments, ["norte", "sur"])
+    _assert_close(result["overall"], _reference(predicted.ravel(), actual.ravel()))
+    assert result["overall"]["n_windows"] == 9
+
+def test_per_horizon_matches_sklearn(windows):
+    predicted, actual, segments = windows
+    result = backtest.compute_metrics(predicted, actual, segments, ["norte", "sur"])
+    assert [row["h"] for row in result["per_horizon"]] == [1, 2, 3, 4]
+    for h, row in enumerate(result["per_horizon"]):
+        _assert_close(row, _reference(predicted[:, h], actual[:, h]))
+
+def test_per_station_matches_sklearn(windows):
+    predicted, actual, segments = windows
+    result = backtest.compute_metrics(predicted, actual, segments, ["norte", "sur", "vacia"])
+    assert [row["station"] for row in result["per_station"]] == ["norte", "sur"]  # sin ventanas: se omite
+    for s, row in enumerate(result["per_station"]):
+        mask = segments == s
+        assert row["n_windows"] == mask.sum()
+        _assert_close(row, _reference(predicted[mask].ravel(), actual[mask].ravel()))
+
+def test_constant_target_has_no_r2():
+    actual = np.full((3, 2), 20.0)
+    result = backtest.compute_metrics(actual + 1, actual, np.zeros(3, dtype=np.int64), ["norte"])
+    assert result["overall"]["r2"] is None and result["overall"]["rmse"] == 1.0
+
+
+class _Model:
+    version = 'lstm@123'
+
+def test_cached_backtest_is_invalidated_when_the_dataset_changes(tmp_path, monkeypatch):
+    data = tmp_path / 'data.csv'
+    data.write_text("timestamp,pm25\n")
+    monkeypatch.setattr(backtest, 'BACKTEST_CACHE_DIR', str(tmp_path / 'backtests'))
+    monkeypatch.setattr(backtest, '_MEMORY_CACHE', {})
+    runs = []
+    monkeypatch.setattr(backtest, 'run_backtest', lambda *args: runs.append(args) or {"overall": {"rmse": 1.0}})
+
+    model = _Model()
+    assert backtest.cached_backtest(model, str(data), 24) is None
+    first = backtest.get_backtest(model, None, str(data), 24)
+    assert backtest.get_backtest(model, None, str(data), 24) is first
+    assert len(runs) == 1
+
+    backtest._MEMORY_CACHE.clear()  # otro worker: lo lee del archivo de caché
+    assert backtest.cached_backtest(model, str(data), 24)["cache_key"] == first["cache_key"]
+    assert backtest.cached_backtest(model, str(data), 12) is None  # otro horizonte
+
+    stat = os.stat(data)
+    os.utime(data, (stat.st_atime, stat.st_mtime + 60))  # dataset regenerado
+    assert backtest.cached_backtest(model, str(data), 24) is None
+    backtest.get_backtest(model, None, str(data), 24)
+    assert len(runs) == 2
@@ -0,0 +1,127 @@
+# AirViewer/backend/tests/test_bulk_ingest.py
+# Ingesta masiva NDJSON/CSV: validación por línea y estado de la respuesta
+
+import io
+import json
+
+import pytest
+
+import bulk_ingest
+from timeseries_store import TimeSeriesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / 'store'), initial_capacity=16)
+
+def _ndjson(*records):
+    return io.BytesIO(b''.join(json.dumps(r).encode() + b'\n' for r in records))
+
+def _ingest(store, body, fmt='ndjson', chunk_rows=bulk_ingest.INGEST_CHUNK_ROWS):
+    stream = body if isinstance(body, io.BytesIO) else io.BytesIO(body)
+    return bulk_ingest.ingest_stream(store, stream, fmt, chunk_rows)
+
+def _timestamps(store):
+    return [r["timestamp"] for r in store.query()]
+
+
+def test_ndjson(store):
+    result = _ingest(store, _ndjson(
+        {"timestamp": "2024-01-01T00:00:00Z", "pm25": 10, "pm10": 20, "station": "norte"},
+        {"timestamp": "2024-01-01T01:00:00Z", "pm25": 12.5, "pm10": 22, "aqi": 40},
+    ))
+    assert (result["accepted"], result["rejected"]) == (2, 0)
+    first, second = store.query()
+    assert first["aqi"] == 25 and first["station"] == "norte"
+    assert second["aqi"] == 40 and second["pm25"] == 12.5
+
+def test_csv_without_trailing_newline(store):
+    body = b"timestamp,pm25,pm10\r\n2024-01-01T00:00:00Z,10,20\r\n2024-01-01T01:00:00Z,11,21"
+    result = _ingest(store, body, 'csv')
+    assert result["accepted"] == 2
+    assert _timestamps(store) == ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z"]
+
+def test_errors_report_their_line_numbers(store):
+    body = b"\n".join([
+        b'{"timestamp": "2024-01-01T00:00:00Z", "pm25": 10, "pm10": 20}',
+        b'not json',
+        b'',
+        b'{"timestamp": "ayer", "pm25": 10, "pm10": 20}',
+        b'{"timestamp": "2024-01-01T01:00:00Z", "pm25": -1, "pm10": 20}',
+        b'{"timestamp": "2024-01-01T02:00:00Z", "pm10": 20}',
+        b'[1, 2]',
+        b'{"timestamp": "2024-01-01T03:00:00Z", "pm25": 1e999, "pm10": 20}',
+        b'{"timestamp": "2024-01-01T04:00:00Z", "pm25": "x", "pm10": 20}',
+    ])
+    result = _ingest(store, body, chunk_rows=4)
+    assert result["accepted"] == 1
+    assert [(e["line"], e["error"]) for e in result["errors"]] == [
+        (2, result["errors"][0]["error"]),
+        (4, "timestamp inválido (se espera ISO 8601)"),
+        (5, "'pm25' no puede ser negativo"),
+        (6, "Falta el campo 'pm25'"),
+        (7, "Cada línea debe ser un objeto JSON"),
+        (8, "'pm25' debe ser un número finito"),
+        (9, "'pm25' no es numérico"),
+    ]
+    assert result["errors"][0]["error"].startswith("JSON inválido")
+
+def test_mixed_timezones_in_one_chunk_are_normalized_to_utc(store):
+    result = _ingest(store, _ndjson(
+        {"timestamp": "2024-01-01T02:00:00+02:00", "pm25": 10, "pm10": 20},
+        {"timestamp": "2024-01-01T01:00:00", "pm25": 10, "pm10": 20},
+        {"timestamp": "2024-01-01T03:00:00Z", "pm25": 10, "pm10": 20},
+        {"timestamp": "2024-01-01T99:00:00", "pm25": 10, "pm10": 20},
+    ))
+    assert result["accepted"] == 3
+    assert [e["line"] for e in result["errors"]] == [4]
+    assert _timestamps(store) == ["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z", "2024-01-01T03:00:00Z"]
+
+def test_csv_header_is_kept_across_chunks(store):
+    rows = [f"2024-01-01T{h:02d}:00:00Z,{h},{h + 10},est-{h % 2}".encode() for h in range(7)]
+    rows[4] = b"2024-01-01T04:00:00Z,4"
+    body = b"\n".join([b"", b"", b"\xef\xbb\xbftimestamp, pm25, pm10, station"] + rows) + b"\n"
+    result = _ingest(store, body, 'csv', chunk_rows=2)  # la cabecera llega en el segundo bloque
+    assert result["accepted"] == 6
+    assert result["errors"] == [{"line": 8, "error": "Se esperaban 4 campos, hay 2"}]
+    records = store.query()
+    assert [r["pm25"] for r in records] == [0, 1, 2, 3, 5, 6]
+    assert [r["station"] for r in records[:2]] == ["est-0", "est-1"]
+
+def test_blank_csv_body_ingests_nothing(store):
+    assert _ingest(store, b"\n\n", 'csv')["accepted"] == 0
+    assert len(store) == 0
+
+def test_errors_are_truncated(store, monkeypatch):
+    monkeypatch.setattr(bulk_ingest, 'MAX_REPORTED_ERRORS', 2)
+    result = _ingest(store, b"x\ny\nz\n")
+    assert result["rejected"] == 3 and len(result["errors"]) == 2 and result["errors_truncated"]
+
+
+def test_endpoint_partial_success_is_200(client):
+    body = b'{"timestamp": "2030-01-01T00:00:00Z", "pm25": 10, "pm10": 20}\nnot json\n'
+    response = client.post('/api/v1/history/bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert (response.get_json()["accepted"], response.get_json()["rejected"]) == (1, 1)
+
+def test_endpoint_all_rejected_is_400(client):
+    response = client.post('/api/v1/history/bulk?format=csv', data=b"timestamp,pm25,pm10\nx,1,2\n")
+    assert response.status_code == 400
+    assert response.get_json()["rejected"] == 1
+
+def test_endpoint_empty_body_is_200(client):
+    response = client.post('/api/v1/history/bulk?format=csv', data=b"\n")
+    assert response.status_code == 200
+    assert response.get_json()["accepted"] == 0
+
+def test_endpoint_rejects_unknown_format_and_undecodable_csv(client):
+    assert client.post('/api/v1/history/bulk?format=xml', data=b"").status_code == 400
+    response = client.post('/api/v1/history/bulk?format=csv', data=b"\xff\xfe\n1,2\n")
+    assert response.status_code == 400
+    assert "ilegible" in response.get_json()["error"]
+
+def test_endpoint_syncs_views_after_ingest(app_module, client):
+    body = b'{"timestamp": "2030-02-01T00:00:00Z", "pm25": 10, "pm10": 20}\n'
+    assert client.post('/api/v1/history/bulk', data=body).status_code == 200
+    assert app_module.ROLLUPS._store_position == len(app_module.HISTORY_STORE)
+    assert app_module.ALERTS._store_position == len(app_module.HISTORY_STORE)
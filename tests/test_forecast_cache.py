@@ -0,0 +1,82 @@
+# AirViewer/backend/tests/test_forecast_cache.py
+# Caché de pronósticos: TTL, orden LRU, invalidación y claves
+
+import numpy as np
+import pytest
+
+import forecast_cache
+from forecast_cache import ForecastCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(forecast_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+def _window(seed=0):
+    return np.random.default_rng(seed).random((24, 6))
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = ForecastCache(ttl_s=300)
+    cache.put('k', [1.0, 2.0])
+    clock[0] += 300
+    np.testing.assert_array_equal(cache.get('k'), [1.0, 2.0])  # justo en el límite sigue vigente
+    clock[0] += 1
+    assert cache.get('k') is None
+    assert cache.stats()["size"] == 0  # la entrada expirada se descarta al leerla
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_put_refreshes_the_ttl(clock):
+    cache = ForecastCache(ttl_s=10)
+    cache.put('k', [1.0])
+    clock[0] += 8
+    cache.put('k', [2.0])
+    clock[0] += 8
+    np.testing.assert_array_equal(cache.get('k'), [2.0])
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = ForecastCache(max_entries=3)
+    for key in 'abc':
+        cache.put(key, [0.0])
+    assert cache.get('a') is not None       # 'a' pasa a ser la más reciente
+    cache.put('d', [0.0])                   # expulsa 'b'
+    assert cache.get('b') is None
+    cache.put('c', [1.0])                   # reescribir también la marca como reciente
+    cache.put('e', [0.0])                   # expulsa 'a'
+    assert [key for key in 'abcde' if cache.get(key) is not None] == ['c', 'd', 'e']
+    assert cache.stats()["evictions"] == 2 and cache.stats()["size"] == 3
+
+def test_invalidate_clears_everything():
+    cache = ForecastCache()
+    cache.put('a', [1.0])
+    cache.put('b', [2.0])
+    cache.invalidate()
+    assert cache.get('a') is None and cache.get('b') is None
+    stats = cache.stats()
+    assert stats["size"] == 0 and stats["invalidations"] == 1 and stats["hit_rate"] == 0.0
+
+def test_cached_array_is_a_read_only_copy():
+    cache = ForecastCache()
+    value = np.array([1.0, 2.0])
+    cache.put('k', value)
+    value[0] = 99.0                          # el llamador no altera lo cacheado
+    cached = cache.get('k')
+    np.testing.assert_array_equal(cached, [1.0, 2.0])
+    with pytest.raises(ValueError):
+        cached[0] = 5.0
+
+def test_key_depends_on_window_model_version_and_horizon():
+    window = _window()
+    key = ForecastCache.make_key(window, 'v1', 24)
+    assert ForecastCache.make_key(window.copy(), 'v1', 24) == key
+    assert ForecastCache.make_key(window.astype(np.float32), 'v1', 24) == key  # se compara en float32
+    assert ForecastCache.make_key(np.asfortranarray(window), 'v1', 24) == key
+    others = {
+        ForecastCache.make_key(window, 'v2', 24),
+        ForecastCache.make_key(window, 'v1', 12),
+        ForecastCache.make_key(_window(1), 'v1', 24),
+        ForecastCache.make_key(window, 'v1', 1),
+    }
+    assert key not in others and len(others) == 4
@@ -0,0 +1,122 @@
+# AirViewer/backend/tests/test_history_export.py
+# Exportación del histórico: ida y vuelta de CSV, gzip, Parquet y Arrow
+
+import csv
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+import history_export
+from timeseries_store import VALUE_COLUMNS, TimeSeriesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / 'store'), initial_capacity=16)
+    n = 25
+    ts = np.datetime64('2024-03-01T00:00:00', 's').astype(np.int64) + 3600 * np.arange(n)
+    no2 = np.round(np.linspace(30, 60, n), 1)
+    no2[3] = np.nan
+    store.append_many({'timestamp': ts, 'aqi': np.arange(n) * 2.0, 'pm25': np.round(np.linspace(5, 55, n), 1),
+                       'pm10': np.full(n, 40.5), 'no2': no2, 'co': np.full(n, 2.5),
+                       'station': ['norte' if i % 2 else 'sur' for i in range(n)]})
+    return store
+
+def _expected(store, start=None, end=None):
+    return store.query(start, end)
+
+def _read(store, fmt, compress=False, start=None, end=None):
+    stream = history_export.export_stream(store, fmt, start, end, compress)
+    return b''.join(stream)
+
+def _csv_rows(data):
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert ','.join(rows[0]) + '\n' == history_export.CSV_HEADER
+    return rows[1:]
+
+def _assert_csv_matches(rows, records):
+    assert len(rows) == len(records)
+    for row, record in zip(rows, records):
+        assert row[0] == record["timestamp"] and row[-1] == record["station"]
+        for cell, name in zip(row[1:-1], VALUE_COLUMNS):
+            assert (float(cell) if cell else None) == record[name]
+
+def _assert_table_matches(table, records):
+    # Parquet no tiene unidad de segundos: el timestamp vuelve como ms y se convierte
+    schema = history_export._arrow_schema()
+    assert table.schema.names == schema.names
+    table = table.cast(schema)
+    columns = table.to_pydict()
+    assert [t.strftime('%Y-%m-%dT%H:%M:%SZ') for t in columns["timestamp"]] == [r["timestamp"] for r in records]
+    assert columns["station"] == [r["station"] for r in records]
+    for name in VALUE_COLUMNS:
+        exported = [None if v is None or v != v else round(v, 1) for v in columns[name]]
+        assert exported == [r[name] for r in records]
+
+
+def test_csv_round_trip(store):
+    rows = _csv_rows(b''.join(history_export.iter_csv(store, chunk_rows=4)))
+    _assert_csv_matches(rows, _expected(store))
+    assert rows[3][4] == ''  # NaN -> celda vacía
+
+def test_gzip_round_trip_with_range(store):
+    data = _read(store, 'csv', compress=True, start='2024-03-01T05:00:00', end='2024-03-01T10:00:00')
+    assert data[:2] == b'\x1f\x8b'
+    rows = _csv_rows(gzip.decompress(data))
+    _assert_csv_matches(rows, _expected(store, '2024-03-01T05:00:00', '2024-03-01T10:00:00'))
+    assert len(rows) == 6
+
+def test_parquet_round_trip(store):
+    pq = pytest.importorskip('pyarrow.parquet')
+    stream = history_export.iter_parquet(store, chunk_rows=10)
+    parquet = pq.ParquetFile(io.BytesIO(b''.join(stream)))
+    assert parquet.metadata.num_row_groups == 3  # un row group por bloque
+    _assert_table_matches(parquet.read(), _expected(store))
+
+def test_arrow_round_trip(store):
+    pa = pytest.importorskip('pyarrow')
+    data = b''.join(history_export.iter_arrow(store, chunk_rows=10))
+    reader = pa.ipc.open_stream(data)
+    batches = list(reader)
+    assert reader.schema == history_export._arrow_schema()
+    assert [len(b) for b in batches] == [10, 10, 5]
+    _assert_table_matches(pa.Table.from_batches(batches), _expected(store))
+
+def test_gzip_parquet_round_trip(store):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pq.read_table(io.BytesIO(gzip.decompress(_read(store, 'parquet', compress=True))))
+    _assert_table_matches(table, _expected(store))
+
+def test_empty_range_exports_only_the_schema(store):
+    pa = pytest.importorskip('pyarrow')
+    assert _csv_rows(_read(store, 'csv', start='2030-01-01')) == []
+    assert pa.ipc.open_stream(_read(store, 'arrow', start='2030-01-01')).read_all().num_rows == 0
+
+
+@pytest.mark.parametrize('fmt, mimetype, extension', [
+    ('parquet', 'application/vnd.apache.parquet', 'parquet'),
+    ('arrow', 'application/vnd.apache.arrow.stream', 'arrow'),
+])
+def test_download_endpoint_binary_formats(client, fmt, mimetype, extension):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    response = client.get(f'/api/v1/history/download?format={fmt}&start_date=2000-01-01&end_date=2100-01-01')
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert response.headers["Content-Disposition"].endswith(f'.{extension}"')
+    source = io.BytesIO(response.get_data())
+    table = pq.read_table(source) if fmt == 'parquet' else pa.ipc.open_stream(source).read_all()
+    assert table.num_rows > 0
+
+def test_download_endpoint_gzip(client):
+    response = client.get('/api/v1/history/download?gzip=1')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert response.headers["Content-Disposition"].endswith('.csv.gz"')
+    assert gzip.decompress(response.get_data()).decode().startswith('timestamp,')
+
+def test_download_endpoint_rejects_unknown_format(client):
+    assert client.get('/api/v1/history/download?format=xlsx').status_code == 400
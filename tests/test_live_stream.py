@@ -0,0 +1,37 @@
+# AirViewer/backend/tests/test_live_stream.py
+# Cupo de suscriptores SSE por worker
+
+from live_stream import EventBroadcaster
+
+
+def test_subscribe_caps_connections():
+    broadcaster = EventBroadcaster(max_subscribers=2)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+    assert first is not None and second is not None
+    assert broadcaster.subscribe() is None
+    assert broadcaster.stats()["subscribers"] == 2
+
+def test_close_releases_slot_once_even_if_never_iterated():
+    broadcaster = EventBroadcaster(max_subscribers=1)
+    events = broadcaster.subscribe()
+    assert broadcaster.subscribe() is None
+    events.close()
+    events.close()
+    assert broadcaster.stats()["subscribers"] == 0
+    assert broadcaster.subscribe() is not None
+
+def test_events_are_delivered():
+    broadcaster = EventBroadcaster(heartbeat_s=0.01)
+    broadcaster.publish({"pm25": 12.5})
+    events = broadcaster.subscribe()
+    assert next(events).startswith(b"retry:")
+    assert next(events) == b'id: 1\nevent: reading\ndata: {"pm25":12.5}\n\n'
+    assert next(events) == b": keepalive\n\n"
+    events.close()
+
+def test_stream_endpoint_returns_503_when_full(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.THINGSPEAK_POLLER, 'start', lambda: None)
+    monkeypatch.setattr(app_module.LIVE_STREAM, 'max_subscribers', 0)
+    response = client.get('/api/v1/data/stream')
+    assert response.status_code == 503
+    assert "error" in response.get_json()
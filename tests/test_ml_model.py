@@ -0,0 +1,151 @@
+# AirViewer/backend/tests/test_ml_model.py
+# Pronóstico multi-horizonte: despliegue recursivo del modelo de un paso y salida directa
+
+import numpy as np
+import pytest
+
+import ml_model
+
+
+class _ShiftModel:
+    """Modelo de juguete de un paso: predice el último PM2.5 escalado + 0.01."""
+
+    output_dim = 1
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, x, verbose=0):
+        self.calls += 1
+        return np.asarray(x)[:, -1, :1] + 0.01
+
+
+class _DirectModel:
+    output_dim = ml_model.N_FUTURE
+
+    def predict(self, x, verbose=0):
+        return np.tile(np.arange(self.output_dim, dtype=np.float32), (len(x), 1))
+
+
+@pytest.fixture(scope='module')
+def served():
+    model, scaler = ml_model.load_artefacts()
+    if model is None:
+        pytest.skip("Modelo no disponible")
+    return model, scaler
+
+def _windows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 1, size=(n, ml_model.TIME_STEP, len(ml_model.FEATURE_COLUMNS))).astype(np.float32)
+
+
+def test_single_step_model_is_rolled_out():
+    model, windows = _ShiftModel(), _windows(3)
+    out = ml_model.forecast_scaled(model, windows, 24)
+    assert out.shape == (3, 24)
+    assert model.calls == 24  # un forward pass por hora, para todo el lote
+    np.testing.assert_allclose(out, windows[:, -1:, 0] + 0.01 * np.arange(1, 25), atol=1e-5)
+
+def test_rollout_matches_manual_recursion(served):
+    model, _ = served
+    windows = _windows(2, seed=1)
+    expected, window = [], windows.copy()
+    for _ in range(6):
+        y = model.predict(window, verbose=0)[:, 0]
+        expected.append(y)
+        step = window[:, -1:].copy()
+        step[:, 0, 0] = y
+        window = np.concatenate([window[:, 1:], step], axis=1)
+    np.testing.assert_allclose(ml_model.forecast_scaled(model, windows, 6), np.stack(expected, axis=1), atol=1e-6)
+
+def test_direct_model_uses_one_pass():
+    out = ml_model.forecast_scaled(_DirectModel(), _windows(2), 12)
+    np.testing.assert_array_equal(out, np.tile(np.arange(12), (2, 1)))
+
+def test_next_24h_is_not_flat(served):
+    model, scaler = served
+    rng = np.random.default_rng(2)
+    raw = np.column_stack([rng.uniform(10, 50, 24), rng.uniform(20, 80, 24), rng.uniform(15, 25, 24),
+                           rng.uniform(50, 90, 24), rng.uniform(1000, 1015, 24), rng.uniform(400, 600, 24)])
+    [forecast] = ml_model.make_batch_prediction(model, scaler, raw[None])
+    assert len(forecast) == 24
+    assert len({p["pred_pm25"] for p in forecast}) > 1
+
+
+def _stations_csv(path, hours=60):
+    import pandas as pd
+
+    rng = np.random.default_rng(3)
+    frames = []
+    for name in ("norte", "sur"):
+        frames.append(pd.DataFrame({
+            "timestamp": pd.date_range("2024-01-01", periods=hours, freq="h"), "station": name,
+            "pm25": rng.uniform(10, 50, hours), "pm10": rng.uniform(20, 80, hours),
+            "Temperatura": rng.uniform(15, 25, hours), "Humedad": rng.uniform(50, 90, hours),
+            "Presion": rng.uniform(1000, 1015, hours), "CO2": rng.uniform(400, 600, hours),
+        }))
+    pd.concat(frames).to_csv(path, index=False)
+    return str(path)
+
+@pytest.mark.parametrize('n_future', [1, 4])
+def test_multi_station_windows_are_lazy(tmp_path, n_future):
+    pytest.importorskip('sklearn')
+    path = _stations_csv(tmp_path / 'stations.csv')
+    X, Y, _ = ml_model.load_and_preprocess_data(n_future=n_future, data_path=path)
+    scaled, segment_ids, _, _ = ml_model.read_scaled_features(path)
+    starts, _ = ml_model.window_starts(segment_ids, n_future=n_future)
+
+    assert isinstance(X, ml_model.LazyWindows)  # sin copia de N x TIME_STEP x 6
+    assert X.shape == (len(starts), ml_model.TIME_STEP, 6)
+    assert Y.shape == ((len(starts),) if n_future == 1 else (len(starts), n_future))
+    # Ninguna ventana cruza de una estación a la otra y el contenido coincide con la matriz
+    X_all, Y_all = np.asarray(X), np.asarray(Y)
+    for i, start in enumerate(starts):
+        np.testing.assert_array_equal(X_all[i], scaled[start:start + ml_model.TIME_STEP])
+        target = scaled[start + ml_model.TIME_STEP:start + ml_model.TIME_STEP + n_future, 0]
+        np.testing.assert_array_equal(Y_all[i], target[0] if n_future == 1 else target)
+    np.testing.assert_array_equal(X[3], X_all[3])
+    np.testing.assert_array_equal(X[[1, 5]], X_all[[1, 5]])
+
+
+METRIC_KEYS = {"rmse", "r_squared", "mae", "model_name", "last_trained"}
+
+def test_evaluation_metrics_keep_the_same_keys(tmp_path, monkeypatch, served):
+    import backtest
+
+    model, scaler = served
+    assert set(ml_model.get_evaluation_metrics()) == METRIC_KEYS
+
+    monkeypatch.setattr(ml_model, 'DATA_PATH', _stations_csv(tmp_path / 'stations.csv'))
+    monkeypatch.setattr(backtest, 'BACKTEST_CACHE_DIR', str(tmp_path / 'backtests'))
+    result = ml_model.get_evaluation_metrics(model, scaler)
+    assert set(result) == METRIC_KEYS
+    assert result["last_trained"] == ml_model.model_trained_at(model)
+
+def test_trained_at_comes_from_the_model_version():
+    class _Versioned:
+        version = 'lstm_airviewer.h5@86400'
+    assert ml_model.model_trained_at(_Versioned()).startswith('1970-01-0')
+    assert ml_model.model_trained_at(object()) is None
+
+
+def test_csv_without_trailing_newline(tmp_path):
+    pytest.importorskip('sklearn')
+    path = _stations_csv(tmp_path / 'stations.csv')
+    with open(path, 'rb') as f:
+        body = f.read().rstrip(b'\r\n')
+    for name, data in (('no_newline.csv', body), ('blank_tail.csv', body + b'\n\n\n')):
+        (tmp_path / name).write_bytes(data)
+        scaled, segment_ids, stations, _ = ml_model.read_scaled_features(str(tmp_path / name))
+        assert len(scaled) == len(segment_ids) == body.count(b'\n')
+        assert stations == ["norte", "sur"]
+        assert np.isfinite(scaled).all()
+
+def test_interleaved_stations_are_rejected(tmp_path):
+    pytest.importorskip('sklearn')
+    import pandas as pd
+
+    df = pd.read_csv(_stations_csv(tmp_path / 'stations.csv'))
+    df.sort_values(['timestamp', 'station']).to_csv(tmp_path / 'mixed.csv', index=False)
+    with pytest.raises(ValueError, match="contiguas"):
+        ml_model.read_scaled_features(str(tmp_path / 'mixed.csv'))
@@ -0,0 +1,71 @@
+# AirViewer/backend/tests/test_model_artifact.py
+# Artefacto plano (.avm): round-trip float32/float16, scaler y archivos inválidos
+
+import os
+
+import numpy as np
+import pytest
+
+import numpy_lstm
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(ROOT, 'model', 'lstm_airviewer.h5')
+SCALER_PATH = os.path.join(ROOT, 'model', 'scaler_airviewer.pkl')
+
+
+@pytest.fixture(scope='module')
+def numpy_model():
+    return numpy_lstm.load_keras_h5(MODEL_PATH)
+
+@pytest.fixture(scope='module')
+def windows(numpy_model):
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1, size=(64,) + numpy_model.input_shape).astype(np.float32)
+
+@pytest.fixture(scope='module')
+def scaler():
+    return numpy_lstm.FlatScaler(np.linspace(-0.5, 0.0, 6), np.linspace(0.01, 0.2, 6))
+
+
+# float16: solo se redondean los pesos (el cómputo sigue en float32)
+@pytest.mark.parametrize('weights_dtype, weights_rtol, atol', [(np.float32, 0, 0), (np.float16, 1e-3, 1e-2)])
+def test_artifact_round_trip(tmp_path, numpy_model, scaler, windows, weights_dtype, weights_rtol, atol):
+    path = str(tmp_path / 'model.avm')
+    numpy_lstm.save_artifact(path, numpy_model, scaler, weights_dtype=weights_dtype, model_version='test-v1')
+    model, loaded_scaler = numpy_lstm.load_artifact(path)
+
+    assert model.version == 'test-v1'
+    assert model.input_shape == numpy_model.input_shape
+    assert model.output_dim == numpy_model.output_dim
+    for original, layer in zip(numpy_model.layers, model.layers):
+        assert layer['type'] == original['type']
+        assert layer['kernel'].dtype == np.dtype(weights_dtype)
+        np.testing.assert_allclose(layer['kernel'], original['kernel'], rtol=weights_rtol, atol=1e-6 if weights_rtol else 0)
+
+    np.testing.assert_array_equal(loaded_scaler.min_, scaler.min_)
+    np.testing.assert_array_equal(loaded_scaler.scale_, scaler.scale_)
+    np.testing.assert_allclose(model.predict(windows), numpy_model.predict(windows), rtol=0, atol=atol)
+
+def test_artifact_from_shipped_scaler(tmp_path, numpy_model):
+    joblib = pytest.importorskip('joblib')
+    scaler = joblib.load(SCALER_PATH)
+    path = str(tmp_path / 'model.avm')
+    numpy_lstm.save_artifact(path, numpy_model, scaler)
+    _, flat = numpy_lstm.load_artifact(path)
+
+    x = np.random.default_rng(1).uniform(0, 100, size=(10, flat.n_features_in_))
+    np.testing.assert_allclose(flat.transform(x), scaler.transform(x), rtol=1e-12)
+    np.testing.assert_allclose(flat.inverse_transform(flat.transform(x)), x, rtol=1e-9)
+
+def test_truncated_artifact_is_rejected(tmp_path, numpy_model, scaler):
+    path = str(tmp_path / 'model.avm')
+    numpy_lstm.save_artifact(path, numpy_model, scaler)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    with pytest.raises(ValueError):
+        numpy_lstm.load_artifact(path)
+
+def test_not_an_artifact(tmp_path):
+    path = tmp_path / 'bogus.avm'
+    path.write_bytes(b'not a model at all')
+    with pytest.raises(ValueError):
+        numpy_lstm.read_artifact_header(str(path))
@@ -0,0 +1,26 @@
+# AirViewer/backend/tests/test_model_registry.py
+# Volcado del almacén a CSV horario para el re-entrenamiento
+
+import numpy as np
+import pandas as pd
+
+from model_registry import _history_csv
+from timeseries_store import TimeSeriesStore
+
+
+def test_history_csv_interpolates_within_each_station(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    store = TimeSeriesStore(store_dir, initial_capacity=16)
+    hour = np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64)
+    # "a": PM10 falta en su última hora; "b" (la fila siguiente en el CSV) tiene otro nivel
+    store.append_many({'timestamp': hour + 3600 * np.arange(2), 'pm25': [5.0, 7.0], 'pm10': [10.0, np.nan],
+                       'station': 'a'})
+    store.append_many({'timestamp': hour + 3600 * np.arange(3), 'pm25': [50.0, np.nan, 70.0],
+                       'pm10': [100.0, 100.0, 100.0], 'station': 'b'})
+
+    path = str(tmp_path / 'history.csv')
+    assert _history_csv(store_dir, path) == 5
+    df = pd.read_csv(path)
+    a, b = df[df['station'] == 'a'], df[df['station'] == 'b']
+    assert a['pm10'].tolist() == [10.0, 10.0]         # no se rellena con los 100 de "b"
+    assert b['pm25'].tolist() == [50.0, 60.0, 70.0]   # hueco interno interpolado en "b"
@@ -0,0 +1,34 @@
+# AirViewer/backend/tests/test_numpy_lstm.py
+# Paridad del motor NumPy contra Keras
+
+import os
+
+import numpy as np
+import pytest
+
+import numpy_lstm
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(ROOT, 'model', 'lstm_airviewer.h5')
+
+
+@pytest.fixture(scope='module')
+def numpy_model():
+    return numpy_lstm.load_keras_h5(MODEL_PATH)
+
+@pytest.fixture(scope='module')
+def windows(numpy_model):
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1, size=(64,) + numpy_model.input_shape).astype(np.float32)
+
+
+def test_parity_with_keras(numpy_model, windows):
+    keras = pytest.importorskip('tensorflow').keras
+    keras_model = keras.models.load_model(MODEL_PATH, compile=False)
+
+    expected = keras_model.predict(windows, verbose=0)
+    actual = numpy_model.predict(windows)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-5)
+
+def test_single_window_is_batched(numpy_model, windows):
+    np.testing.assert_array_equal(numpy_model.predict(windows[0]), numpy_model.predict(windows[:1]))
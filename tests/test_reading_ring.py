@@ -0,0 +1,125 @@
+# AirViewer/backend/tests/test_reading_ring.py
+# Ring de lecturas en memoria compartida: seqlock, vuelta del ring y elección del escritor
+
+import multiprocessing
+import time
+
+import pytest
+
+from reading_ring import ERROR_BYTES, VALUE_FIELDS, ReadingRing, fcntl
+
+
+def _reading(entry_id):
+    # Todos los campos derivan del entry_id: una fila mezclada entre dos escrituras se nota
+    return {"entry_id": entry_id, "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(60 * entry_id)),
+            **{name: float(entry_id) for name in VALUE_FIELDS}}
+
+def _assert_intact(row):
+    assert row == _reading(row["entry_id"])
+
+@pytest.fixture
+def ring():
+    ring = ReadingRing(capacity=8)
+    yield ring
+    ring.close()
+
+@pytest.fixture
+def fork():
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip("el ring se comparte entre procesos por fork (preload_app)")
+    return multiprocessing.get_context('fork')
+
+
+def _write_many(ring, n):
+    assert ring.try_acquire_writer()
+    for entry_id in range(1, n + 1):
+        ring.push(_reading(entry_id), fetched_at=float(entry_id))
+
+def test_concurrent_reader_never_sees_torn_rows(fork):
+    n = 20000
+    ring = ReadingRing(capacity=64)
+    try:
+        writer = fork.Process(target=_write_many, args=(ring, n))
+        writer.start()
+        cursor, seen, deadline = 0, 0, time.monotonic() + 60
+        while cursor < n and time.monotonic() < deadline:
+            rows, new_cursor = ring.since(cursor)
+            for row in rows:
+                _assert_intact(row)
+            assert [row["entry_id"] for row in rows] == list(range(new_cursor - len(rows) + 1, new_cursor + 1))
+            snapshot = ring.snapshot()
+            if snapshot["reading"] is not None:
+                _assert_intact(snapshot["reading"])
+                assert snapshot["fetched_at"] >= snapshot["reading"]["entry_id"]
+            cursor, seen = new_cursor, seen + len(rows)
+        writer.join(10)
+        assert writer.exitcode == 0
+        assert cursor == ring.count() == n
+        assert seen > 0
+    finally:
+        ring.close()
+
+def test_ring_wraps_and_lagging_reader_gets_latest_capacity(ring):
+    for entry_id in range(1, 21):
+        ring.push(_reading(entry_id))
+    assert ring.count() == 20
+
+    rows, cursor = ring.since(5)  # posiciones 5..11 ya fueron sobrescritas
+    assert cursor == 20
+    assert [row["entry_id"] for row in rows] == list(range(13, 21))
+    rows, cursor = ring.since(18)
+    assert [row["entry_id"] for row in rows] == [19, 20]
+    assert ring.since(20) == ([], 20)
+    assert [row["entry_id"] for row in ring.since(0, limit=3)[0]] == [18, 19, 20]
+
+def test_recent_is_oldest_first(ring):
+    assert ring.recent(3) == []
+    for entry_id in range(1, 6):
+        ring.push(_reading(entry_id))
+    assert [row["entry_id"] for row in ring.recent(3)] == [3, 4, 5]
+    assert [row["entry_id"] for row in ring.recent(100)] == [1, 2, 3, 4, 5]
+
+def test_repeated_entry_id_does_not_take_a_slot(ring):
+    ring.push(_reading(1), fetched_at=10.0)
+    ring.push(_reading(1), fetched_at=25.0)
+    assert ring.count() == 1
+    assert ring.snapshot()["fetched_at"] == 25.0  # el sondeo sí cuenta como correcto
+    ring.push(_reading(2))
+    assert ring.count() == 2
+
+def test_record_failure_truncates_and_push_resets(ring):
+    ring.record_failure("x" * (ERROR_BYTES * 4))
+    ring.record_failure("é" * ERROR_BYTES)  # corte a mitad de un carácter UTF-8
+    snapshot = ring.snapshot()
+    assert snapshot["consecutive_failures"] == 2
+    assert len(snapshot["last_error"].encode('utf-8')) <= ERROR_BYTES
+    assert snapshot["last_error"].startswith("é" * (ERROR_BYTES // 2 - 1))
+    assert snapshot["reading"] is None
+
+    ring.push(_reading(1))
+    snapshot = ring.snapshot()
+    assert snapshot["consecutive_failures"] == 0 and snapshot["last_error"] is None
+
+
+def _hold_writer(ring, acquired, release):
+    if ring.try_acquire_writer():
+        acquired.set()
+        release.wait(30)
+
+@pytest.mark.skipif(fcntl is None, reason="sin flock el primer proceso que lo pide es el escritor")
+def test_writer_lock_fails_over_when_the_holder_exits(ring, fork):
+    acquired, release = fork.Event(), fork.Event()
+    holder = fork.Process(target=_hold_writer, args=(ring, acquired, release))
+    holder.start()
+    try:
+        assert acquired.wait(10)
+        assert ring.snapshot()["writer_pid"] == holder.pid
+        assert not ring.try_acquire_writer()
+    finally:
+        release.set()
+        holder.join(10)
+
+    assert ring.try_acquire_writer()
+    assert ring.try_acquire_writer()  # idempotente en el escritor actual
+    ring.push(_reading(1))
+    assert ring.snapshot()["writer_pid"] == multiprocessing.current_process().pid
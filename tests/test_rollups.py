@@ -0,0 +1,96 @@
+# AirViewer/backend/tests/test_rollups.py
+# Agregados horarios/diarios: estadísticas por bucket, vuelta del ring y reconstrucción
+
+import numpy as np
+import pytest
+
+from rollups import ALL_STATIONS, DAILY_RETENTION, DAY_S, HOUR_S, HOURLY_RETENTION, RollupEngine
+from timeseries_store import TimeSeriesStore
+
+T0 = int(np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / 'store'), initial_capacity=16)
+
+def _append(store, seconds, pm25, station='norte', no2=None):
+    seconds = np.asarray(seconds)
+    store.append_many({'timestamp': T0 + seconds, 'pm25': pm25, 'pm10': np.full(len(seconds), 10.0),
+                       'no2': no2, 'station': station})
+
+def _synced(store):
+    rollups = RollupEngine()
+    rollups.sync(store)
+    return rollups
+
+
+def test_hourly_min_max_mean_per_station(store):
+    _append(store, [0, 600, 1200], [10.0, 30.0, 20.0], 'norte', no2=[1.0, np.nan, 3.0])
+    _append(store, [1800, HOUR_S + 60], [50.0, 7.0], 'sur')
+    rollups = _synced(store)
+
+    [h0, h1] = rollups.last_hours(2, 'norte', now=T0 + HOUR_S)
+    assert (h0["count"], h0["pm25"], h0["pm25_min"], h0["pm25_max"]) == (3, 20.0, 10.0, 30.0)
+    assert (h0["no2"], h0["no2_min"], h0["no2_max"]) == (2.0, 1.0, 3.0)  # NaN no cuenta
+    assert h0["start"] == "2024-01-01T00:00:00Z" and h0["time"] == "00:00"
+    assert h1["count"] == 0 and h1["pm25"] is None
+
+    [all0, all1] = rollups.last_hours(2, ALL_STATIONS, now=T0 + HOUR_S)
+    assert (all0["count"], all0["pm25"], all0["pm25_min"], all0["pm25_max"]) == (4, 27.5, 10.0, 50.0)
+    assert (all1["count"], all1["pm25"]) == (1, 7.0)
+
+    [day] = rollups.last_days(1, 'sur', now=T0)
+    assert (day["count"], day["pm25"], day["pm25_min"], day["pm25_max"]) == (2, 28.5, 7.0, 50.0)
+    assert rollups.last_hours(1, 'desconocida') == []
+
+def test_incremental_sync_matches_a_fresh_engine(store):
+    rollups = RollupEngine()
+    rng = np.random.default_rng(0)
+    for block in range(5):
+        seconds = np.sort(rng.integers(block * DAY_S, (block + 1) * DAY_S, 50))
+        _append(store, seconds, rng.uniform(0, 100, 50), station=['norte', 'sur'][block % 2])
+        rollups.sync(store)
+    fresh = _synced(store)
+    now = T0 + 5 * DAY_S
+    for station in (ALL_STATIONS, 'norte', 'sur'):
+        assert rollups.last_hours(HOURLY_RETENTION, station, now) == fresh.last_hours(HOURLY_RETENTION, station, now)
+        assert rollups.last_days(7, station, now) == fresh.last_days(7, station, now)
+
+def test_hourly_ring_wraps_after_retention(store):
+    rollups = RollupEngine()
+    _append(store, [0], [1.0])
+    rollups.sync(store)
+    # Misma posición del ring (HOURLY_RETENTION horas después): el bucket viejo se recicla
+    _append(store, [HOURLY_RETENTION * HOUR_S], [5.0])
+    rollups.sync(store)
+    now = T0 + HOURLY_RETENTION * HOUR_S
+    series = rollups.last_hours(HOURLY_RETENTION, 'norte', now)
+    assert [p["pm25"] for p in series if p["count"]] == [5.0]
+    assert rollups.last_hours(HOURLY_RETENTION + 1, 'norte', now)[0]["count"] == 0
+
+    # Una lectura tardía de una hora ya fuera de la retención se ignora
+    _append(store, [30], [99.0])
+    rollups.sync(store)
+    assert [p["pm25"] for p in rollups.last_hours(HOURLY_RETENTION, 'norte', now) if p["count"]] == [5.0]
+    assert [p["pm25_max"] for p in rollups.last_days(DAILY_RETENTION, 'norte', now) if p["count"]] == [99.0, 5.0]
+
+def test_daily_ring_keeps_retention_days(store):
+    days = np.arange(DAILY_RETENTION + 10)
+    _append(store, days * DAY_S, days.astype(np.float64))
+    rollups = _synced(store)
+    series = rollups.last_days(DAILY_RETENTION + 10, 'norte', now=T0 + int(days[-1]) * DAY_S)
+    assert [p["pm25"] for p in series if p["count"]] == days[-DAILY_RETENTION:].astype(float).tolist()
+
+def test_delete_last_rebuilds_min_max(store):
+    rollups = RollupEngine()
+    _append(store, [0, 60], [10.0, 20.0])
+    _append(store, [120], [90.0], station='sur')
+    rollups.sync(store)
+    assert rollups.last_hours(1, ALL_STATIONS, now=T0)[0]["pm25_max"] == 90.0
+
+    store.delete_last()
+    rollups.sync(store)
+    [hour] = rollups.last_hours(1, ALL_STATIONS, now=T0)
+    assert (hour["count"], hour["pm25"], hour["pm25_max"]) == (2, 15.0, 20.0)
+    assert rollups.last_hours(1, 'sur', now=T0) == []  # la estación solo existía en la fila borrada
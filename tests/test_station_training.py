@@ -0,0 +1,57 @@
+# AirViewer/backend/tests/test_station_training.py
+# Partición del histórico por estación y entrenamiento en el pool de procesos
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_model
+import station_training
+
+
+def _two_stations_csv(path, hours=40):
+    rng = np.random.default_rng(5)
+    frames = []
+    for offset, name in ((0.0, "Norte Ñuñoa"), (100.0, "sur")):
+        frames.append(pd.DataFrame({
+            "timestamp": pd.date_range("2024-01-01", periods=hours, freq="h"), "station": name,
+            "pm25": offset + rng.uniform(10, 50, hours), "pm10": rng.uniform(20, 80, hours),
+            "Temperatura": rng.uniform(15, 25, hours), "Humedad": rng.uniform(50, 90, hours),
+            "Presion": np.full(hours, ml_model.P_STD), "CO2": rng.uniform(400, 600, hours),
+        }))
+    df = pd.concat(frames)
+    df.to_csv(path, index=False)
+    return str(path), df
+
+
+def test_partition_by_station(tmp_path):
+    path, df = _two_stations_csv(tmp_path / 'stations.csv')
+    paths = station_training.partition_by_station(path, str(tmp_path), chunksize=7)  # bloques con ambas estaciones
+    assert {name: os.path.basename(p) for name, p in paths.items()} == {"Norte Ñuñoa": "norte_nunoa.npy",
+                                                                        "sur": "sur.npy"}
+    for name, p in paths.items():
+        features = np.load(p)
+        expected = ml_model._normalize_chunk(df[df["station"] == name])
+        assert features.dtype == np.float32 and features.shape == (40, 6)
+        np.testing.assert_array_equal(features, expected)
+
+def test_unknown_station_filter_returns_none(tmp_path, capsys):
+    path, _ = _two_stations_csv(tmp_path / 'stations.csv')
+    assert station_training.train_station_models(path, out_dir=str(tmp_path / 'out'), stations=["nrote"]) is None
+    assert "nrote" in capsys.readouterr().out
+
+def test_train_one_station_smoke(tmp_path):
+    pytest.importorskip('tensorflow')
+    path, _ = _two_stations_csv(tmp_path / 'stations.csv')
+    out_dir = str(tmp_path / 'out')
+    report = station_training.train_station_models(path, epochs=1, workers=1, threads_per_worker=1,
+                                                   out_dir=out_dir, stations=["sur"])
+    assert report["errors"] == {}
+    [entry] = report["stations"]
+    assert entry["station"] == "sur" and entry["epochs"] == 1 and len(entry["loss_history"]) == 1
+    assert entry["rows"] == 40 and entry["train_windows"] > 0
+
+    [(name, (model, scaler))] = station_training.load_station_models(out_dir).items()
+    assert name == "sur" and model.version == entry["version"]
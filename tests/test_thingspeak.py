@@ -0,0 +1,177 @@
+# AirViewer/backend/tests/test_thingspeak.py
+# Sondeo de ThingSpeak contra el servidor local de benchmarks/fake_thingspeak.py
+
+import numpy as np
+import pytest
+
+from benchmarks.fake_thingspeak import FakeThingSpeak
+from reading_ring import ReadingRing
+from thingspeak import ThingSpeakBackfill, ThingSpeakPoller, create_session, parse_feed_entry
+from timeseries_store import TimeSeriesStore
+
+
+@pytest.fixture
+def fake():
+    # Intervalo largo: el último entry_id solo cambia cuando el test lo avanza
+    server = FakeThingSpeak(entry_interval_s=3600, history_entries=100)
+    server.start()
+    yield server
+    server.stop()
+
+def _poller(fake, **kwargs):
+    # Sin start(): los tests llaman a poll_once directamente, sin hilo de sondeo
+    poller = ThingSpeakPoller(base_url=fake.base_url, channel_id='1', read_key='test',
+                              session=create_session(), **kwargs)
+    received = []
+    poller.add_listener(received.append)
+    return poller, received
+
+def _advance(fake):
+    fake.history_entries += 1
+    return fake.last_entry_id()
+
+
+@pytest.mark.parametrize('value', [None, '', 'abc', 'nan', 'inf'])
+def test_unusable_field_is_missing_not_zero(value):
+    reading = parse_feed_entry({"entry_id": 1, "field1": '12.5', "field3": value})
+    assert reading["pm25"] == 12.5
+    assert reading["no2"] is None
+    assert reading["co"] is None  # ausente
+
+def test_poll_publishes_reading(fake):
+    poller, received = _poller(fake)
+    assert poller.poll_once()
+    expected = parse_feed_entry(fake.entry(fake.last_entry_id()))
+    assert received == [expected]
+    assert poller.snapshot()["reading"] == expected
+
+    assert poller.poll_once()  # misma entrada: no se notifica dos veces
+    assert len(received) == 1
+
+def test_entry_without_pm_is_skipped(fake):
+    poller, received = _poller(fake)
+    assert poller.poll_once()
+    previous = poller.snapshot()["reading"]
+
+    fake.overrides[_advance(fake)] = {"field1": None}
+    assert not poller.poll_once()
+    snapshot = poller.snapshot()
+    assert snapshot["reading"] == previous
+    assert snapshot["consecutive_failures"] == 0  # el servicio respondió: sin backoff
+    assert snapshot["skipped_entries"] == 1
+    assert len(received) == 1
+
+    assert not poller.poll_once()  # la misma entrada incompleta en el siguiente sondeo
+    assert poller.snapshot()["skipped_entries"] == 1
+    fake.overrides[_advance(fake)] = {"field2": ""}
+    assert not poller.poll_once()
+    assert poller.snapshot()["skipped_entries"] == 2
+    _advance(fake)
+    assert poller.poll_once() and len(received) == 2
+
+def test_missing_optional_field_is_published_as_null(fake):
+    poller, received = _poller(fake)
+    fake.overrides[fake.last_entry_id()] = {"field3": None, "field4": "n/a"}
+    assert poller.poll_once()
+    assert received[0]["no2"] is None and received[0]["co"] is None
+    assert received[0]["pm25"] > 0
+
+def test_ring_keeps_missing_fields_as_null(fake):
+    ring = ReadingRing(capacity=8)
+    try:
+        poller, received = _poller(fake, ring=ring)
+        fake.overrides[fake.last_entry_id()] = {"field3": None}
+        assert poller.poll_once()
+        assert poller.follow_ring() == 1
+        assert received[0]["no2"] is None
+        assert poller.snapshot()["reading"]["no2"] is None
+    finally:
+        ring.close()
+
+def test_upstream_failure_backs_off(fake):
+    poller, _ = _poller(fake)
+    poller.url = fake.base_url + '/missing'
+    assert not poller.poll_once()
+    assert poller.snapshot()["consecutive_failures"] == 1
+    assert poller.next_delay() > 0
+
+
+# =======================================================
+# BACKFILL (feeds.json)
+# =======================================================
+
+@pytest.fixture
+def channel():
+    """Canal con 10000 entradas históricas, una por segundo, terminando en un segundo exacto."""
+    server = FakeThingSpeak(entry_interval_s=1, history_entries=10000)
+    server.started_at = float(int(server.started_at))
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / 'store'))
+
+def _backfill(channel, store, tmp_path, **kwargs):
+    return ThingSpeakBackfill(store, base_url=channel.base_url, channel_id='1', read_key='test',
+                              checkpoint_path=str(tmp_path / 'checkpoint.json'), **kwargs)
+
+def _stored_entry_ids(store):
+    return store.read_columns(np.arange(len(store)), ['entry_id'])['entry_id']
+
+
+def test_backfill_splits_truncated_slices(channel, store, tmp_path):
+    backfill = _backfill(channel, store, tmp_path)
+    requested = []
+    fetch = backfill.fetch_slice
+    backfill.fetch_slice = lambda lo, hi: requested.append((lo, hi)) or fetch(lo, hi)
+
+    result = backfill.run(end=int(channel.started_at))
+    assert result["written"] == 10000
+    assert len(requested) >= 3  # el tramo completo llegó al tope de 8000 y se partió en dos
+    assert sorted(_stored_entry_ids(store)) == list(range(1, 10001))
+
+def test_backfill_skips_entries_already_written_live(channel, store, tmp_path):
+    for entry_id in (9998, 9999, 10000):  # el sondeo en vivo ya guardó las últimas entradas
+        entry = parse_feed_entry(channel.entry(entry_id))
+        store.append({"timestamp": entry["created_at"], "pm25": entry["pm25"], "pm10": entry["pm10"],
+                      "entry_id": entry_id})
+
+    result = _backfill(channel, store, tmp_path).run(end=int(channel.started_at))
+    assert result["written"] == 9997
+    assert result["skipped"] == 3
+    assert len(store) == 10000
+
+    again = _backfill(channel, store, tmp_path).run(start=channel.entry(1)["created_at"],
+                                                    end=int(channel.started_at), resume=False)
+    assert again["written"] == 0
+    assert len(np.unique(_stored_entry_ids(store))) == len(store) == 10000
+
+def test_backfill_resumes_from_checkpoint(channel, store, tmp_path):
+    backfill = _backfill(channel, store, tmp_path, slice_s=1000, concurrency=1)
+    fetch, calls = backfill.fetch_slice, []
+
+    def interrupted(lo, hi):
+        calls.append(lo)
+        if len(calls) == 5:
+            raise ConnectionError("corte de red")
+        return fetch(lo, hi)
+
+    backfill.fetch_slice = interrupted
+    with pytest.raises(ConnectionError):
+        backfill.run(end=int(channel.started_at))
+    checkpoint = backfill.load_checkpoint()
+    written_before = len(store)
+    assert 0 < written_before < 10000
+    assert checkpoint["rows"] == written_before
+
+    resumed = _backfill(channel, store, tmp_path, slice_s=1000, concurrency=1)
+    requested = []
+    fetch_resumed = resumed.fetch_slice
+    resumed.fetch_slice = lambda lo, hi: requested.append(lo) or fetch_resumed(lo, hi)
+    result = resumed.run(end=int(channel.started_at))
+
+    assert min(requested) > checkpoint["completed_until"]  # no se vuelve a pedir lo ya escrito
+    assert result["written"] == 10000 - written_before
+    assert sorted(_stored_entry_ids(store)) == list(range(1, 10001))
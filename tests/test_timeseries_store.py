@@ -0,0 +1,162 @@
+# AirViewer/backend/tests/test_timeseries_store.py
+# Almacén columnar: rangos, índice fuera de orden, paginación, crecimiento y deduplicación
+
+import os
+
+import numpy as np
+import pytest
+
+from timeseries_store import TimeSeriesStore, DEFAULT_STATION
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / 'store'), initial_capacity=16)
+
+def _block(entry_ids, hour0=0):
+    n = len(entry_ids)
+    return {
+        'timestamp': np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64) + 3600 * (hour0 + np.arange(n)),
+        'pm25': np.full(n, 10.0), 'pm10': np.full(n, 20.0), 'aqi': np.full(n, 25.0),
+        'entry_id': np.asarray(entry_ids), 'station': DEFAULT_STATION,
+    }
+
+
+def test_duplicate_entry_ids_are_written_once(store):
+    assert len(store.append_many(_block([1, 2, 3]))) == 3
+    assert len(store.append_many(_block([3, 4, 4, 5]))) == 2  # 3 ya existe; 4 repetido en el bloque
+    assert len(store) == 5
+    assert sorted(store.read_columns(np.arange(5), ['entry_id'])['entry_id']) == [1, 2, 3, 4, 5]
+
+def test_old_entries_are_checked_against_the_store(store):
+    store.append_many(_block([100, 101]))          # sondeo en vivo
+    written = store.append_many(_block([98, 99, 100, 101], hour0=-2))  # backfill posterior
+    assert len(written) == 2
+    assert len(store) == 4
+
+def test_rows_without_entry_id_are_never_deduplicated(store):
+    store.append({"timestamp": "2024-01-01T00:00:00Z", "pm25": 1.0, "pm10": 2.0})
+    store.append({"timestamp": "2024-01-01T00:00:00Z", "pm25": 1.0, "pm10": 2.0})
+    assert len(store) == 2
+
+def test_append_returns_none_for_known_entry(store):
+    record = {"timestamp": "2024-01-01T00:00:00Z", "pm25": 1.0, "pm10": 2.0, "no2": None, "entry_id": 7}
+    assert store.append(record) == 1
+    assert store.append(record) is None
+    [row] = store.last(1)
+    assert row["no2"] is None
+
+def test_deleted_entry_can_be_written_again(store):
+    store.append_many(_block([1, 2]))
+    store.delete_last()
+    assert len(store.append_many(_block([2]))) == 1
+
+def test_store_without_entry_id_column_is_upgraded(tmp_path):
+    path = str(tmp_path / 'old')
+    TimeSeriesStore(path, initial_capacity=16).append({"timestamp": "2024-01-01T00:00:00Z", "pm25": 1.0, "pm10": 2.0})
+    os.remove(os.path.join(path, 'entry_id.i8'))
+
+    store = TimeSeriesStore(path)
+    assert store.read_columns(np.arange(1), ['entry_id'])['entry_id'].tolist() == [0]
+    assert len(store.append_many(_block([5]))) == 1
+    assert len(store) == 2
+
+
+T0 = int(np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64))
+
+def _rows(store, hours, pm25=None):
+    """Una lectura por elemento de `hours` (horas desde T0, en el orden dado)."""
+    hours = np.asarray(hours)
+    pm25 = hours.astype(np.float64) if pm25 is None else pm25
+    return store.append_many({'timestamp': T0 + 3600 * hours, 'pm25': pm25, 'pm10': np.full(len(hours), 1.0)})
+
+def _iso(hour):
+    return str(np.datetime64(T0 + 3600 * hour, 's'))
+
+def _range_ts(store, start=None, end=None, chunk_rows=3):
+    chunks = list(store.iter_range(start, end, chunk_rows=chunk_rows, columns=['timestamp']))
+    assert all(len(c['timestamp']) <= chunk_rows for c in chunks)
+    return ((np.concatenate([c['timestamp'] for c in chunks]) - T0) // 3600).tolist() if chunks else []
+
+
+def test_range_lookup_is_inclusive(store):
+    _rows(store, range(10))
+    assert _range_ts(store) == list(range(10))
+    assert _range_ts(store, _iso(2), _iso(5)) == [2, 3, 4, 5]
+    assert _range_ts(store, start=_iso(8)) == [8, 9]
+    assert _range_ts(store, end=_iso(-1)) == []
+    assert store.range_positions(_iso(2), _iso(2)) == (2, 3)
+    assert store.latest_timestamp() == T0 + 9 * 3600
+
+def test_out_of_order_appends_keep_time_order(store):
+    _rows(store, [0, 2, 4, 6])
+    _rows(store, [5, 1])               # fuera de orden: se fusiona en el índice
+    _rows(store, [7, 3, 3])
+    assert _range_ts(store) == [0, 1, 2, 3, 3, 4, 5, 6, 7]
+    assert _range_ts(store, _iso(1), _iso(3)) == [1, 2, 3, 3]
+    assert [r['pm25'] for r in store.query(_iso(5), _iso(6))] == [5.0, 6.0]
+    assert store.latest_timestamp() == T0 + 7 * 3600
+    # Otra instancia (otro worker) lee el mismo índice desde disco
+    assert _range_ts(TimeSeriesStore(store.path)) == [0, 1, 2, 3, 3, 4, 5, 6, 7]
+
+def test_reader_with_old_meta_never_sees_the_new_index(store):
+    _rows(store, [0, 4, 2])
+    reader = TimeSeriesStore(store.path)
+    old_meta = reader._read_meta()
+    _rows(store, [3, 1])                # el escritor publica un índice nuevo mientras tanto
+    positions = reader._physical_positions(old_meta, 0, old_meta['count'])
+    ts = reader.read_columns(positions, ['timestamp'], old_meta)['timestamp']
+    assert ((ts - T0) // 3600).tolist() == [0, 2, 4]
+    assert _range_ts(reader) == [0, 1, 2, 3, 4]
+
+def test_old_index_versions_are_pruned(store):
+    for hour in (5, 4, 3, 2, 1):
+        _rows(store, [hour])
+    index_files = sorted(name for name in os.listdir(store.path) if name.startswith('index_'))
+    assert len(index_files) == 4  # versión actual y la previa, timestamps y posiciones
+
+def test_delete_last_in_order_and_out_of_order(store):
+    _rows(store, [0, 1, 2])
+    assert store.delete_last()['pm25'] == 2.0
+    assert _range_ts(store) == [0, 1] and len(store) == 2 and store.deletions == 1
+
+    _rows(store, [5, 3])
+    deleted = store.delete_last()       # el último añadido (hora 3), no el más reciente
+    assert deleted['timestamp'] == _iso(3) + 'Z'
+    assert _range_ts(store) == [0, 1, 5]
+    assert _rows(store, [4]).tolist() == [6]  # el id 5 borrado no se reutiliza
+    assert _range_ts(store) == [0, 1, 4, 5]
+
+    while store.delete_last() is not None:
+        pass
+    assert len(store) == 0 and store.latest_timestamp() is None and _range_ts(store) == []
+    _rows(store, [9, 8])
+    assert _range_ts(store) == [8, 9]
+
+def test_grow_past_initial_capacity(store):
+    _rows(store, range(10))
+    _rows(store, range(10, 50))         # 16 -> 64
+    assert store._read_meta()['capacity'] == 64
+    assert _range_ts(store, chunk_rows=7) == list(range(50))
+    reopened = TimeSeriesStore(store.path)
+    assert len(reopened) == 50
+    assert reopened.last(1)[0]['pm25'] == 49.0
+
+def _walk_pages(store, limit, **kwargs):
+    pages, after = [], None
+    while True:
+        chunk, has_more = store.page(after=after, limit=limit, **kwargs)
+        pages.append(list(zip(((chunk['timestamp'] - T0) // 3600).tolist(), chunk['id'].tolist())))
+        if not has_more:
+            return pages
+        after = (int(chunk['timestamp'][-1]), int(chunk['id'][-1]))
+
+def test_page_cursor_walks_timestamp_ties_in_id_order(store):
+    _rows(store, [0, 1, 1, 1, 2])
+    _rows(store, [1, 0, 3])             # más empates, con ids mayores y fuera de orden
+    pages = _walk_pages(store, limit=2)
+    rows = [row for page in pages for row in page]
+    assert rows == [(0, 1), (0, 7), (1, 2), (1, 3), (1, 4), (1, 6), (2, 5), (3, 8)]
+    assert [len(page) for page in pages] == [2, 2, 2, 2]
+    assert _walk_pages(store, limit=3, start=_iso(1), end=_iso(1)) == [[(1, 2), (1, 3), (1, 4)], [(1, 6)]]
+    assert store.page(after=(T0 + 3 * 3600, 8), limit=5)[0]['id'].tolist() == []
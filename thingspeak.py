@@ -0,0 +1,473 @@
+# AirViewer/backend/thingspeak.py
+# Ingesta de ThingSpeak: sondeo en segundo plano con sesión keep-alive
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# =======================================================
+# CONFIGURACIÓN DE THINGSPEAK
+# =======================================================
+THINGSPEAK_BASE_URL = os.environ.get('THINGSPEAK_BASE_URL', 'https://api.thingspeak.com')
+THINGSPEAK_CHANNEL_ID = '2989972'
+THINGSPEAK_READ_KEY = 'DW1VFS3QXOJRWSIK'
+
+# Mapeo de Campos:
+FIELD_MAP = {
+    'PM2.5': 'field1',
+    'PM10': 'field2',
+    'NO2': 'field3',
+    'CO': 'field4',
+    'TEMP': 'field5'
+}
+
+POLL_INTERVAL_S = 15      # ThingSpeak no publica más de una entrada cada 15 s
+REQUEST_TIMEOUT_S = 5
+MAX_BACKOFF_S = 300       # Tope del backoff exponencial ante fallos
+STALE_AFTER_S = 120       # Una lectura más antigua que esto se considera obsoleta
+FOLLOW_INTERVAL_S = 0.5   # Con ReadingRing: cada cuánto un worker mira si hay lecturas nuevas
+
+# Backfill del histórico (feeds.json)
+FEEDS_MAX_RESULTS = 8000  # Tope de ThingSpeak por petición: un tramo lleno se parte en dos
+BACKFILL_SLICE_S = 24 * 3600
+BACKFILL_CONCURRENCY = 4
+MAX_BACKFILL_CONCURRENCY = 16
+BACKFILL_RETRIES = 3
+BACKFILL_CHECKPOINT_PATH = os.path.join('data', 'thingspeak_backfill.json')
+
+
+def create_session(pool_size=4):
+    """Sesión HTTP con pool de conexiones keep-alive reutilizable entre sondeos."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Sin estos campos una entrada no es una lectura: se omite (no se publica ni se agrega)
+REQUIRED_READING_FIELDS = ('pm25', 'pm10')
+
+
+def _to_float(value):
+    """Valor de un field de ThingSpeak; None si falta, es null o no es un número finito."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+def parse_feed_entry(entry, field_map=FIELD_MAP):
+    """
+    Convierte una entrada del feed de ThingSpeak en los campos de FIELD_MAP.
+    Un field ausente o inválido queda en None (dato faltante, nunca 0.0).
+    """
+    return {
+        "entry_id": entry.get('entry_id'),
+        "created_at": entry.get('created_at'),
+        "pm25": _to_float(entry.get(field_map['PM2.5'])),
+        "pm10": _to_float(entry.get(field_map['PM10'])),
+        "no2": _to_float(entry.get(field_map['NO2'])),
+        "co": _to_float(entry.get(field_map['CO'])),
+        "temp": _to_float(entry.get(field_map['TEMP'])),
+    }
+
+
+# =======================================================
+# SONDEO EN SEGUNDO PLANO
+# =======================================================
+
+class IncompleteEntry(ValueError):
+    """La última entrada del canal no trae los campos de REQUIRED_READING_FIELDS."""
+
+    def __init__(self, message, entry_id=None):
+        super().__init__(message)
+        self.entry_id = entry_id
+
+
+class ThingSpeakPoller:
+    """
+    Consulta feeds/last.json periódicamente en un hilo daemon y publica la última
+    lectura como una instantánea en memoria. Los endpoints leen solo la instantánea,
+    nunca la red. Ante fallos aplica backoff exponencial con jitter.
+
+    Con un `ring` (reading_ring.ReadingRing compartido por los workers) solo el worker
+    que tiene el lock de escritor consulta ThingSpeak y escribe en el ring; todos (él
+    incluido) leen de ahí la instantánea y disparan los listeners por cada entrada nueva.
+    """
+
+    def __init__(self, base_url=THINGSPEAK_BASE_URL, channel_id=THINGSPEAK_CHANNEL_ID,
+                 read_key=THINGSPEAK_READ_KEY, interval=POLL_INTERVAL_S, timeout=REQUEST_TIMEOUT_S,
+                 max_backoff=MAX_BACKOFF_S, stale_after=STALE_AFTER_S, session=None, ring=None):
+        self.url = f"{base_url}/channels/{channel_id}/feeds/last.json"
+        self.params = {'api_key': read_key}
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.stale_after = stale_after
+        self.session = session
+        self.ring = ring
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+
+        self._reading = None
+        self._fetched_at = None
+        self._failures = 0
+        self._skipped = 0
+        self._last_skipped_id = None  # Se sigue viendo en cada sondeo hasta que llega otra entrada
+        self._last_error = None
+        self._ring_cursor = 0
+        self._next_poll_at = 0.0
+
+    def add_listener(self, callback):
+        """Registra callback(reading) que se invoca cuando llega una entrada nueva."""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Arranca el hilo de sondeo (idempotente y seguro tras un fork de gunicorn)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # Tras un fork no se reutilizan las conexiones abiertas por el proceso padre
+            if self.session is None or (self._pid is not None and self._pid != os.getpid()):
+                self.session = create_session()
+            if self.ring is not None and self._pid != os.getpid():
+                # Un worker nuevo empieza por la última lectura (la notifica, como un primer sondeo)
+                self._ring_cursor = max(self.ring.count() - 1, 0)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='thingspeak-poller', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+
+    def poll_once(self):
+        """Hace una consulta y actualiza la instantánea. Retorna True si tuvo éxito."""
+        try:
+            with metrics.upstream_call('thingspeak', 'feeds_last'):
+                response = self.session.get(self.url, params=self.params, timeout=self.timeout)
+                response.raise_for_status()
+                payload = response.json()
+            reading = parse_feed_entry(payload)
+            missing = [name for name in REQUIRED_READING_FIELDS if reading[name] is None]
+            if missing:
+                raise IncompleteEntry(f"Entrada {reading['entry_id']} sin {', '.join(missing)}: se omite",
+                                      reading['entry_id'])
+        except IncompleteEntry as e:
+            # El servicio respondió: no es un fallo (sin backoff), pero la instantánea no cambia
+            with self._lock:
+                if e.entry_id is None or e.entry_id != self._last_skipped_id:
+                    self._skipped += 1
+                    self._last_skipped_id = e.entry_id
+                self._last_error = str(e)
+            return False
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                self._last_error = str(e)
+            if self.ring is not None:
+                self.ring.record_failure(e)
+            print(f"ADVERTENCIA: Fallo al consultar ThingSpeak ({e}). Reintento con backoff.")
+            return False
+
+        with self._lock:
+            is_new = self._reading is None or reading['entry_id'] != self._reading.get('entry_id')
+            self._reading = reading
+            self._fetched_at = time.time()
+            self._failures = 0
+            self._last_error = None
+
+        if self.ring is not None:
+            # Los listeners se disparan al leer el ring (follow_ring), igual en todos los workers
+            self.ring.push(reading, self._fetched_at)
+        elif is_new:
+            self._notify(reading)
+        return True
+
+    def _notify(self, reading):
+        for callback in self._listeners:
+            try:
+                callback(reading)
+            except Exception as e:
+                print(f"ADVERTENCIA: Listener de ThingSpeak falló: {e}")
+
+    def follow_ring(self):
+        """Notifica las entradas escritas en el ring desde la última vista (sin IPC: memoria compartida)."""
+        readings, self._ring_cursor = self.ring.since(self._ring_cursor)
+        for reading in readings:
+            self._notify(reading)
+        return len(readings)
+
+    def next_delay(self):
+        """Intervalo normal o backoff exponencial (con jitter) según los fallos acumulados."""
+        if self._failures == 0:
+            return self.interval
+        backoff = min(self.interval * (2 ** self._failures), self.max_backoff)
+        return backoff * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.ring is None:
+                self.poll_once()
+                self._stop.wait(self.next_delay())
+                continue
+            # Si el worker escritor muere, otro toma el lock en su siguiente vuelta
+            if self.ring.try_acquire_writer() and time.monotonic() >= self._next_poll_at:
+                self.poll_once()
+                self._next_poll_at = time.monotonic() + self.next_delay()
+            self.follow_ring()
+            self._stop.wait(FOLLOW_INTERVAL_S)
+
+    def snapshot(self):
+        """Última lectura publicada junto con su antigüedad y el estado del sondeo."""
+        if self.ring is not None:
+            snapshot = self.ring.snapshot()
+            fetched_at = snapshot["fetched_at"]
+            age = None if fetched_at is None else time.time() - fetched_at
+            return dict(snapshot, age_s=age, stale=age is None or age > self.stale_after)
+        with self._lock:
+            age = None if self._fetched_at is None else time.time() - self._fetched_at
+            return {
+                "reading": None if self._reading is None else dict(self._reading),
+                "fetched_at": self._fetched_at,
+                "age_s": age,
+                "stale": age is None or age > self.stale_after,
+                "consecutive_failures": self._failures,
+                "skipped_entries": self._skipped,
+                "last_error": self._last_error,
+            }
+
+
+# =======================================================
+# BACKFILL DEL HISTÓRICO (feeds.json)
+# =======================================================
+
+def _format_utc(epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+def _parse_utc(value):
+    """Epoch o fecha ISO (sin zona = UTC, como responde ThingSpeak) -> segundos epoch."""
+    if isinstance(value, int):
+        return value
+    stamp = pd.Timestamp(value)
+    return int((stamp if stamp.tzinfo else stamp.tz_localize('UTC')).timestamp())
+
+
+class ThingSpeakBackfill:
+    """
+    Descarga el histórico del canal desde feeds.json en tramos de tiempo, varios tramos
+    en paralelo sobre una sesión keep-alive. Los tramos se escriben en el almacén en orden
+    cronológico y el checkpoint (último entry_id y fin del último tramo escrito) se guarda
+    tras cada uno: una ejecución interrumpida retoma donde quedó y las entradas con
+    entry_id ya escrito se descartan (deduplicación).
+    """
+
+    def __init__(self, store, base_url=THINGSPEAK_BASE_URL, channel_id=THINGSPEAK_CHANNEL_ID,
+                 read_key=THINGSPEAK_READ_KEY, checkpoint_path=BACKFILL_CHECKPOINT_PATH,
+                 slice_s=BACKFILL_SLICE_S, concurrency=BACKFILL_CONCURRENCY, timeout=REQUEST_TIMEOUT_S,
+                 field_map=FIELD_MAP, session=None, station=None):
+        self.store = store
+        self.url = f"{base_url}/channels/{channel_id}/feeds.json"
+        self.channel_id = str(channel_id)
+        self.params = {'api_key': read_key}
+        self.checkpoint_path = checkpoint_path
+        self.slice_s = slice_s
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.field_map = field_map
+        self.session = session or create_session(pool_size=concurrency)
+        self.station = station
+
+        self._lock = threading.Lock()
+        self._progress = {"state": "idle"}
+
+    # --- Checkpoint ---
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return checkpoint if checkpoint.get('channel_id') == self.channel_id else None
+
+    def _save_checkpoint(self, checkpoint):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp, self.checkpoint_path)
+
+    # --- Red ---
+
+    def _get(self, params):
+        """GET con reintentos y backoff (también ante 429 de ThingSpeak)."""
+        for attempt in range(BACKFILL_RETRIES + 1):
+            try:
+                with metrics.upstream_call('thingspeak', 'feeds'):
+                    response = self.session.get(self.url, params={**self.params, **params}, timeout=self.timeout)
+                    response.raise_for_status()
+                    return response.json()
+            except Exception:
+                if attempt == BACKFILL_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, MAX_BACKOFF_S) * random.uniform(0.5, 1.0))
+
+    def channel_info(self):
+        """Metadatos del canal (created_at, last_entry_id) sin descargar entradas."""
+        return self._get({'results': 0}).get('channel', {})
+
+    def fetch_slice(self, start, end):
+        """
+        Entradas con created_at en [start, end] (epoch, inclusivo). Si el tramo llega al
+        tope de FEEDS_MAX_RESULTS hubo truncado: se parte en dos y se piden las mitades.
+        """
+        feeds = self._get({'start': _format_utc(start), 'end': _format_utc(end),
+                           'results': FEEDS_MAX_RESULTS}).get('feeds') or []
+        if len(feeds) >= FEEDS_MAX_RESULTS and end > start:
+            middle = (start + end) // 2
+            return self.fetch_slice(start, middle) + self.fetch_slice(middle + 1, end)
+        return feeds
+
+    # --- Escritura ---
+
+    def _to_columns(self, feeds, after_entry_id):
+        """
+        Entradas del feed -> (columnas del almacén, errores, mayor entry_id), vectorizado.
+        Descarta las entradas con entry_id ya escrito.
+        """
+        import bulk_ingest
+
+        df = pd.DataFrame.from_records(feeds)
+        if df.empty:
+            return None, [], None
+        df['entry_id'] = pd.to_numeric(df['entry_id'], errors='coerce')
+        df = df[df['entry_id'] > after_entry_id].drop_duplicates('entry_id').sort_values('entry_id')
+        if df.empty:
+            return None, [], None
+        frame = pd.DataFrame({
+            'timestamp': df['created_at'],
+            'pm25': df.get(self.field_map['PM2.5']),
+            'pm10': df.get(self.field_map['PM10']),
+            'no2': df.get(self.field_map['NO2']),
+            'co': df.get(self.field_map['CO']),
+            'station': self.station,
+        })
+        entry_ids = df['entry_id'].to_numpy(dtype='int64')
+        columns, errors = bulk_ingest.validate_chunk(frame, entry_ids)
+        if columns is not None:
+            # El almacén deduplica por entry_id (lecturas ya escritas por el sondeo en vivo)
+            columns['entry_id'] = entry_ids[~np.isin(entry_ids, [e["line"] for e in errors])]
+        errors = [{"entry_id": e["line"], "error": e["error"]} for e in errors]
+        return columns, errors, int(df['entry_id'].max())
+
+    def _slices(self, start, end):
+        for lo in range(start, end + 1, self.slice_s):
+            yield lo, min(lo + self.slice_s - 1, end)
+
+    def run(self, start=None, end=None, resume=True):
+        """
+        Ejecuta el backfill de [start, end] (epoch o ISO; por defecto desde la creación del
+        canal hasta ahora). Con resume=True continúa desde el checkpoint del canal; con
+        resume=False recorre todo el rango pero mantiene la deduplicación por entry_id.
+        Retorna el resumen (filas escritas, duplicadas, inválidas, tramos).
+        """
+        checkpoint = self.load_checkpoint()
+        if start is None:
+            start = checkpoint['start'] if checkpoint else self.channel_info()['created_at']
+        start = _parse_utc(start)
+        end = int(time.time()) if end is None else _parse_utc(end)
+
+        if checkpoint is None or not resume:
+            checkpoint = {"channel_id": self.channel_id, "start": start, "completed_until": start - 1,
+                          "last_entry_id": checkpoint['last_entry_id'] if checkpoint else 0,
+                          "rows": checkpoint['rows'] if checkpoint else 0}
+        checkpoint.update(end=end)
+        slices = list(self._slices(max(start, checkpoint['completed_until'] + 1), end))
+        summary = {"written": 0, "skipped": 0, "invalid": 0, "slices": len(slices), "errors": []}
+        self._set_progress(state="running", done=0, **summary)
+
+        # Ventana deslizante de tramos en vuelo: se descargan en paralelo y se escriben en orden
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='thingspeak-backfill') as pool:
+            pending = deque()
+            queue = iter(slices)
+            for item in queue:
+                pending.append((item, pool.submit(self.fetch_slice, *item)))
+                if len(pending) >= self.concurrency * 2:
+                    break
+            done = 0
+            try:
+                while pending:
+                    (lo, hi), future = pending.popleft()
+                    feeds = future.result()
+                    next_item = next(queue, None)
+                    if next_item is not None:
+                        pending.append((next_item, pool.submit(self.fetch_slice, *next_item)))
+
+                    columns, errors, last_id = self._to_columns(feeds, checkpoint['last_entry_id'])
+                    written = len(self.store.append_many(columns)) if columns else 0
+                    summary["written"] += written
+                    summary["invalid"] += len(errors)
+                    summary["skipped"] += len(feeds) - written - len(errors)
+                    summary["errors"].extend(errors[:max(0, 100 - len(summary["errors"]))])
+
+                    checkpoint.update(completed_until=hi, rows=checkpoint['rows'] + written, updated_at=time.time())
+                    if last_id is not None:
+                        checkpoint['last_entry_id'] = max(checkpoint['last_entry_id'], last_id)
+                    self._save_checkpoint(checkpoint)
+                    done += 1
+                    self._set_progress(done=done, completed_until=_format_utc(hi), **summary)
+            except Exception as e:
+                for _, future in pending:
+                    future.cancel()
+                self._set_progress(state="failed", error=str(e))
+                raise
+
+        self._set_progress(state="finished")
+        return dict(summary, last_entry_id=checkpoint['last_entry_id'], completed_until=_format_utc(end))
+
+    def _set_progress(self, **fields):
+        with self._lock:
+            self._progress.update(fields)
+
+    def status(self):
+        with self._lock:
+            return dict(self._progress)
+
+
+if __name__ == '__main__':
+    import argparse
+    from timeseries_store import TimeSeriesStore
+
+    parser = argparse.ArgumentParser(description="Backfill del histórico de ThingSpeak al almacén.")
+    parser.add_argument('--store', default=os.environ.get('AIRVIEWER_STORE_DIR', 'data/store'))
+    parser.add_argument('--start', default=None, help="Fecha ISO (UTC); por defecto la creación del canal.")
+    parser.add_argument('--end', default=None, help="Fecha ISO (UTC); por defecto ahora.")
+    parser.add_argument('--slice-hours', type=int, default=BACKFILL_SLICE_S // 3600)
+    parser.add_argument('--concurrency', type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument('--checkpoint', default=BACKFILL_CHECKPOINT_PATH)
+    parser.add_argument('--no-resume', action='store_true', help="Ignora el checkpoint existente.")
+    args = parser.parse_args()
+
+    backfill = ThingSpeakBackfill(TimeSeriesStore(args.store), checkpoint_path=args.checkpoint,
+                                  slice_s=args.slice_hours * 3600, concurrency=args.concurrency)
+    result = backfill.run(args.start, args.end, resume=not args.no_resume)
+    print(f"Backfill terminado: {result['written']} filas nuevas, {result['skipped']} duplicadas, "
+          f"{result['invalid']} inválidas en {result['slices']} tramos.")
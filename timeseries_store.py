@@ -0,0 +1,480 @@
+# AirViewer/backend/timeseries_store.py
+# Almacén columnar persistente de lecturas (archivos NumPy memory-mapped)
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl  # Bloqueo entre procesos (workers de gunicorn); no existe en Windows
+except ImportError:
+    fcntl = None
+
+# =======================================================
+# ESQUEMA DEL ALMACÉN
+# =======================================================
+
+# Una columna = un archivo binario append-only del tipo indicado
+COLUMNS = {
+    'id': np.int64,
+    'timestamp': np.int64,   # Segundos desde epoch (UTC)
+    'aqi': np.float32,
+    'pm25': np.float32,
+    'pm10': np.float32,
+    'no2': np.float32,
+    'co': np.float32,
+    'station': np.int16,     # Código de estación (ver meta['stations'])
+    'entry_id': np.int64,    # entry_id de ThingSpeak (0 = lectura de otra fuente)
+}
+VALUE_COLUMNS = ['aqi', 'pm25', 'pm10', 'no2', 'co']
+RECORD_FIELDS = ['id', 'timestamp'] + VALUE_COLUMNS + ['station']  # Claves de cada registro JSON
+
+DEFAULT_STATION = 'principal'
+INITIAL_CAPACITY = 1 << 16
+META_FILE = 'meta.json'
+LOCK_FILE = '.lock'
+INDEX_TS_FILE = 'index_ts.i8'    # Timestamps ordenados (solo si hubo appends fuera de orden)
+INDEX_POS_FILE = 'index_pos.i8'  # Posición física de cada timestamp ordenado
+# Cada reescritura del índice va a archivos nuevos (index_ts.<n>.i8) y meta['index_version']
+# los publica; se conserva la versión anterior para lectores que aún no la mapearon
+
+
+def parse_timestamps(values):
+    """Convierte timestamps ISO (con o sin 'Z') o datetimes a segundos epoch int64."""
+    arr = np.asarray(values)
+    if np.issubdtype(arr.dtype, np.integer):
+        return arr.astype(np.int64)
+    if arr.dtype.kind in ('U', 'S', 'O'):
+        arr = np.char.rstrip(arr.astype(str), 'Z')
+    return arr.astype('datetime64[s]').astype(np.int64)
+
+def format_timestamps(seconds):
+    """Segundos epoch -> strings ISO con sufijo 'Z' (formato que usa el Front-end)."""
+    iso = np.datetime_as_string(np.asarray(seconds, dtype=np.int64).astype('datetime64[s]'))
+    return np.char.add(iso, 'Z')
+
+
+def _select_rows(values, keep, n):
+    """Filtra una columna de append_many; los escalares (p.ej. una sola estación) se mantienen."""
+    if values is None or np.ndim(values) == 0:
+        return values
+    arr = np.asarray(values, dtype=object) if isinstance(values, list) else np.asarray(values)
+    return arr[keep] if len(arr) == n else arr
+
+
+class TimeSeriesStore:
+    """
+    Almacén append-only de lecturas (timestamp, aqi, pm25, pm10, no2, co, station).
+    Cada columna es un archivo memory-mapped, así que las consultas no cargan el
+    histórico completo en RAM y el sistema operativo comparte las páginas entre
+    workers. Las búsquedas por rango de tiempo son O(log n) sobre el índice ordenado.
+    """
+
+    def __init__(self, path, initial_capacity=INITIAL_CAPACITY):
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self._thread_lock = threading.RLock()
+        self._maps = {}
+        self._mapped_capacity = 0
+        self._index_maps = None
+        self._index_generation = None
+        self._lock_depth = 0
+
+        os.makedirs(path, exist_ok=True)
+        with self._write_lock():
+            if not os.path.exists(self._file(META_FILE)):
+                self._create(initial_capacity)
+            else:
+                self._add_missing_columns(self._read_meta())
+
+    # ---------- Archivos y metadatos ----------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _column_file(self, name):
+        return self._file(f"{name}.{np.dtype(COLUMNS[name]).str[1:]}")
+
+    def _create(self, capacity):
+        for name, dtype in COLUMNS.items():
+            with open(self._column_file(name), 'wb') as f:
+                f.truncate(capacity * np.dtype(dtype).itemsize)
+        self._write_meta({
+            "version": 1, "count": 0, "capacity": capacity, "next_id": 1,
+            "sorted": True, "stations": [DEFAULT_STATION], "generation": 0,
+        })
+
+    def _add_missing_columns(self, meta):
+        """Almacenes creados antes de que existiera una columna: se añade vacía (ceros)."""
+        for name, dtype in COLUMNS.items():
+            if not os.path.exists(self._column_file(name)):
+                with open(self._column_file(name), 'wb') as f:
+                    f.truncate(meta['capacity'] * np.dtype(dtype).itemsize)
+
+    def _write_meta(self, meta):
+        tmp = self._file(META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file(META_FILE))  # Reemplazo atómico: los lectores ven count viejo o nuevo
+
+    def _read_meta(self):
+        """Lee meta.json en cada consulta: otro worker puede haber escrito desde la última."""
+        with open(self._file(META_FILE)) as f:
+            return json.load(f)
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusión entre hilos y entre procesos (flock). Reentrante dentro del mismo hilo."""
+        with self._thread_lock:
+            if fcntl is None or self._lock_depth > 0:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self._file(LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _columns(self, meta):
+        """Memmaps de todas las columnas; se re-mapean cuando el almacén creció."""
+        if self._mapped_capacity != meta['capacity']:
+            self._maps = {
+                name: np.memmap(self._column_file(name), dtype=dtype, mode='r+', shape=(meta['capacity'],))
+                for name, dtype in COLUMNS.items()
+            }
+            self._mapped_capacity = meta['capacity']
+        return self._maps
+
+    def _grow(self, meta, needed):
+        capacity = meta['capacity']
+        while capacity < needed:
+            capacity *= 2
+        for maps in self._maps.values():
+            maps.flush()
+        self._maps = {}
+        self._mapped_capacity = 0
+        for name, dtype in COLUMNS.items():
+            with open(self._column_file(name), 'r+b') as f:
+                f.truncate(capacity * np.dtype(dtype).itemsize)
+        meta['capacity'] = capacity
+
+    # ---------- Índice temporal ----------
+
+    def _sorted_index(self, meta):
+        """
+        (timestamps ordenados, posiciones físicas). Si los datos se añadieron en
+        orden, la propia columna timestamp es el índice y no hay archivos extra.
+        """
+        count = meta['count']
+        if meta['sorted'] or count == 0:  # Un índice vacío no se puede mapear
+            return self._columns(meta)['timestamp'][:count], None
+        key = (meta.get('index_version'), count)
+        if self._index_maps is None or self._index_generation != key:
+            self._index_maps = tuple(np.memmap(path, dtype=np.int64, mode='r', shape=(count,))
+                                     for path in self._index_files(meta.get('index_version')))
+            self._index_generation = key
+        return self._index_maps
+
+    def _index_files(self, version):
+        """Rutas (timestamps, posiciones) de una versión del índice; None = archivos sin versión."""
+        if version is None:
+            return self._file(INDEX_TS_FILE), self._file(INDEX_POS_FILE)
+        return tuple(self._file(name.replace('.i8', f'.{version}.i8')) for name in (INDEX_TS_FILE, INDEX_POS_FILE))
+
+    def _write_index(self, meta, index_ts, index_pos):
+        """
+        Escribe el índice en archivos de una versión nueva y la anota en meta. No lo ve
+        nadie hasta que el llamador publica meta (_write_meta), así que un lector siempre
+        empareja count e índice de la misma escritura.
+        """
+        version = meta.get('index_version', 0) + 1
+        for path, arr in zip(self._index_files(version), (index_ts, index_pos)):
+            np.asarray(arr, dtype=np.int64).tofile(path)
+        meta['index_version'] = version
+        self._index_maps = None
+
+    def _prune_index(self, meta):
+        """Tras publicar meta: borra la versión anterior a la previa (la previa puede estar en lectura)."""
+        stale = meta.get('index_version', 0) - 2
+        if stale < 0:
+            return
+        for path in self._index_files(stale if stale > 0 else None):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _merge_index(self, meta, start, new_ts):
+        """Inserta un bloque fuera de orden en el índice (merge O(n), sin reordenar todo)."""
+        if meta['sorted'] or start == 0:
+            old_ts = np.array(self._columns(meta)['timestamp'][:start])
+            old_pos = np.arange(start, dtype=np.int64)
+        else:
+            old_ts, old_pos = (np.array(a) for a in self._sorted_index(dict(meta, count=start)))
+        order = np.argsort(new_ts, kind='stable')
+        new_sorted = new_ts[order]
+        insert_at = np.searchsorted(old_ts, new_sorted, side='right')
+        self._write_index(meta, np.insert(old_ts, insert_at, new_sorted),
+                          np.insert(old_pos, insert_at, start + order.astype(np.int64)))
+        meta['sorted'] = False
+
+    # ---------- Escritura ----------
+
+    def _station_codes(self, meta, stations, n):
+        if stations is None:
+            return np.zeros(n, dtype=np.int16)
+        stations = np.broadcast_to(np.asarray(stations, dtype=object), (n,))
+        codes = np.empty(n, dtype=np.int16)
+        known = {name: i for i, name in enumerate(meta['stations'])}
+        for name in set(stations):
+            if name not in known:
+                known[name] = len(meta['stations'])
+                meta['stations'].append(name)
+            codes[stations == name] = known[name]
+        return codes
+
+    def _new_entries(self, meta, entry_ids):
+        """
+        Máscara de las filas cuyo entry_id (> 0) no está en el almacén ni repetido en el
+        bloque. Las lecturas en vivo siempre traen ids mayores que max_entry_id y no leen
+        la columna; solo un backfill de historia vieja compara contra las filas existentes.
+        """
+        _, first = np.unique(entry_ids, return_index=True)
+        keep = np.zeros(len(entry_ids), dtype=bool)
+        keep[first] = True
+        keep |= entry_ids <= 0
+        known = entry_ids <= meta.get('max_entry_id', 0)
+        if np.any(known & (entry_ids > 0)):
+            existing = self._columns(meta)['entry_id'][:meta['count']]
+            keep &= ~(known & np.isin(entry_ids, existing))
+        return keep
+
+    def append_many(self, columns):
+        """
+        Añade un bloque de lecturas en una sola operación.
+        columns: dict con 'timestamp' (ISO o epoch) y las columnas de VALUE_COLUMNS;
+        'station' es opcional (nombre o lista de nombres). Con 'entry_id' (ThingSpeak)
+        se descartan las filas cuyo entry_id ya está en el almacén: la misma entrada
+        escrita por varios workers o por el sondeo y el backfill queda una sola vez.
+        Retorna los ids asignados (solo los de las filas escritas).
+        """
+        timestamps = parse_timestamps(columns['timestamp'])
+        n = len(timestamps)
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+
+        with self._write_lock():
+            meta = self._read_meta()
+            entry_ids = None
+            if columns.get('entry_id') is not None:
+                entry_ids = np.broadcast_to(np.asarray(columns['entry_id'], dtype=np.int64), (n,))
+                keep = self._new_entries(meta, entry_ids)
+                if not keep.all():
+                    columns = {name: _select_rows(values, keep, n) for name, values in columns.items()}
+                    timestamps, entry_ids, n = timestamps[keep], entry_ids[keep], int(keep.sum())
+                    if n == 0:
+                        return np.empty(0, dtype=np.int64)
+                meta['max_entry_id'] = max(meta.get('max_entry_id', 0), int(entry_ids.max()))
+
+            start = meta['count']
+            if start + n > meta['capacity']:
+                self._grow(meta, start + n)
+            maps = self._columns(meta)
+
+            ids = np.arange(meta['next_id'], meta['next_id'] + n, dtype=np.int64)
+            maps['id'][start:start + n] = ids
+            maps['timestamp'][start:start + n] = timestamps
+            for name in VALUE_COLUMNS:
+                values = columns.get(name)
+                maps[name][start:start + n] = np.nan if values is None else np.asarray(values, dtype=np.float32)
+            maps['station'][start:start + n] = self._station_codes(meta, columns.get('station'), n)
+            maps['entry_id'][start:start + n] = 0 if entry_ids is None else entry_ids
+            for arr in maps.values():
+                arr.flush()
+
+            last_ts = maps['timestamp'][start - 1] if start > 0 else np.iinfo(np.int64).min
+            in_order = timestamps[0] >= last_ts and bool(np.all(np.diff(timestamps) >= 0))
+            if not (meta['sorted'] and in_order):
+                self._merge_index(meta, start, timestamps)
+
+            meta['count'] = start + n
+            meta['next_id'] = int(ids[-1]) + 1
+            meta['generation'] += 1
+            self._write_meta(meta)  # Al final: publica a la vez las filas y el índice nuevo
+            self._prune_index(meta)
+        return ids
+
+    def append(self, record):
+        """Añade una lectura (dict) y retorna su id (None si su entry_id ya estaba en el almacén)."""
+        columns = {k: [record[k]] for k in ['timestamp'] + VALUE_COLUMNS if k in record}
+        if record.get('entry_id') is not None:
+            columns['entry_id'] = [record['entry_id']]
+        columns['station'] = [record.get('station') or DEFAULT_STATION]
+        ids = self.append_many(columns)
+        return int(ids[0]) if len(ids) else None
+
+    def delete_last(self):
+        """Elimina la última lectura añadida (mayor id). Retorna el registro o None si está vacío."""
+        with self._write_lock():
+            meta = self._read_meta()
+            if meta['count'] == 0:
+                return None
+            last = self._records_at(meta, np.array([meta['count'] - 1]))[0]
+            index = None if meta['sorted'] else [np.array(a) for a in self._sorted_index(meta)]
+            meta['count'] -= 1
+            meta['generation'] += 1
+            meta['deletions'] = meta.get('deletions', 0) + 1
+            if index is not None:
+                keep = index[1] != meta['count']
+                self._write_index(meta, index[0][keep], index[1][keep])
+            self._write_meta(meta)
+            self._prune_index(meta)
+        return last
+
+    def seed_if_empty(self, records):
+        """Carga registros iniciales solo si el almacén está vacío (seguro entre workers)."""
+        with self._write_lock():
+            if self._read_meta()['count'] == 0:
+                for record in records:
+                    self.append(record)
+
+    # ---------- Lectura ----------
+
+    def __len__(self):
+        return self._read_meta()['count']
+
+    @property
+    def generation(self):
+        """Contador que cambia con cada escritura (útil para invalidar cachés)."""
+        return self._read_meta()['generation']
+
+    @property
+    def version(self):
+        """Identificador del contenido actual (cambia con cada escritura o borrado, en todos los workers)."""
+        meta = self._read_meta()
+        return f"{meta['generation']}-{meta['count']}-{meta['next_id']}"
+
+    @property
+    def deletions(self):
+        """Número de borrados realizados (las réplicas incrementales lo usan para detectar cambios)."""
+        return self._read_meta().get('deletions', 0)
+
+    @property
+    def stations(self):
+        return list(self._read_meta()['stations'])
+
+    def latest_timestamp(self):
+        """Timestamp (epoch) más reciente del almacén, o None si está vacío."""
+        meta = self._read_meta()
+        if meta['count'] == 0:
+            return None
+        index_ts, _ = self._sorted_index(meta)
+        return int(index_ts[-1])
+
+    def range_positions(self, start=None, end=None, meta=None):
+        """Rango [lo, hi) en el índice ordenado para start <= timestamp <= end (búsqueda binaria)."""
+        meta = meta or self._read_meta()
+        index_ts, _ = self._sorted_index(meta)
+        lo = 0 if start is None else int(np.searchsorted(index_ts, parse_timestamps([start])[0], side='left'))
+        hi = len(index_ts) if end is None else int(np.searchsorted(index_ts, parse_timestamps([end])[0], side='right'))
+        return lo, max(lo, hi)
+
+    def _physical_positions(self, meta, lo, hi):
+        _, index_pos = self._sorted_index(meta)
+        if index_pos is None:
+            return np.arange(lo, hi, dtype=np.int64)
+        return np.asarray(index_pos[lo:hi])
+
+    def read_columns(self, positions, columns=None, meta=None):
+        """Lee las columnas pedidas en las posiciones físicas dadas (copia pequeña, no todo el archivo)."""
+        meta = meta or self._read_meta()
+        maps = self._columns(meta)
+        return {name: np.asarray(maps[name][positions]) for name in (columns or COLUMNS)}
+
+    def iter_range(self, start=None, end=None, chunk_rows=65536, columns=None):
+        """Itera por bloques de columnas en orden temporal; la memoria no depende del tamaño del rango."""
+        meta = self._read_meta()
+        lo, hi = self.range_positions(start, end, meta)
+        for chunk_lo in range(lo, hi, chunk_rows):
+            positions = self._physical_positions(meta, chunk_lo, min(chunk_lo + chunk_rows, hi))
+            yield self.read_columns(positions, columns, meta)
+
+    def _records_at(self, meta, positions):
+        return self.columns_to_records(self.read_columns(positions, meta=meta), meta['stations'])
+
+    @staticmethod
+    def columns_to_records(chunk, stations, fields=None):
+        """
+        Convierte un bloque columnar en la lista de dicts que consume el Front-end.
+        fields (subconjunto de RECORD_FIELDS) limita las claves de cada registro.
+        """
+        fields = RECORD_FIELDS if fields is None else fields
+        columns = {}
+        if 'id' in fields:
+            columns['id'] = chunk['id'].tolist()
+        if 'timestamp' in fields:
+            columns['timestamp'] = format_timestamps(chunk['timestamp']).tolist()
+        for name in VALUE_COLUMNS:
+            if name in fields:
+                col = np.round(chunk[name].astype(np.float64), 1)
+                values = np.where(np.isnan(col), None, col)  # NaN -> null en JSON
+                if name == 'aqi':
+                    values = np.where(np.isnan(col), None, np.nan_to_num(col).astype(np.int64))
+                columns[name] = values.tolist()
+        if 'station' in fields:
+            columns['station'] = np.asarray(stations, dtype=object)[chunk['station']].tolist()
+        keys = [name for name in fields if name in columns]
+        return [dict(zip(keys, row)) for row in zip(*(columns[name] for name in keys))]
+
+    def query(self, start=None, end=None):
+        """Registros (dicts) en el rango de tiempo, en orden temporal."""
+        stations = self.stations
+        records = []
+        for chunk in self.iter_range(start, end):
+            records.extend(self.columns_to_records(chunk, stations))
+        return records
+
+    def page(self, start=None, end=None, after=None, limit=1000, columns=None):
+        """
+        Hasta `limit` filas del rango en orden (timestamp, id), posteriores al cursor
+        after = (timestamp, id). Retorna (bloque de columnas, hay_más). Solo lee las filas
+        de la página (más los empates de timestamp en sus bordes), no el rango completo.
+        """
+        meta = self._read_meta()
+        index_ts, _ = self._sorted_index(meta)
+        lo, hi = self.range_positions(start, end, meta)
+        stop = lo + limit + 1
+        if after is not None:
+            lo = max(lo, int(np.searchsorted(index_ts, after[0], side='left')))
+            # Las filas empatadas con el cursor no cuentan para llenar la página
+            stop = int(np.searchsorted(index_ts, after[0], side='right')) + limit + 1
+        stop = min(hi, max(stop, lo))
+        if lo < stop < hi:
+            # Los empates del último timestamp se leen completos (se ordenan por id)
+            stop = min(hi, int(np.searchsorted(index_ts, index_ts[stop - 1], side='right')))
+
+        wanted = list(dict.fromkeys(['id', 'timestamp'] + list(columns or COLUMNS)))
+        chunk = self.read_columns(self._physical_positions(meta, lo, stop), wanted, meta)
+        order = np.lexsort((chunk['id'], chunk['timestamp']))
+        keep = order
+        if after is not None:
+            ts, ids = chunk['timestamp'][order], chunk['id'][order]
+            keep = order[(ts > after[0]) | ((ts == after[0]) & (ids > after[1]))]
+        has_more = len(keep) > limit
+        keep = keep[:limit]
+        return {name: col[keep] for name, col in chunk.items()}, has_more
+
+    def last(self, n=1):
+        """Las n últimas lecturas añadidas (orden de inserción)."""
+        meta = self._read_meta()
+        count = meta['count']
+        return self._records_at(meta, np.arange(max(0, count - n), count))